@@ -1,10 +1,43 @@
 # -*- coding: utf-8 -*-
+import logging
+import os
+import tempfile
 import uuid
+import dataiku
+from amazon_transcribe_api_client import APIParameterError
+from amazon_transcribe_api_client import APIRateLimiter
 from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
-from dku_io_utils import read_json_from_folder, set_column_description
-from dkulib.core.parallelizer import DataFrameParallelizer
+from amazon_transcribe_async_client import AsyncAWSTranscribeAPIWrapper
+from concurrency_limiter import AdaptiveConcurrencyLimiter
+from concurrency_limiter import JobQuotaGate
+from dku_constants import FOLDER_SNAPSHOT_FOLDER_PATH
+from dku_constants import METRICS_FLUSH_INTERVAL_SEC
+from dku_constants import METRICS_FOLDER_PATH
+from dku_constants import OUTPUT_BATCH_SIZE
+from dku_constants import RUN_LEDGER_FOLDER_PATH
+from dku_constants import RUN_LEDGER_SYNC_INTERVAL_SEC
+from dku_constants import TRANSCRIPT_CACHE_FOLDER_PATH
+from dku_constants import TRANSCRIPT_CACHE_INDEX_SYNC_INTERVAL_SEC
+from dku_io_utils import copy_dataset_to_local_files, iter_rows_from_local_files
+from dku_io_utils import download_file_from_folder, upload_file_to_folder
+from dku_io_utils import get_path_details, iter_folder_paths, list_path_details, read_json_from_folder_if_exists
+from dku_io_utils import read_failed_files, read_json_from_folder, read_priorities
+from dku_io_utils import set_column_description, write_rows_by_batch
+from job_timings import JobTimings
+from metrics import JSONExporter, Metrics, MetricsRegistry, PrometheusTextfileExporter, StatsDExporter
+from plugin_io_utils import DEAD_LETTER_COLUMN_DESCRIPTIONS
+from plugin_io_utils import PATH_COLUMN
+from plugin_io_utils import filter_paths_by_extension, get_changed_paths, get_dead_letter_row
+from plugin_io_utils import is_unchanged_since_submission
+from plugin_parallelizer import StreamingDataFrameParallelizer
 from plugin_params_loader import PluginParamsLoader
 from plugin_params_loader import RecipeID
+from region_pool import RegionPool
+from run_ledger import RunLedger
+from submission_retry import CircuitBreaker, SubmissionRetryPolicy
+from submission_order import get_priority_function, order_rows
+from transcript_cache import FolderCacheBackend, LocalDirectoryCacheBackend, TranscriptCache
+from tqdm.auto import tqdm as tqdm_auto
 
 
 # ==============================================================================
@@ -19,32 +52,308 @@ RECIPE_JOB_ID = f"{dataiku.dku_custom_variables.get('jobId')}_{uuid.uuid4().hex}
 
 params = PluginParamsLoader(RecipeID.TRANSCRIBE).validate_load_params()
 
-api_wrapper = AWSTranscribeAPIWrapper(use_timeout=params.use_timeout,
-                                      timeout_min=params.timeout_min)
+# The run ledger is kept in a local SQLite file, regularly uploaded to the output folder
+ledger_folder_path = f"{RUN_LEDGER_FOLDER_PATH}/{params.output_dataset.short_name}.db"
+ledger_local_path = os.path.join(tempfile.mkdtemp(), "run_ledger.db")
+if params.resume_previous_run:
+    download_file_from_folder(params.output_folder, ledger_folder_path, ledger_local_path)
+ledger = RunLedger(ledger_local_path,
+                   sync_function=lambda path: upload_file_to_folder(params.output_folder, ledger_folder_path, path),
+                   sync_interval_sec=RUN_LEDGER_SYNC_INTERVAL_SEC)
+if not params.resume_previous_run:
+    ledger.reset()
+recipe_job_id = ledger.get_recipe_job_id() or RECIPE_JOB_ID
+ledger.set_recipe_job_id(recipe_job_id)
+reusable_jobs = ledger.get_reusable_jobs()
+if len(reusable_jobs) > 0:
+    logging.info(f"Resuming the interrupted run {recipe_job_id}: {len(reusable_jobs)} job(s) recorded in the ledger")
+
+transcript_cache = None
+if params.use_transcript_cache:
+    if params.transcript_cache_location == "local_directory":
+        cache_backend = LocalDirectoryCacheBackend(params.transcript_cache_directory)
+    else:
+        cache_backend = FolderCacheBackend(params.output_folder, TRANSCRIPT_CACHE_FOLDER_PATH)
+    transcript_cache = TranscriptCache(cache_backend,
+                                       max_size_bytes=params.transcript_cache_max_size_mb * 1024 ** 2,
+                                       index_sync_interval_sec=TRANSCRIPT_CACHE_INDEX_SYNC_INTERVAL_SEC)
+
+job_timings = JobTimings() if params.record_job_timings else None
+
+# Metrics are saved next to the output dataset, and optionally exported while the run is in progress
+metrics = Metrics()
+if params.record_metrics:
+    metrics_folder_path = f"{METRICS_FOLDER_PATH}/{params.output_dataset.short_name}.json"
+    metrics_exporters = [JSONExporter(lambda snapshot: params.output_folder.write_json(metrics_folder_path, snapshot))]
+    if params.metrics_exporter == "statsd":
+        metrics_exporters.append(StatsDExporter(host=params.statsd_host, port=params.statsd_port))
+    elif params.metrics_exporter == "prometheus_textfile":
+        metrics_exporters.append(PrometheusTextfileExporter(params.prometheus_textfile_path))
+    metrics = MetricsRegistry(metrics_exporters, flush_interval_sec=METRICS_FLUSH_INTERVAL_SEC)
+
+# In auto mode, the submission threads are gated by a limit increased until the API throttles
+submission_limiter = None
+if params.submission_concurrency_mode == "auto":
+    submission_limiter = AdaptiveConcurrencyLimiter(max_limit=params.parallel_workers,
+                                                    name="start_transcription_job")
+
+# Requests are paced by operation, across all the submission, polling and download threads
+rate_limiter = APIRateLimiter({
+    "StartTranscriptionJob": params.submission_requests_per_sec,
+    "GetTranscriptionJob": params.get_job_requests_per_sec,
+    "ListTranscriptionJobs": params.list_jobs_requests_per_sec,
+    AWSTranscribeAPIWrapper.DOWNLOAD_OPERATION: params.download_requests_per_sec
+})
+
+api_wrapper_params = dict(use_timeout=params.use_timeout,
+                          timeout_min=params.timeout_min,
+                          max_polling_requests_per_sec=params.max_polling_requests_per_sec,
+                          download_workers=params.download_workers,
+                          submission_limiter=submission_limiter,
+                          rate_limiter=rate_limiter,
+                          ledger=ledger,
+                          transcript_cache=transcript_cache,
+                          job_timings=job_timings,
+                          metrics=metrics,
+                          retry_policy=SubmissionRetryPolicy(max_attempts=params.max_submission_attempts))
+# Submissions are paused when transient errors spike, e.g., during an incident of the service
+if params.use_circuit_breaker:
+    api_wrapper_params["circuit_breaker"] = CircuitBreaker(error_rate_threshold=params.circuit_breaker_error_rate)
+# With a region pool, jobs are spread across the regions, and their results merged in the same output
+if params.use_region_pool:
+    api_wrapper_params["region_pool"] = RegionPool(max_concurrent_jobs_per_region=params.max_concurrent_jobs_per_region)
+# Submissions are held while the jobs in flight are at the quota of concurrent jobs, across the regions of the pool.
+# The quota is lowered by `check_region_access` if regions are dropped from the pool for being away from the buckets
+if params.use_job_quota_gate:
+    max_concurrent_jobs = params.max_concurrent_jobs
+    if params.use_region_pool:
+        max_concurrent_jobs = params.max_concurrent_jobs_per_region * (1 + len(params.additional_region_names))
+    api_wrapper_params["job_quota_gate"] = JobQuotaGate(max_jobs=max_concurrent_jobs)
+if params.execution_engine == "asyncio":
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_concurrent_requests=params.parallel_workers,
+                                               max_jobs_in_flight=params.max_jobs_in_flight,
+                                               **api_wrapper_params)
+else:
+    api_wrapper = AWSTranscribeAPIWrapper(**api_wrapper_params)
 api_wrapper.build_client(aws_access_key_id=params.aws_access_key_id,
                          aws_secret_access_key=params.aws_secret_access_key,
                          aws_session_token=params.aws_session_token,
                          aws_region_name=params.aws_region_name,
-                         max_attempts=params.max_attempts)
-
-parallelizer = DataFrameParallelizer(function=api_wrapper.start_transcription_job,
-                                     exceptions_to_catch=api_wrapper.API_EXCEPTIONS)
-
-submitted_jobs = parallelizer.run(df=params.input_df,
-                                  input_folder_bucket=params.input_folder_bucket,
-                                  input_folder_root_path=params.input_folder_root_path,
-                                  output_folder_bucket=params.output_folder_bucket,
-                                  output_folder_root_path=params.output_folder_root_path,
-                                  job_id=RECIPE_JOB_ID,
-                                  language=params.language)
-
-job_results = api_wrapper.get_results(submitted_jobs=submitted_jobs,
-                                      recipe_job_id=RECIPE_JOB_ID,
-                                      display_json=params.display_json,
-                                      transcript_json_loader=read_json_from_folder,
-                                      folder=params.output_folder)
-
-params.output_dataset.write_with_schema(job_results)
+                         max_attempts=params.max_attempts,
+                         additional_region_names=params.additional_region_names)
+if params.use_region_pool:
+    api_wrapper.check_region_access([params.input_folder_bucket, params.output_folder_bucket])
+
+
+def iter_input_folder_paths():
+    """List the input folder in S3 page by page, or with the Dataiku Folder API if it cannot be listed in S3"""
+    num_paths = 0
+    try:
+        for path in api_wrapper.iter_s3_paths(bucket=params.input_folder_bucket,
+                                              root_path=params.input_folder_root_path):
+            num_paths += 1
+            yield path
+    except APIParameterError:
+        if num_paths > 0:
+            raise
+        # Listing the bucket requires the s3:ListBucket permission, which the AWS credentials may lack
+        logging.warning("The input folder could not be listed in S3 with the AWS credentials, "
+                        "listing it with the Dataiku Folder API instead")
+        yield from iter_folder_paths(params.input_folder)
+
+
+# Failed files of a previous run are read from its dataset of failed files, instead of listing the input folder
+failed_files = {}
+if params.input_source == "failed_files":
+    failed_files = read_failed_files(params.failed_files_dataset)
+    logging.info(f"{len(failed_files)} failed file(s) to reprocess")
+    listed_paths = iter(failed_files)
+# Files are listed lazily, page by page for a S3 folder, and submitted as soon as they are listed
+elif params.input_folder.read_partitions:
+    listed_paths = iter_folder_paths(params.input_folder)
+else:
+    listed_paths = iter_input_folder_paths()
+listed_paths = tqdm_auto(filter_paths_by_extension(listed_paths, params.file_extensions),
+                         desc="Files listed", unit="file", mininterval=1.0)
+
+# In incremental mode, only the files changed since the snapshot of the folder taken by the last run are processed
+if params.incremental_mode:
+    snapshot_folder_path = f"{FOLDER_SNAPSHOT_FOLDER_PATH}/{params.output_dataset.short_name}.json"
+    previous_path_details = read_json_from_folder_if_exists(params.output_folder, snapshot_folder_path)
+    # The output dataset is rewritten with the rows of the files processed by this run, followed by the rows of the
+    # previous runs for the other files, so that a file processed again keeps a single row. The previous rows are
+    # copied chunk by chunk to local files beforehand, so that they are neither held in memory nor overwritten.
+    previous_rows_local_paths = []
+    if previous_path_details:
+        previous_rows_local_paths = copy_dataset_to_local_files(params.output_dataset, tempfile.mkdtemp(),
+                                                                chunk_size=OUTPUT_BATCH_SIZE)
+# The size and last modification time of each file are read at once from the folder. They are recorded in the run
+# ledger with each job, so that a resumed run reuses the jobs of the files unchanged since their submission,
+# and they are used to skip unchanged files in incremental mode and to order the files by size.
+# The details of each failed file are looked up on their own, which is faster than listing the whole folder.
+listed_path_details = list_path_details(params.input_folder) if params.input_source == "folder" else {}
+path_details = {}
+reusable_path_details = {
+    job.path: {"size": job.size, "last_modified": job.last_modified} for job in reusable_jobs.itertuples()
+}
+reused_paths = set()
+
+
+def generate_input_rows():
+    """Yield the files to submit as they are listed, skipping unchanged files and jobs reused from previous runs"""
+    for path in listed_paths:
+        path_details[path] = get_path_details(params.input_folder, path, listed_path_details)
+        if params.incremental_mode and previous_path_details.get(path) == path_details[path]:
+            continue
+        row = {PATH_COLUMN: path, **path_details[path]}
+        # A job of an interrupted run is reused only if its file is unchanged since its submission. In incremental
+        # mode, the files left at this point changed since the last run, so they are always submitted again.
+        if not params.incremental_mode and path in reusable_path_details and \
+                is_unchanged_since_submission(reusable_path_details[path], path_details[path]):
+            reused_paths.add(path)
+            continue
+        yield row
+
+
+def generate_submitted_rows():
+    """Yield the files to submit in the submission order, ordered by windows of listed files if set"""
+    if params.submission_order == "listing":
+        return generate_input_rows()
+    priorities = None
+    if params.submission_order == "priority_column":
+        priorities = read_priorities(params.priority_dataset, params.priority_path_column, params.priority_column)
+    priority_function = get_priority_function(params.submission_order,
+                                              priority_rules=params.priority_rules,
+                                              priorities=priorities)
+    return order_rows(generate_input_rows(), priority_function, window_size=params.submission_order_window)
+
+
+def log_listing_summary():
+    listed_paths.close()  # Closes the progress bar of the listing
+    if params.incremental_mode:
+        logging.info(f"Incremental mode: {len(get_changed_paths(path_details, previous_path_details))} file(s) "
+                     f"added or modified out of {len(path_details)}")
+    logging.info(f"{len(reused_paths)} job(s) reused from the interrupted run")
+
+
+def get_reused_jobs():
+    return reusable_jobs[reusable_jobs[PATH_COLUMN].isin(reused_paths)]
+
+
+if params.execution_engine == "asyncio":
+    def iter_job_results():
+        """Yield the results of the files as they are submitted and polled, then the results of the reused jobs"""
+        yield from api_wrapper.iter_results_from_rows(rows=generate_submitted_rows(),
+                                                      recipe_job_id=recipe_job_id,
+                                                      display_json=params.display_json,
+                                                      transcript_json_loader=read_json_from_folder,
+                                                      language=params.language,
+                                                      input_folder_bucket=params.input_folder_bucket,
+                                                      input_folder_root_path=params.input_folder_root_path,
+                                                      output_folder_bucket=params.output_folder_bucket,
+                                                      output_folder_root_path=params.output_folder_root_path,
+                                                      folder=params.output_folder)
+        # The reused jobs are only known once all the files are listed
+        log_listing_summary()
+        yield from api_wrapper.iter_results(submitted_jobs=get_reused_jobs(),
+                                            recipe_job_id=recipe_job_id,
+                                            display_json=params.display_json,
+                                            transcript_json_loader=read_json_from_folder,
+                                            folder=params.output_folder)
+
+    job_results = iter_job_results()
+else:
+    # Each thread submits a batch of files, and the submission errors are reported in the row of each file
+    parallelizer = StreamingDataFrameParallelizer(function=api_wrapper.start_transcription_jobs,
+                                                  exceptions_to_catch=api_wrapper.API_EXCEPTIONS,
+                                                  parallel_workers=params.parallel_workers,
+                                                  batch_support=True,
+                                                  batch_size=params.submission_batch_size,
+                                                  batch_response_parser=api_wrapper.parse_batch_submission_response,
+                                                  metrics=metrics)
+    submission_columns = [PATH_COLUMN, "size", "last_modified"]
+
+    # Files whose submission failed transiently are requeued, and submitted again in a later batch once due
+    submission_results = api_wrapper.iter_submissions(parallelizer,
+                                                      rows=generate_submitted_rows(),
+                                                      columns=submission_columns,
+                                                      input_folder_bucket=params.input_folder_bucket,
+                                                      input_folder_root_path=params.input_folder_root_path,
+                                                      output_folder_bucket=params.output_folder_bucket,
+                                                      output_folder_root_path=params.output_folder_root_path,
+                                                      job_id=recipe_job_id,
+                                                      language=params.language)
+
+    def generate_submitted_jobs():
+        """Yield the rows of the files as they are submitted, then the rows of the reused jobs"""
+        yield from submission_results
+        # The reused jobs are only known once all the files are listed
+        log_listing_summary()
+        yield from get_reused_jobs().to_dict("records")
+
+    # The jobs are polled while the next files are submitted, keeping in memory only the rows of the pending jobs
+    job_results = api_wrapper.iter_results(submitted_jobs=generate_submitted_jobs(),
+                                           recipe_job_id=recipe_job_id,
+                                           display_json=params.display_json,
+                                           transcript_json_loader=read_json_from_folder,
+                                           folder=params.output_folder)
+
+failed_paths = set()
+dead_letter_rows = []
+
+
+def track_failed_paths(rows):
+    for row in rows:
+        if row["output_error_type"]:
+            failed_paths.add(row["path"])
+            if params.dead_letter_dataset is not None:
+                dead_letter_rows.append(get_dead_letter_row(row, failed_files.get(row["path"], 0)))
+        yield row
+
+
+def generate_output_rows():
+    """Yield the results of the run, then in incremental mode the rows of the previous runs not superseded by them"""
+    written_paths = set()
+    for row in track_failed_paths(job_results):
+        written_paths.add(row[PATH_COLUMN])
+        yield row
+    if params.incremental_mode:
+        for row in iter_rows_from_local_files(previous_rows_local_paths):
+            if row[PATH_COLUMN] not in written_paths:
+                yield row
+
+
+write_rows_by_batch(output_dataset=params.output_dataset,
+                    rows=generate_output_rows(),
+                    columns=api_wrapper.get_output_columns(params.display_json,
+                                                           include_timings=params.record_job_timings),
+                    batch_size=OUTPUT_BATCH_SIZE)
+if params.incremental_mode:
+    # Failed files are left out of the snapshot so that they are processed again by the next run
+    params.output_folder.write_json(snapshot_folder_path, {
+        path: details for path, details in path_details.items() if path not in failed_paths
+    })
+if params.dead_letter_dataset is not None:
+    # Failed files are written apart, with the reason of their failure, so that they can be reprocessed on their own
+    write_rows_by_batch(output_dataset=params.dead_letter_dataset,
+                        rows=dead_letter_rows,
+                        columns=list(DEAD_LETTER_COLUMN_DESCRIPTIONS),
+                        batch_size=OUTPUT_BATCH_SIZE)
+    set_column_description(params.dead_letter_dataset, DEAD_LETTER_COLUMN_DESCRIPTIONS)
+if params.delete_finished_jobs:
+    # Jobs left over would slow down the job listings of the next runs
+    api_wrapper.delete_finished_jobs(recipe_job_id=recipe_job_id,
+                                     output_folder_bucket=params.output_folder_bucket,
+                                     output_folder_root_path=params.output_folder_root_path)
+# The run succeeded, so the next run starts anew instead of resuming it
+ledger.reset()
+ledger.close()
+if transcript_cache is not None:
+    transcript_cache.close()
+logging.info(f"Time waited for the rate limits by operation: {rate_limiter.get_stats()}")
+if job_timings is not None:
+    logging.info(f"Time spent in each stage of the jobs, in seconds: {job_timings.get_summary()}")
+metrics.close()
 column_description = {
     'path': 'Path to the audio file in the S3 bucket.',
     'job_name': 'Name to identify the job in Amazon Transcribe.',
@@ -53,6 +362,7 @@ column_description = {
     'language_code': 'Language code detected or setup by the user.',
     'json': 'Raw API response in JSON form.',
     'output_error_type': 'The error type in case an error occurs.',
-    'output_error_message': 'The error message in case an error occurs.'
+    'output_error_message': 'The error message in case an error occurs.',
+    **JobTimings.COLUMN_DESCRIPTIONS
 }
 set_column_description(params.output_dataset, column_description)
@@ -1,23 +1,47 @@
 # -*- coding: utf-8 -*-
 """Module with utility functions to call the Amazon Transcribe API"""
 import logging
+import queue
+import threading
 import time
-import datetime
+import functools
+import heapq
+import itertools
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-from typing import AnyStr, Dict, Callable, List
+from typing import AnyStr, Dict, Callable, Generator, Iterable, List, NamedTuple, Set, Tuple, Union
 
 import boto3
 import pandas as pd
 from botocore.config import Config
 from botocore.exceptions import BotoCoreError
 from botocore.exceptions import ClientError
+from botocore.exceptions import ConnectionError as BotoCoreConnectionError
+from botocore.exceptions import HTTPClientError
 from botocore.exceptions import ParamValidationError
 from botocore.exceptions import NoRegionError
 
-from dku_constants import SLEEPING_TIME_BETWEEN_ROUNDS_SEC
+from concurrency_limiter import AdaptiveConcurrencyLimiter
+from concurrency_limiter import JobQuotaGate
+from dku_constants import LIST_JOBS_MAX_RESULTS
+from dku_constants import MAX_PENDING_JOBS_TO_PROBE
+from dku_constants import S3_DELETE_MAX_KEYS
+from dku_constants import DEFAULT_DOWNLOAD_WORKERS
+from dku_constants import DEFAULT_MAX_POLLING_REQUESTS_PER_SEC
+from dku_constants import SUBMITTED_JOBS_CHECK_INTERVAL_SEC
 from dku_constants import SUPPORTED_LANGUAGES
+from job_deadlines import JobDeadlineTracker
+from job_timings import JobTimings
+from metrics import Metrics
+from more_itertools import chunked
 from plugin_io_utils import PATH_COLUMN
+from polling_scheduler import PollingScheduler
+from region_pool import RegionPool
+from run_ledger import RunLedger
+from submission_retry import CircuitBreaker
+from submission_retry import SubmissionRetryPolicy
+from transcript_cache import TranscriptCache
 
 # ==============================================================================
 # CLASS AND FUNCTION DEFINITION
@@ -51,29 +75,133 @@ class UnknownStatusError(ValueError):
     pass
 
 
+class TokenBucket:
+    """Token bucket pacing calls to `rate` per second on average, with bursts of at most `capacity` calls.
+
+    Thread-safe: callers reserve a token under a lock and sleep outside of it until their token is available,
+    so that waiting threads are served in order. The total time spent waiting is recorded.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.num_calls = 0
+        self.total_wait_sec = 0.0
+        self._tokens = self.capacity
+        self._last_refill = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the time to wait before it is available"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            wait_sec = max(0.0, -self._tokens / self.rate)
+            self.num_calls += 1
+            self.total_wait_sec += wait_sec
+        return wait_sec
+
+    def acquire(self) -> float:
+        """Wait until a token is available and return the time waited"""
+        wait_sec = self.reserve()
+        if wait_sec > 0:
+            time.sleep(wait_sec)
+        return wait_sec
+
+
+class APIRateLimiter:
+    """Token buckets by API operation name, shared by all the threads calling the API.
+
+    Operations without a configured rate are not paced.
+    """
+
+    def __init__(self, requests_per_sec: Dict[AnyStr, float]):
+        self.buckets = {
+            operation: TokenBucket(rate=rate) for operation, rate in requests_per_sec.items() if rate
+        }
+
+    def acquire(self, operation: AnyStr) -> float:
+        """Wait until a call to the operation is allowed and return the time waited"""
+        bucket = self.buckets.get(operation)
+        if bucket is None:
+            return 0.0
+        return bucket.acquire()
+
+    def get_stats(self) -> Dict[AnyStr, Dict]:
+        """Number of calls and total time waited by operation"""
+        return {
+            operation: {"num_calls": bucket.num_calls, "total_wait_sec": round(bucket.total_wait_sec, 2)}
+            for operation, bucket in self.buckets.items()
+        }
+
+
 class AWSTranscribeAPIWrapper:
     API_EXCEPTIONS = (ClientError, BotoCoreError)
+    # Exceptions of a submission reported in its row by `start_transcription_jobs`, instead of failing the batch
+    SUBMISSION_EXCEPTIONS = API_EXCEPTIONS + (APITranscriptionJobError, APIParameterError)
     COMPLETED = "COMPLETED"
     QUEUED = "QUEUED"
     IN_PROGRESS = "IN_PROGRESS"
     FAILED = "FAILED"
+    THROTTLING_ERROR_CODES = ("ThrottlingException", "TooManyRequestsException")
+    # Error code of a submission beyond the quota of concurrent jobs, once botocore retries are exhausted.
+    # It is handled by the job quota gate, and is neither retried on a timer nor counted by the circuit breaker.
+    QUOTA_EXCEEDED_ERROR_CODE = "LimitExceededException"
+    # Operation name used to pace transcript downloads, which do not go through the Transcribe client
+    DOWNLOAD_OPERATION = "DownloadTranscript"
 
     def __init__(self,
                  use_timeout: bool = False,
-                 timeout_min: int = 120):
+                 timeout_min: int = 120,
+                 max_polling_requests_per_sec: float = DEFAULT_MAX_POLLING_REQUESTS_PER_SEC,
+                 download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                 submission_limiter: AdaptiveConcurrencyLimiter = None,
+                 rate_limiter: APIRateLimiter = None,
+                 ledger: RunLedger = None,
+                 transcript_cache: TranscriptCache = None,
+                 job_timings: JobTimings = None,
+                 metrics: Metrics = None,
+                 region_pool: RegionPool = None,
+                 job_quota_gate: JobQuotaGate = None,
+                 retry_policy: SubmissionRetryPolicy = None,
+                 circuit_breaker: CircuitBreaker = None):
         self.client = None
         self.use_timeout = use_timeout
         self.timeout_min = timeout_min
+        self.max_polling_requests_per_sec = max_polling_requests_per_sec
+        self.download_workers = download_workers
+        self.submission_limiter = submission_limiter
+        self.rate_limiter = rate_limiter
+        self.ledger = ledger
+        self.transcript_cache = transcript_cache
+        self.job_timings = job_timings
+        self.metrics = metrics or Metrics()
+        self.region_pool = region_pool
+        self.job_quota_gate = job_quota_gate
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.job_deadlines = JobDeadlineTracker(timeout_sec=timeout_min * 60) if use_timeout else None
+        self.s3_client = None
+        self._cache_keys = {}  # Cache key of each job, to fill the cache when it completes
+        self._cache_hits = {}  # Cache key of each job found in the cache, which was not submitted
+        self._submission_retries = {}  # (time of the next attempt, number of the next attempt) of each path to retry
+        self.num_polling_requests = 0
 
     def build_client(self,
                      aws_access_key_id: AnyStr = None,
                      aws_secret_access_key: AnyStr = None,
                      aws_session_token: AnyStr = None,
                      aws_region_name: AnyStr = None,
-                     max_attempts: int = 20
+                     max_attempts: int = 20,
+                     additional_region_names: List[AnyStr] = None
                      ):
         """
         Initialize the client by creating an AWS client with the specified credentials.
+        With a region pool, a Transcribe client is also created for each of the additional regions,
+        and jobs are spread across all of them.
         """
         # Try to ascertain credentials from environment
         if aws_access_key_id is None or aws_access_key_id == "":
@@ -83,6 +211,7 @@ class AWSTranscribeAPIWrapper:
                     service_name="transcribe", config=Config(retries={"max_attempts": max_attempts,
                                                                       "mode": "adaptive"})
                 )
+                self.s3_client = boto3.client(service_name="s3")
             except NoRegionError as e:
                 message = "The region could not be loaded from environment variables. " + \
                           "Please specify in the plugin's API credentials settings or " + \
@@ -99,15 +228,160 @@ class AWSTranscribeAPIWrapper:
                     aws_secret_access_key=aws_secret_access_key,
                     aws_session_token=aws_session_token,
                     region_name=aws_region_name,
-                    config=Config(retries={"max_attempts": max_attempts}),
+                    config=Config(retries={"max_attempts": max_attempts, "mode": "adaptive"}),
+                )
+                self.s3_client = boto3.client(
+                    service_name="s3",
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    aws_session_token=aws_session_token,
+                    region_name=aws_region_name,
                 )
             except ClientError as e:
                 message = f"Error while using configured credentials. Full exception: {e}"
                 logging.error(message)
                 raise APIParameterError(message)
 
+        self._register_event_handlers(self.client)
+        if self.region_pool is not None:
+            self.region_pool.add_region(self.client.meta.region_name, self.client)
+            for region_name in additional_region_names or []:
+                try:
+                    client = boto3.client(
+                        service_name="transcribe",
+                        aws_access_key_id=aws_access_key_id or None,
+                        aws_secret_access_key=aws_secret_access_key or None,
+                        aws_session_token=aws_session_token or None,
+                        region_name=region_name,
+                        config=Config(retries={"max_attempts": max_attempts, "mode": "adaptive"}),
+                    )
+                except ClientError as e:
+                    message = f"Error while creating the client of the region {region_name}. Full exception: {e}"
+                    logging.error(message)
+                    raise APIParameterError(message)
+                self._register_event_handlers(client)
+                self.region_pool.add_region(region_name, client)
+            logging.info(f"Jobs spread across the regions: {', '.join(self.region_pool.region_names)}")
         logging.info("Credentials loaded.")
 
+    def _register_event_handlers(self, client) -> None:
+        """Register the botocore event handlers of the wrapper on a Transcribe client"""
+        if self.rate_limiter is not None:
+            # Each attempt is paced, including the ones retried by botocore
+            client.meta.events.register("before-send.transcribe", self._pace_request)
+        if self.submission_limiter is not None:
+            # Each throttled attempt is seen here, including the ones retried by botocore
+            client.meta.events.register("needs-retry.transcribe.StartTranscriptionJob", self._on_submission_attempt)
+        client.meta.events.register("needs-retry.transcribe", self._count_attempt)
+
+    def check_region_access(self, bucket_names: List[AnyStr]) -> None:
+        """
+        Check up front that Amazon Transcribe can be called in each region of the pool,
+        and that the input and output buckets can be reached.
+        Amazon Transcribe only reads and writes the buckets of the region of a job, so each region of the pool
+        is checked against the region of every bucket, and the regions where some bucket is not located are dropped.
+        The quota of the job quota gate, if any, is then lowered to the quota of the regions left in the pool.
+
+        Raises:
+            APIParameterError: listing all the regions and buckets which could not be reached,
+                or if no region of the pool is the region of all the buckets
+        """
+        errors = []
+        for region_name, client in self.region_pool.clients.items():
+            try:
+                client.list_transcription_jobs(MaxResults=1)
+            except self.API_EXCEPTIONS as e:
+                errors.append(f"Amazon Transcribe in {region_name}: {e}")
+        bucket_region_names = {}
+        for bucket in sorted(set(bucket_names)):
+            try:
+                # Buckets of us-east-1 have no location constraint
+                bucket_region_names[bucket] = \
+                    self.s3_client.get_bucket_location(Bucket=bucket).get("LocationConstraint") or "us-east-1"
+            except self.API_EXCEPTIONS as e:
+                errors.append(f"bucket {bucket}: {e}")
+        if errors:
+            message = f"Regions or buckets of the region pool could not be reached: {'; '.join(errors)}"
+            logging.error(message)
+            raise APIParameterError(message)
+        for region_name in self.region_pool.region_names:
+            other_buckets = [
+                f"{bucket} ({bucket_region_name})" for bucket, bucket_region_name in bucket_region_names.items()
+                if bucket_region_name != region_name
+            ]
+            if other_buckets:
+                logging.warning(f"Region {region_name} removed from the region pool, as the buckets "
+                                f"{', '.join(other_buckets)} are located in other regions.")
+                self.region_pool.remove_region(region_name)
+        if not self.region_pool.region_names:
+            message = "No region of the region pool is the region of all the buckets: " + \
+                      ", ".join(f"{bucket} ({region_name})" for bucket, region_name in bucket_region_names.items())
+            logging.error(message)
+            raise APIParameterError(message)
+        if self.job_quota_gate is not None and \
+                self.job_quota_gate.max_jobs > self.region_pool.total_max_concurrent_jobs:
+            logging.info(f"Quota of concurrent jobs lowered from {self.job_quota_gate.max_jobs} to "
+                         f"{self.region_pool.total_max_concurrent_jobs} for the regions left in the region pool")
+            self.job_quota_gate.max_jobs = self.region_pool.total_max_concurrent_jobs
+
+    def _pace_request(self, event_name: AnyStr = "", **kwargs):
+        """
+        Botocore event handler waiting for the rate limiter of the operation before sending a request.
+        It returns None so that the request is sent.
+        """
+        operation = event_name.split(".")[-1]
+        wait_sec = self.rate_limiter.acquire(operation)
+        self.metrics.observe("rate_limiter_wait_sec", wait_sec, tags={"operation": operation})
+        return None
+
+    def _count_attempt(self, response=None, event_name: AnyStr = "", **kwargs):
+        """
+        Botocore event handler counting the attempts of each operation, and the ones which were throttled.
+        It returns None so that it does not interfere with the retry decision of botocore.
+        """
+        if response is None:
+            return None
+        tags = {"operation": event_name.split(".")[-1]}
+        self.metrics.increment("api_attempts", tags=tags)
+        if response[1].get("Error", {}).get("Code") in self.THROTTLING_ERROR_CODES:
+            self.metrics.increment("api_throttled_attempts", tags=tags)
+        return None
+
+    def _on_submission_attempt(self, response=None, **kwargs):
+        """
+        Botocore event handler lowering the submission concurrency when a submission attempt is throttled.
+        It returns None so that it does not interfere with the retry decision of botocore.
+        """
+        if response is None:
+            return None
+        error_code = response[1].get("Error", {}).get("Code")
+        if error_code in self.THROTTLING_ERROR_CODES:
+            self.submission_limiter.on_throttle()
+        return None
+
+    def iter_s3_paths(self,
+                      bucket: AnyStr,
+                      root_path: AnyStr
+                      ) -> Generator[AnyStr, None, None]:
+        """
+        List the files under the root path of a Dataiku Folder stored in a S3 bucket, page by page,
+        so that the first files can be submitted while the listing goes on.
+        Yields:
+            path of each file relative to the root path, starting with "/" as in the Dataiku Folder API
+
+        """
+        prefix = f"{root_path.rstrip('/')}/" if root_path else ""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        try:
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                for s3_object in page.get("Contents", []):
+                    if not s3_object["Key"].endswith("/"):
+                        yield "/" + s3_object["Key"][len(prefix):]
+        except ClientError as e:
+            message = f"Error while listing the files of s3://{bucket}/{prefix}. Full exception: {e}"
+            logging.error(message)
+            raise APIParameterError(message)
+
     def start_transcription_job(self,
                                 language: AnyStr,
                                 row: Dict = None,
@@ -115,11 +389,14 @@ class AWSTranscribeAPIWrapper:
                                 input_folder_root_path: AnyStr = "",
                                 output_folder_bucket: AnyStr = "",
                                 output_folder_root_path: AnyStr = "",
-                                job_id: AnyStr = ""
+                                job_id: AnyStr = "",
+                                quota_slot_acquired: bool = False
                                 ) -> AnyStr:
         """
         Function starting a transcription job given the language, the path to the audio, the job name and
         the path connected to the dataiku Folder in the bucket.
+        With a job quota gate, `quota_slot_acquired` tells that the caller already acquired the slot of the job,
+        which is then given to the job, or given back if no job is submitted.
 
         Returns:
             name of the job that has been submitted
@@ -131,6 +408,29 @@ class AWSTranscribeAPIWrapper:
         aws_job_id = uuid.uuid4().hex
         job_name = f'{job_id}_{aws_job_id}'
 
+        cache_key = None
+        if self.transcript_cache is not None:
+            cache_key = self._get_cache_key(bucket=input_folder_bucket,
+                                            key=f'{input_folder_root_path}{audio_path}',
+                                            language=language)
+            if cache_key is not None and self.transcript_cache.contains(cache_key, pin=True):
+                # The result is read again from the cache by `iter_results`, to avoid holding it in memory,
+                # and the entry is pinned so that it is not evicted by the results put in the cache in between
+                self._cache_hits[job_name] = cache_key
+                self.metrics.increment("transcript_cache_hits")
+                logging.info(f"Transcript of {audio_path} found in cache, no AWS transcribe job submitted.")
+                if quota_slot_acquired:
+                    self.job_quota_gate.release_slot()
+                return job_name
+
+        # With a region pool, the job is submitted to the least loaded region, whose name ends the job name
+        client = self.client
+        region_name = None
+        if self.region_pool is not None:
+            region_name = self.region_pool.acquire_region()
+            client = self.region_pool.clients[region_name]
+            job_name = RegionPool.make_job_name(job_name, region_name)
+
         transcribe_request = {
             "TranscriptionJobName": job_name,
             "Media": {'MediaFileUri': f's3://{input_folder_bucket}/{input_folder_root_path}{audio_path}'},
@@ -142,71 +442,457 @@ class AWSTranscribeAPIWrapper:
         else:
             transcribe_request["LanguageCode"] = language
 
+        submitted = False
         try:
-            response = self.client.start_transcription_job(**transcribe_request)
+            if self.job_quota_gate is None:
+                response = self._call_start_transcription_job(client, transcribe_request)
+            else:
+                response = self._start_transcription_job_within_quota(client, transcribe_request, job_id,
+                                                                      slot_acquired=quota_slot_acquired)
+            submitted = True
         except ClientError as e:
             message = "Error happened when starting a transcription job" + \
                       "raised by the function `start_transcription_job`." + \
                       f"Full exception: {e}"
             logging.error(message)
-            raise APITranscriptionJobError(message)
+            raise APITranscriptionJobError(message) from e
         except ParamValidationError as e:
             message = f"The parameters you provided are incorrect. Full exception: {e}"
             logging.error(message)
             raise APIParameterError(message)
+        finally:
+            if region_name is not None:
+                if submitted:
+                    self.region_pool.add_job(job_name, region_name)
+                else:
+                    self.region_pool.release_region(region_name)
 
         logging.info(f"AWS transcribe job {job_name} submitted.")
+        self.metrics.increment("jobs_submitted")
 
         try:
-            return response["TranscriptionJob"]["TranscriptionJobName"]
+            submitted_job_name = response["TranscriptionJob"]["TranscriptionJobName"]
         except KeyError as e:
             message = 'Badly formed response, expect the keys such that:' + \
                       'response["TranscriptionJob"]["TranscriptionJobName"] exists.' + \
                       f'Full exception: {e}'
             logging.error(message)
             raise KeyError(message)
+        if self.ledger is not None:
+            self.ledger.record_submission(path=audio_path, job_name=submitted_job_name,
+                                          size=row.get("size"), last_modified=row.get("last_modified"))
+        if self.job_timings is not None:
+            self.job_timings.record(submitted_job_name, JobTimings.SUBMITTED)
+        if self.job_deadlines is not None:
+            self.job_deadlines.add_job(submitted_job_name)
+        if cache_key is not None:
+            self._cache_keys[submitted_job_name] = cache_key
+        return submitted_job_name
+
+    def _call_start_transcription_job(self, client, transcribe_request: Dict) -> Dict:
+        with self.metrics.span("start_transcription_job"):
+            if self.submission_limiter is None:
+                return client.start_transcription_job(**transcribe_request)
+            with self.submission_limiter:
+                return client.start_transcription_job(**transcribe_request)
+
+    def _start_transcription_job_within_quota(self,
+                                              client,
+                                              transcribe_request: Dict,
+                                              recipe_job_id: AnyStr,
+                                              slot_acquired: bool = False) -> Dict:
+        """
+        Start a job once the job quota gate lets it through, unless its slot was already acquired by the caller.
+        The job then holds its slot until it is seen finished.
+        A submission rejected for exceeding the quota of concurrent jobs lowers the quota of the gate,
+        and is submitted again once one of the jobs in flight finishes.
+        """
+        while True:
+            if not slot_acquired:
+                self.job_quota_gate.acquire(
+                    refresh_function=functools.partial(self.get_active_job_names, recipe_job_id)
+                )
+            slot_acquired = False
+            try:
+                response = self._call_start_transcription_job(client, transcribe_request)
+            except ClientError as e:
+                self.job_quota_gate.release_slot()
+                if e.response.get("Error", {}).get("Code") == self.QUOTA_EXCEEDED_ERROR_CODE and \
+                        self.job_quota_gate.on_quota_exceeded():
+                    self.metrics.increment("job_quota_exceeded")
+                    continue
+                raise
+            except Exception:
+                self.job_quota_gate.release_slot()
+                raise
+            self.job_quota_gate.add_job(transcribe_request["TranscriptionJobName"])
+            self.metrics.gauge("jobs_in_flight", self.job_quota_gate.num_jobs_in_flight)
+            return response
+
+    def get_active_job_names(self, recipe_job_id: AnyStr) -> Set[AnyStr]:
+        """Names of the jobs of the recipe which are still QUEUED or IN_PROGRESS"""
+        return {
+            job.get("TranscriptionJobName")
+            for status in [AWSTranscribeAPIWrapper.QUEUED, AWSTranscribeAPIWrapper.IN_PROGRESS]
+            for job in self.get_list_jobs(job_name_contains=recipe_job_id, status=status)
+        }
+
+    def start_transcription_jobs(self,
+                                 batch: List[Dict],
+                                 **kwargs
+                                 ) -> List[Dict]:
+        """
+        Function starting the transcription jobs of a batch of rows, one after the other with the same client,
+        so that a failed submission does not prevent the next ones of the batch.
+        With a retry policy, a row whose submission failed transiently is not retried here, which would hold
+        the worker during the backoff delay: the time of its next attempt is recorded, for `iter_submissions`
+        to submit it again in a later batch.
+        It takes the same keyword arguments as `start_transcription_job`.
+
+        Returns:
+            list of dictionaries {"job_name": str, "error": Exception}, one per row, with either
+            the name of the job submitted or the exception raised by its submission attempt
+        """
+        responses = []
+        for row in batch:
+            path = row[PATH_COLUMN]
+            _, attempt = self._submission_retries.pop(path, (None, 1))
+            response, retry_delay_sec = self.try_start_transcription_job(row=row, attempt=attempt, **kwargs)
+            if retry_delay_sec is not None:
+                self._submission_retries[path] = (time.monotonic() + retry_delay_sec, attempt + 1)
+            responses.append(response)
+        return responses
+
+    def iter_submissions(self,
+                         parallelizer,
+                         rows: Iterable[Dict],
+                         columns: List[AnyStr],
+                         **kwargs
+                         ) -> Generator[Dict, None, None]:
+        """
+        Submit rows with a `StreamingDataFrameParallelizer` of `start_transcription_jobs`, and yield the output row
+        of each of them once its submission succeeded or failed for good.
+        A row to retry is requeued with the time of its next attempt, and submitted again along with the next rows
+        once due. When all the rows are submitted, the rows left to retry are submitted as they become due.
+        It takes the same keyword arguments as `start_transcription_job`.
+
+        Yields:
+            Output rows of the parallelizer, with the `columns` of the input rows
+        """
+        retry_queue = []  # (time of the next attempt, sequence number, row)
+        sequence_numbers = itertools.count()
+        rows = iter(rows)
+        while True:
+            for output_row in parallelizer.iter_run(rows=self._generate_due_rows(rows, retry_queue),
+                                                    columns=columns,
+                                                    **kwargs):
+                retry = self._submission_retries.get(output_row[PATH_COLUMN])
+                if retry is None:
+                    yield output_row
+                else:
+                    row = {column_name: output_row[column_name] for column_name in columns}
+                    heapq.heappush(retry_queue, (retry[0], next(sequence_numbers), row))
+            # Rows requeued by the last batches are submitted by another run of the parallelizer
+            if not retry_queue:
+                return
+            # All the rows were read and no batch is in flight anymore, so nothing is held while waiting
+            time.sleep(max(0.0, retry_queue[0][0] - time.monotonic()))
+
+    @staticmethod
+    def _generate_due_rows(rows: Iterable[Dict], retry_queue: List[Tuple]) -> Generator[Dict, None, None]:
+        """
+        Yield the rows, each preceded by the requeued rows due for retry, then the requeued rows already due.
+        It never waits for a row to retry, so that the next rows and the results of the batches are not held.
+        """
+        for row in rows:
+            while retry_queue and retry_queue[0][0] <= time.monotonic():
+                yield heapq.heappop(retry_queue)[2]
+            yield row
+        while retry_queue and retry_queue[0][0] <= time.monotonic():
+            yield heapq.heappop(retry_queue)[2]
+
+    def try_start_transcription_job(self,
+                                    row: Dict,
+                                    attempt: int = 1,
+                                    **kwargs
+                                    ) -> Tuple[Dict, float]:
+        """
+        Attempt to start the transcription job of a row once the circuit breaker lets submissions through,
+        recording the outcome in the circuit breaker.
+        It takes the same keyword arguments as `start_transcription_job`.
+
+        Returns:
+            Tuple with the dictionary {"job_name": str, "error": Exception} of the attempt, and the delay before
+            the next attempt if the submission failed transiently and may be attempted again, else None
+        """
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.wait()
+        try:
+            job_name = self.start_transcription_job(row=row, **kwargs)
+        except self.SUBMISSION_EXCEPTIONS as e:
+            retryable = self.is_retryable_submission_error(e)
+            if retryable and self.circuit_breaker is not None:
+                self.circuit_breaker.record(success=False)
+            if retryable and self.retry_policy is not None and attempt < self.retry_policy.max_attempts:
+                retry_delay_sec = self.retry_policy.get_delay_sec(attempt)
+                logging.warning(f"Submission of {row[PATH_COLUMN]} failed transiently at attempt {attempt}, "
+                                f"submitting it again in {retry_delay_sec:.1f} seconds")
+                self.metrics.increment("submission_retries")
+                return {"job_name": "", "error": e}, retry_delay_sec
+            return {"job_name": "", "error": e}, None
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(success=True)
+        return {"job_name": job_name, "error": None}, None
+
+    @classmethod
+    def is_retryable_submission_error(cls, error: Exception) -> bool:
+        """
+        Whether a submission error is transient: throttling, a server error or a network error,
+        once botocore retries are exhausted. Other errors, e.g., invalid parameters, fail again if retried.
+        """
+        # The API error raised by the client is kept as the cause of the errors raised by the wrapper
+        error = error.__cause__ or error
+        if isinstance(error, ClientError):
+            error_code = error.response.get("Error", {}).get("Code")
+            status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+            return error_code in cls.THROTTLING_ERROR_CODES or status_code >= 500
+        return isinstance(error, (BotoCoreConnectionError, HTTPClientError))
+
+    @staticmethod
+    def parse_batch_submission_response(batch: List[Dict],
+                                        response: List[Dict],
+                                        output_column_names: NamedTuple
+                                        ) -> List[Dict]:
+        """
+        Parse the response of `start_transcription_jobs` into one output row per input row,
+        as expected by the `batch_response_parser` of the parallelizer.
+        """
+        output = []
+        for row, row_response in zip(batch, response):
+            error = row_response["error"]
+            output_row = {
+                **row,
+                output_column_names.response: row_response["job_name"],
+                output_column_names.error_message: "",
+                output_column_names.error_type: "",
+                output_column_names.error_raw: ""
+            }
+            if error is not None:
+                output_row[output_column_names.error_message] = str(error)
+                output_row[output_column_names.error_type] = f"{type(error).__module__}.{type(error).__qualname__}"
+                output_row[output_column_names.error_raw] = str(error.args)
+            output.append(output_row)
+        return output
+
+    def _get_cache_key(self,
+                       bucket: AnyStr,
+                       key: AnyStr,
+                       **job_options) -> AnyStr:
+        """
+        Key of the transcript cache for an audio file in S3 and the job options,
+        None if the identity of the file could not be read.
+        """
+        try:
+            head = self.s3_client.head_object(Bucket=bucket, Key=key)
+        except self.API_EXCEPTIONS as e:
+            logging.warning(f"Transcript cache not used for s3://{bucket}/{key}, the file could not be read: {e}")
+            return None
+        return TranscriptCache.make_key(etag=head.get("ETag"), size_bytes=head.get("ContentLength"), **job_options)
 
     def get_list_jobs(self,
                       job_name_contains: AnyStr,
+                      status: AnyStr = None
                       ) -> List[Dict]:
         """
-        Get the list of jobs that contains "job_name_contains" in the job name.
+        Get the list of jobs that contains "job_name_contains" in the job name, optionally filtered by status.
         The AWS API will give a list of jobs with at most 100 jobs, to get more than that, we have to go
         through the other pages by precising the NextToken argument to the next call of the API.
 
         Returns:
             list of dictionary representing a summary of the jobs
         """
-        next_token = None
         result = []
-        i = 0
-        logging.info(f"Fetching list_transcription_jobs:")
-        while True:
+        logging.info(f"Fetching list_transcription_jobs (status: {status}):")
+        # With a region pool, the jobs of all the regions are listed one region after the other
+        clients = [self.client] if self.region_pool is None else list(self.region_pool.clients.values())
+        for client in clients:
+            next_token = None
+            i = 0
+            while True:
+
+                try:
+                    args = {
+                        "JobNameContains": job_name_contains,
+                        "MaxResults": LIST_JOBS_MAX_RESULTS
+                    }
+                    if status is not None:
+                        args["Status"] = status
+                    if next_token is not None:
+                        args["NextToken"] = next_token
+                    self.num_polling_requests += 1
+                    with self.metrics.span("list_transcription_jobs"):
+                        response = client.list_transcription_jobs(
+                            **args
+                        )
+
+                except Exception as e:
+                    message = f"Exception raised when trying to reach the page {i} of the job list. " + \
+                              f"Full exception: {e}"
+                    logging.error(message)
+                    raise APITranscriptionJobError(message)
+
+                # If next_token is not None, it means there are more than one page, so we have to loop over them
+                next_token = response.get("NextToken", None)
+                result += response.get("TranscriptionJobSummaries", [])
+                i += 1
+                if next_token is None:
+                    break
+
+        return result
+
+    def get_transcription_job(self,
+                              job_name: AnyStr
+                              ) -> Dict:
+        """
+        Get the description of a single job. The description holds the same keys as the job summaries
+        returned by `get_list_jobs`, so both can be parsed by `_result_parser`.
+
+        Returns:
+            dictionary describing the job
+        """
+        try:
+            self.num_polling_requests += 1
+            with self.metrics.span("get_transcription_job"):
+                response = self._get_job_client(job_name).get_transcription_job(TranscriptionJobName=job_name)
+        except Exception as e:
+            message = f"Exception raised when trying to get the job {job_name}. Full exception: {e}"
+            logging.error(message)
+            raise APITranscriptionJobError(message)
+        return response.get("TranscriptionJob", {})
+
+    def _get_job_client(self, job_name: AnyStr):
+        """Client of the region of a job, the jobs submitted to a region of the pool ending with its name"""
+        if self.region_pool is not None:
+            return self.region_pool.get_client(job_name) or self.client
+        return self.client
+
+    def delete_transcription_job(self, job_name: AnyStr) -> bool:
+        """
+        Delete a job, which stops it if it is still QUEUED or IN_PROGRESS so that it no longer counts in the quota
+        of concurrent jobs, and removes it from the job listings.
+        Errors are only logged, as the job is already given up by the recipe.
+
+        Returns:
+            True if the job was deleted
+        """
+        try:
+            with self.metrics.span("delete_transcription_job"):
+                self._get_job_client(job_name).delete_transcription_job(TranscriptionJobName=job_name)
+        except self.API_EXCEPTIONS as e:
+            logging.warning(f"AWS transcribe job {job_name} could not be deleted: {e}")
+            return False
+        self.metrics.increment("jobs_deleted")
+        return True
+
+    def delete_finished_jobs(self,
+                             recipe_job_id: AnyStr,
+                             output_folder_bucket: AnyStr,
+                             output_folder_root_path: AnyStr) -> int:
+        """
+        Delete the COMPLETED and FAILED jobs of a recipe run, in all the regions of the pool, together with their
+        JSON results in the `response/` directory of the output folder, once the results are written.
+        Leftover jobs would otherwise slow down the job listings of the next runs, which page through all of them.
 
+        Returns:
+            number of jobs deleted
+        """
+        try:
+            job_names = [
+                job.get("TranscriptionJobName")
+                for status in [AWSTranscribeAPIWrapper.COMPLETED, AWSTranscribeAPIWrapper.FAILED]
+                for job in self.get_list_jobs(job_name_contains=recipe_job_id, status=status)
+            ]
+        except APITranscriptionJobError as e:
+            logging.warning(f"Finished jobs of the run {recipe_job_id} not deleted: {e}")
+            return 0
+        deleted_job_names = [job_name for job_name in job_names if self.delete_transcription_job(job_name)]
+        keys = [f"{output_folder_root_path}/response/{job_name}.json" for job_name in deleted_job_names]
+        for batch in chunked(keys, S3_DELETE_MAX_KEYS):
             try:
-                args = {
-                    "JobNameContains": job_name_contains,
-                    "MaxResults": 100
-                }
-                if next_token is not None:
-                    args["NextToken"] = next_token
-                response = self.client.list_transcription_jobs(
-                    **args
+                response = self.s3_client.delete_objects(
+                    Bucket=output_folder_bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
                 )
+            except self.API_EXCEPTIONS as e:
+                logging.warning(f"JSON results of {len(batch)} job(s) could not be deleted: {e}")
+                continue
+            for error in response.get("Errors", []):
+                logging.warning(f"JSON result {error.get('Key')} could not be deleted: {error.get('Message')}")
+        logging.info(f"{len(deleted_job_names)} finished job(s) of the run {recipe_job_id} deleted, "
+                     f"out of {len(job_names)}")
+        return len(deleted_job_names)
 
-            except Exception as e:
-                message = f"Exception raised when trying to reach the page {i} of the job list. Full exception: {e}"
-                logging.error(message)
-                raise APITranscriptionJobError(message)
+    def _get_due_jobs(self, scheduler: PollingScheduler, pending_jobs: Iterable[AnyStr]) -> List[AnyStr]:
+        """
+        Jobs to probe in a polling round: the jobs due according to the scheduler, and the pending jobs
+        which reached their deadline since the last round, so that they are given up without waiting for their turn.
+        """
+        due_jobs = scheduler.get_due_jobs()
+        if self.job_deadlines is not None:
+            scheduled_jobs = set(due_jobs)
+            due_jobs += [
+                job_name for job_name in self.job_deadlines.pop_expired()
+                if job_name in pending_jobs and job_name not in scheduled_jobs
+            ]
+        return due_jobs
 
-            # If next_token is not None, it means there are more than one page, so we have to loop over them
-            next_token = response.get("NextToken", None)
-            result += response.get("TranscriptionJobSummaries", [])
-            i += 1
-            if next_token is None:
-                break
+    def get_pending_jobs_update(self,
+                                pending_jobs: Set[AnyStr],
+                                recipe_job_id: AnyStr,
+                                due_jobs: List[AnyStr] = None
+                                ) -> List[Dict]:
+        """
+        Get the current state of the jobs which are still pending, without looking at the jobs already parsed.
+        When few jobs are pending, each of them is probed with `get_transcription_job`, or only the `due_jobs`
+        if specified.
+        Otherwise, only the active jobs of the recipe are listed, 100 per page: first the QUEUED ones, then the
+        IN_PROGRESS ones, so that a job starting in between is still listed. The pending jobs missing from both lists
+        have finished, and only those are probed individually, so the listing cost does not grow with the number of
+        jobs already finished. All the finished jobs are returned, but only the `due_jobs` among the active ones
+        if specified, so that the others keep their schedule.
 
-        return result
+        Returns:
+            list of dictionary representing a summary of the pending jobs
+        """
+        if len(pending_jobs) <= MAX_PENDING_JOBS_TO_PROBE:
+            jobs_to_probe = pending_jobs if due_jobs is None else [job for job in due_jobs if job in pending_jobs]
+            return [self.get_transcription_job(job_name) for job_name in jobs_to_probe]
+
+        active_jobs = {}
+        for status in [AWSTranscribeAPIWrapper.QUEUED, AWSTranscribeAPIWrapper.IN_PROGRESS]:
+            for job in self.get_list_jobs(job_name_contains=recipe_job_id, status=status):
+                if job.get("TranscriptionJobName") in pending_jobs:
+                    active_jobs[job.get("TranscriptionJobName")] = job
+        finished_jobs = [
+            self.get_transcription_job(job_name) for job_name in pending_jobs if job_name not in active_jobs
+        ]
+        if due_jobs is not None:
+            due_jobs = set(due_jobs)
+            active_jobs = {job_name: job for job_name, job in active_jobs.items() if job_name in due_jobs}
+        return list(active_jobs.values()) + finished_jobs
+
+    @staticmethod
+    def get_output_columns(display_json: bool, include_timings: bool = False) -> List[AnyStr]:
+        """
+        List the columns of the rows returned by `iter_results`, in order.
+        The timestamps of the lifecycle of each job are included if the wrapper records job timings.
+        """
+        columns = ["path", "job_name", "transcript", "language_code", "language", "json",
+                   "output_error_type", "output_error_message"]
+        if not display_json:
+            columns.remove("json")
+        if include_timings:
+            columns += JobTimings.COLUMNS
+        return columns
 
     def get_results(self,
                     submitted_jobs: pd.DataFrame,
@@ -227,43 +913,306 @@ class AWSTranscribeAPIWrapper:
             and an error if the job failed.
 
         """
+        job_results = pd.DataFrame(
+            list(self.iter_results(submitted_jobs=submitted_jobs,
+                                   recipe_job_id=recipe_job_id,
+                                   display_json=display_json,
+                                   transcript_json_loader=transcript_json_loader,
+                                   **kwargs)),
+            columns=self.get_output_columns(display_json, include_timings=self.job_timings is not None)
+        )
+        return job_results
 
-        mask = submitted_jobs["output_error_type"] == ""
-        res = submitted_jobs[~mask].set_index("output_response").to_dict("index")
+    def iter_results(self,
+                     submitted_jobs: Union[pd.DataFrame, Iterable[Dict]],
+                     recipe_job_id: AnyStr,
+                     display_json: bool,
+                     transcript_json_loader: Callable,
+                     **kwargs) -> Generator[Dict, None, None]:
+        """
+        Yield the result of each submitted job as soon as it is known, so that results can be written
+        without keeping all of them in memory. Jobs which could not be submitted are yielded as soon as they are read.
+        Arguments are the same as `get_results`, but the submitted jobs can also be an iterable of rows like those of
+        the DataFrame, e.g., yielded by `iter_submissions`: the jobs are then polled while the next ones are submitted,
+        and only the rows of the jobs still pending are kept in memory.
 
-        submitted_jobs_dict = submitted_jobs[mask].set_index("output_response").to_dict("index")
+        Yields:
+            Dictionary {'path': str, 'job_name': str, 'transcript': str, 'language': str, 'language_code': str
+                        'json': str, 'output_error_type': str, 'output_error_message': str}
 
-        # res will be of the form {"job_name_0": {"job_name": str, "transcript": str, ...},
-        #                             ...,
-        #                          "job_name_n: {"job_name": str, "transcript": str, ...} }
+        """
+        for job_data in self._iter_job_results(submitted_jobs=submitted_jobs,
+                                               recipe_job_id=recipe_job_id,
+                                               display_json=display_json,
+                                               transcript_json_loader=transcript_json_loader,
+                                               **kwargs):
+            yield self._record_result(job_data)
 
-        while True:
-            jobs = self.get_list_jobs(job_name_contains=recipe_job_id)
+    def _record_result(self, job_data: Dict) -> Dict:
+        """
+        Record the result of a job in the ledger, and add its timestamps if job timings are recorded,
+        right before it is handed to the writer of the output dataset.
+        """
+        if self.ledger is not None:
+            self.ledger.record_result(job_data)
+        if self.job_timings is not None:
+            job_data.update(self.job_timings.pop(job_data["job_name"]))
+        return job_data
+
+    def _iter_job_results(self,
+                          submitted_jobs: Union[pd.DataFrame, Iterable[Dict]],
+                          recipe_job_id: AnyStr,
+                          display_json: bool,
+                          transcript_json_loader: Callable,
+                          **kwargs) -> Generator[Dict, None, None]:
+        # Rows of submitted jobs given as an iterable are read by a thread as they are yielded, e.g., by the
+        # submission threads, so that the first jobs are polled while the next ones are submitted
+        submission_queue = queue.Queue()
+        submitted_jobs_dict = {}
+        pending_jobs = set()
+        scheduler = PollingScheduler(max_requests_per_sec=self.max_polling_requests_per_sec)
+        next_polling_time = float("inf")
+        num_polling_requests = self.num_polling_requests
+
+        # Transcripts of completed jobs are downloaded by a pool of threads while polling goes on,
+        # and handed back through a queue
+        download_queue = queue.Queue()
+        num_pending_downloads = 0
+        with ThreadPoolExecutor(max_workers=self.download_workers) as download_pool, \
+                ThreadPoolExecutor(max_workers=1) as submission_pool:
+            if isinstance(submitted_jobs, pd.DataFrame):
+                for row in submitted_jobs.to_dict("records"):
+                    submission_queue.put(row)
+                submission_future = None
+            else:
+                submission_future = submission_pool.submit(self._queue_submitted_jobs,
+                                                           submitted_jobs=submitted_jobs,
+                                                           submission_queue=submission_queue)
+            while True:
+                # Checked before reading the queue, so that no row put in the queue meanwhile is missed
+                submissions_done = submission_future is None or submission_future.done()
+                if submission_future is not None and submissions_done:
+                    submission_future.result()
+                num_pending_jobs = len(pending_jobs)
+                for row in self._get_queued_rows(submission_queue):
+                    if row["output_error_type"] != "":
+                        job_data = self._get_empty_job_data(path=row["path"], job_name="", display_json=display_json)
+                        job_data["output_error_type"] = row["output_error_type"]
+                        job_data["output_error_message"] = row["output_error_message"]
+                        yield job_data
+                        continue
+                    job_name = row["output_response"]
+                    submitted_jobs_dict[job_name] = row
+                    # Results found in the cache are read by the download threads
+                    if job_name in self._cache_hits:
+                        num_pending_downloads += 1
+                        download_pool.submit(self._load_cached_result,
+                                             download_queue=download_queue,
+                                             path=row["path"],
+                                             cache_key=self._cache_hits.pop(job_name),
+                                             display_json=display_json)
+                        continue
+                    # Jobs completed during a previous run are not polled again, their transcripts are downloaded
+                    job = self.ledger.get_completed_job(job_name) if self.ledger is not None else None
+                    if job is not None:
+                        num_pending_downloads += 1
+                        download_pool.submit(self._download_result,
+                                             download_queue=download_queue,
+                                             path=row["path"],
+                                             display_json=display_json,
+                                             job=job,
+                                             transcript_json_loader=transcript_json_loader,
+                                             **kwargs)
+                        continue
+                    pending_jobs.add(job_name)
+                    scheduler.add_job(job_name, size_bytes=row.get("size"))
+                if len(pending_jobs) > num_pending_jobs:
+                    next_polling_time = min(next_polling_time, time.monotonic() + scheduler.get_waiting_time_sec())
+                if submissions_done and len(pending_jobs) == 0 and num_pending_downloads == 0:
+                    break
 
-            # loop over all jobs
-            for job in jobs:
-                job_name = job.get("TranscriptionJobName")
-                if job_name not in res:
+                # Without pending jobs, there is nothing to poll: wait for the downloads, or the next submissions
+                waiting_time_sec = max(0.0, next_polling_time - time.monotonic()) if len(pending_jobs) > 0 else None
+                if not submissions_done:
+                    waiting_time_sec = min(waiting_time_sec if waiting_time_sec is not None else float("inf"),
+                                           SUBMITTED_JOBS_CHECK_INTERVAL_SEC)
+                for job_data in self._get_downloaded_results(download_queue, waiting_time_sec):
+                    num_pending_downloads -= 1
+                    yield job_data
+                if len(pending_jobs) == 0 or time.monotonic() < next_polling_time:
+                    continue
+
+                num_polling_requests = self.num_polling_requests
+                jobs = self.get_pending_jobs_update(pending_jobs=pending_jobs,
+                                                    recipe_job_id=recipe_job_id,
+                                                    due_jobs=self._get_due_jobs(scheduler, pending_jobs))
+
+                # loop over the jobs which were still pending at the beginning of the round
+                for job in jobs:
+                    job_name = job.get("TranscriptionJobName")
+                    if self.job_timings is not None:
+                        self._record_job_events(job)
+                    if job.get("TranscriptionJobStatus") == AWSTranscribeAPIWrapper.COMPLETED:
+                        pending_jobs.discard(job_name)
+                        scheduler.complete(job_name, duration_sec=self._get_job_duration_sec(job))
+                        num_pending_downloads += 1
+                        download_pool.submit(self._download_result,
+                                             download_queue=download_queue,
+                                             path=submitted_jobs_dict.pop(job_name)["path"],
+                                             display_json=display_json,
+                                             job=job,
+                                             transcript_json_loader=transcript_json_loader,
+                                             **kwargs)
+                        continue
                     job_data = self._result_parser(path=submitted_jobs_dict[job_name]["path"],
                                                    display_json=display_json,
                                                    job=job,
                                                    transcript_json_loader=transcript_json_loader,
                                                    **kwargs)
                     if job_data is not None:
-                        res[job_name] = job_data
+                        pending_jobs.discard(job_name)
+                        submitted_jobs_dict.pop(job_name)
+                        scheduler.complete(job_name, update_estimate=False)
+                        yield job_data
+                    else:
+                        scheduler.reschedule(job_name)
+                next_polling_time = time.monotonic() + scheduler.get_waiting_time_sec(
+                    num_requests_last_round=self.num_polling_requests - num_polling_requests
+                )
+                self.metrics.gauge("pending_jobs", len(pending_jobs))
+                self.metrics.gauge("pending_downloads", num_pending_downloads)
+                logging.info(f"Polling state: {scheduler.get_state()}, {num_pending_downloads} pending download(s)")
 
-            pending_jobs = [
-                job for job in jobs if job.get("TranscriptionJobName") not in res and \
-                                       job.get("TranscriptionJobStatus") in [AWSTranscribeAPIWrapper.QUEUED,
-                                                                             AWSTranscribeAPIWrapper.IN_PROGRESS]
-            ]
-            if len(pending_jobs) == 0:
-                break
+    @staticmethod
+    def _queue_submitted_jobs(submitted_jobs: Iterable[Dict], submission_queue: queue.Queue) -> None:
+        """Put the rows of the submitted jobs in the queue as soon as they are yielded"""
+        for row in submitted_jobs:
+            submission_queue.put(row)
 
-            time.sleep(SLEEPING_TIME_BETWEEN_ROUNDS_SEC)
+    @staticmethod
+    def _get_queued_rows(submission_queue: queue.Queue) -> Generator[Dict, None, None]:
+        """Yield the rows already in the queue, without waiting"""
+        while True:
+            try:
+                yield submission_queue.get_nowait()
+            except queue.Empty:
+                return
 
-        job_results = pd.DataFrame.from_dict(res, orient='index')
-        return job_results
+    def _record_job_events(self, job: Dict) -> None:
+        """
+        Record the lifecycle events of a job seen by polling.
+        The creation time is only used for jobs submitted by a previous run, whose submission was not recorded.
+        """
+        job_name = job.get("TranscriptionJobName")
+        if job.get("CreationTime") is not None:
+            self.job_timings.record(job_name, JobTimings.SUBMITTED, job["CreationTime"].timestamp(), overwrite=False)
+        job_status = job.get("TranscriptionJobStatus")
+        if job_status == AWSTranscribeAPIWrapper.IN_PROGRESS:
+            self.job_timings.record(job_name, JobTimings.IN_PROGRESS_SEEN, overwrite=False)
+        elif job_status in [AWSTranscribeAPIWrapper.COMPLETED, AWSTranscribeAPIWrapper.FAILED]:
+            if job.get("CompletionTime") is not None:
+                self.job_timings.record(job_name, JobTimings.AWS_COMPLETED, job["CompletionTime"].timestamp())
+            self.job_timings.record(job_name, JobTimings.COMPLETION_DETECTED)
+
+    def _download_result(self,
+                         download_queue: queue.Queue,
+                         **kwargs) -> None:
+        """
+        Parse the result of a completed job, downloading its transcript, and put it in the queue
+        together with the exception raised if any, so that it can be raised by the polling thread.
+        """
+        try:
+            download_queue.put((self._fetch_result(**kwargs), None))
+        except Exception as e:
+            download_queue.put((None, e))
+
+    def _fetch_result(self, **kwargs) -> Dict:
+        """
+        Parse the result of a completed job, downloading its transcript at the pace set by the rate limiter.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.DOWNLOAD_OPERATION)
+        return self._result_parser(**kwargs)
+
+    def _load_cached_result(self,
+                            download_queue: queue.Queue,
+                            path: AnyStr,
+                            cache_key: AnyStr,
+                            display_json: bool) -> None:
+        """
+        Create the row of a file from the transcript cache and put it in the queue, like `_download_result`.
+        """
+        try:
+            download_queue.put((self._get_cached_result(path, cache_key, display_json), None))
+        except Exception as e:
+            download_queue.put((None, e))
+
+    def _get_cached_result(self,
+                           path: AnyStr,
+                           cache_key: AnyStr,
+                           display_json: bool) -> Dict:
+        """
+        Create the row of a file from the transcript cache.
+        """
+        try:
+            entry = self.transcript_cache.get(cache_key)
+        finally:
+            self.transcript_cache.unpin(cache_key)
+        if entry is None:
+            raise ResponseFormatError(f"Transcript of {path} deleted from the cache storage during the run")
+        job_data = self._get_empty_job_data(path=path, job_name=entry["job_name"], display_json=display_json)
+        self._fill_transcript(job_data, json_results=entry["json"], language_code=entry["language_code"],
+                              display_json=display_json)
+        return job_data
+
+    @staticmethod
+    def _get_downloaded_results(download_queue: queue.Queue,
+                                waiting_time_sec: float = None) -> Generator[Dict, None, None]:
+        """
+        Yield the results put in the queue by the download threads during the waiting time.
+        If the waiting time is None, wait for one result and yield the ones already available.
+        """
+        deadline = None if waiting_time_sec is None else time.monotonic() + waiting_time_sec
+        block = True
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                job_data, error = download_queue.get(block=block and timeout != 0.0, timeout=timeout)
+            except queue.Empty:
+                return
+            if error is not None:
+                raise error
+            yield job_data
+            if deadline is None:
+                block = False
+
+    @staticmethod
+    def _get_empty_job_data(path: AnyStr, job_name: AnyStr, display_json: bool) -> Dict:
+        """
+        Creates one row of the final DataFrame, with empty results.
+        """
+        job_data = {
+            "path": path,
+            "job_name": job_name,
+            "transcript": "",
+            "language_code": "",
+            "language": "",
+            "json": "",
+            "output_error_type": "",
+            "output_error_message": ""
+        }
+        if not display_json:
+            del job_data["json"]
+        return job_data
+
+    @staticmethod
+    def _get_job_duration_sec(job: Dict) -> float:
+        """Duration of a finished job according to AWS, or None if the job summary lacks the timestamps"""
+        creation_time = job.get("CreationTime")
+        completion_time = job.get("CompletionTime")
+        if creation_time is None or completion_time is None:
+            return None
+        return (completion_time - creation_time).total_seconds()
 
     def _result_parser(self,
                        path: str,
@@ -287,36 +1236,30 @@ class AWSTranscribeAPIWrapper:
         # dataiku folder or custom folder for testing
         folder = kwargs["folder"]
 
-        job_data = {
-            "path": path,
-            "job_name": job_name,
-            "transcript": "",
-            "language_code": "",
-            "language": "",
-            "json": "",
-            "output_error_type": "",
-            "output_error_message": ""
-        }
-        if not display_json:
-            del job_data["json"]
+        job_data = self._get_empty_job_data(path=path, job_name=job_name, display_json=display_json)
 
         if job_status in [AWSTranscribeAPIWrapper.QUEUED, AWSTranscribeAPIWrapper.IN_PROGRESS]:
-            return self.check_job_timeout(job, job_data)
+            job_data = self.check_job_timeout(job, job_data)
+            if job_data is not None:
+                # The job is stopped rather than left running, using the quota of concurrent jobs
+                self.delete_transcription_job(job_name)
+                self.metrics.increment("jobs_finished", tags={"status": JOB_TIMEOUT_ERROR_TYPE})
+                self._release_job(job_name)
+            return job_data
         elif job_status == AWSTranscribeAPIWrapper.COMPLETED:
 
             # Result json is being read by function. The Transcript will be there.
-            json_results = transcript_json_loader(folder, job_name)
-            try:
-                job_data["transcript"] = json_results.get("results").get("transcripts")[0].get("transcript")
-                job_data["language_code"] = job.get("LanguageCode")
-                job_data["language"] = SUPPORTED_LANGUAGES.get(job.get("LanguageCode"))
-            except Exception as e:
-                message = 'Badly formed response, missing keys in the JSON job result.' + \
-                          f'Full exception: {e}'
-                logging.error(message)
-                raise ResponseFormatError(message)
-            if display_json:
-                job_data["json"] = json_results
+            with self.metrics.span("transcript_download"):
+                json_results = transcript_json_loader(folder, job_name)
+            if self.job_timings is not None:
+                self.job_timings.record(job_name, JobTimings.TRANSCRIPT_FETCHED)
+            self._fill_transcript(job_data, json_results=json_results, language_code=job.get("LanguageCode"),
+                                  display_json=display_json)
+            cache_key = self._cache_keys.pop(job_name, None)
+            if cache_key is not None:
+                self.transcript_cache.put(cache_key, {"job_name": job_name,
+                                                      "language_code": job.get("LanguageCode"),
+                                                      "json": json_results})
             logging.info(f"AWS transcribe job {job_name} completed with success.")
 
         elif job_status == AWSTranscribeAPIWrapper.FAILED:
@@ -330,25 +1273,54 @@ class AWSTranscribeAPIWrapper:
         else:
             logging.warning(f"Unknown state encountered: {job_status}")
             raise UnknownStatusError(f"Unknown state encountered: {job_status}")
+        self.metrics.increment("jobs_finished", tags={"status": job_status})
+        self._release_job(job_name)
         return job_data
 
+    def _release_job(self, job_name: AnyStr) -> None:
+        """Stop counting a finished job in its region and in the quota of concurrent jobs"""
+        if self.region_pool is not None:
+            self.region_pool.release_job(job_name)
+        if self.job_quota_gate is not None:
+            self.job_quota_gate.release_job(job_name)
+        if self.job_deadlines is not None:
+            self.job_deadlines.remove_job(job_name)
+
+    @staticmethod
+    def _fill_transcript(job_data: Dict,
+                         json_results: Dict,
+                         language_code: AnyStr,
+                         display_json: bool) -> None:
+        """
+        Fill the transcript and language of a row from the JSON result of a completed job.
+        """
+        try:
+            job_data["transcript"] = json_results.get("results").get("transcripts")[0].get("transcript")
+            job_data["language_code"] = language_code
+            job_data["language"] = SUPPORTED_LANGUAGES.get(language_code)
+        except Exception as e:
+            message = 'Badly formed response, missing keys in the JSON job result.' + \
+                      f'Full exception: {e}'
+            logging.error(message)
+            raise ResponseFormatError(message)
+        if display_json:
+            job_data["json"] = json_results
+
     def check_job_timeout(self,
                           job_summary: Dict,
                           job_res_data: Dict):
         """
-        If the job duration is longer than the timeout setup previously, a JOB_TIMEOUT_ERROR will
-        be written in the column error of the Dataframe, otherwise it returns None.
+        If the job reached its deadline, a JOB_TIMEOUT_ERROR will be written in the column error
+        of the Dataframe, otherwise it returns None.
+        Jobs submitted by a previous run get their deadline from their creation time when they are first seen.
         """
-
-        date_job_created = job_summary.get("CreationTime")
-        now = datetime.datetime.now(tz=date_job_created.tzinfo)
-        time_delta_min = int((now - date_job_created).seconds / 60)
-        logging.info(
-            f"{job_summary.get('TranscriptionJobStatus')} | {job_summary.get('TranscriptionJobName')} | {time_delta_min} min")
-        if self.use_timeout and time_delta_min >= self.timeout_min:
-            logging.warning(f'Job {job_summary.get("TranscriptionJobName")} canceled after a timeout of {self.timeout_min} minutes!')
-            job_res_data["output_error_type"] = JOB_TIMEOUT_ERROR_TYPE
-            job_res_data["output_error_message"] = JOB_TIMEOUT_ERROR_MESSAGE
-            return job_res_data
-        else:
+        if self.job_deadlines is None:
+            return None
+        job_name = job_summary.get("TranscriptionJobName")
+        self.job_deadlines.add_job(job_name, created_at=job_summary.get("CreationTime"))
+        if not self.job_deadlines.is_expired(job_name):
             return None
+        logging.warning(f"Job {job_name} canceled after a timeout of {self.timeout_min} minutes!")
+        job_res_data["output_error_type"] = JOB_TIMEOUT_ERROR_TYPE
+        job_res_data["output_error_message"] = JOB_TIMEOUT_ERROR_MESSAGE
+        return job_res_data
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""Module running the submission, polling and download of Amazon Transcribe jobs as tasks of one event loop"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AnyStr, AsyncGenerator, Callable, Dict, Generator, Iterable
+
+from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
+from dku_constants import DEFAULT_ASYNC_MAX_CONCURRENT_REQUESTS
+from dku_constants import DEFAULT_MAX_JOBS_IN_FLIGHT
+from plugin_io_utils import PATH_COLUMN
+from polling_scheduler import PollingScheduler
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+_NO_MORE_ROWS = object()
+"""Marker returned once all the input rows have been read"""
+
+
+class AsyncAWSTranscribeAPIWrapper(AWSTranscribeAPIWrapper):
+    """Variant of the wrapper running each stage of a job as a task of one event loop, instead of a thread.
+
+    Files are submitted as soon as they are read from the input rows, the pending jobs are polled by a single task,
+    and the transcripts of completed jobs are downloaded by one task per job. Waiting for a job, for the next polling
+    round or for the submission of the next files does not hold any thread: only the blocking calls to the API are
+    bridged to a thread pool of `max_concurrent_requests` threads. Up to `max_jobs_in_flight` jobs are tracked at once,
+    the next rows being read only when a job finishes.
+
+    With a job quota gate, the slot of the next job is also acquired from the gate before its row is read, without
+    waiting in a thread, so that the threads of the pool are not held waiting for it while the poller needs them
+    to see jobs finish.
+
+    Attributes:
+        max_concurrent_requests: Maximum number of blocking API calls in progress, across all stages
+        max_jobs_in_flight: Maximum number of files submitted or being submitted whose result is not yet known
+    """
+
+    # Time between two checks of the room left by the job quota gate, while it is full
+    JOB_QUOTA_CHECK_INTERVAL_SEC = 1
+
+    def __init__(self,
+                 max_concurrent_requests: int = DEFAULT_ASYNC_MAX_CONCURRENT_REQUESTS,
+                 max_jobs_in_flight: int = DEFAULT_MAX_JOBS_IN_FLIGHT,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_jobs_in_flight = max_jobs_in_flight
+        self._executor = None
+        self._request_semaphore = None
+
+    async def _call(self, function: Callable, **kwargs) -> Any:
+        """Run a blocking function in the thread pool, once fewer than `max_concurrent_requests` calls are running"""
+        async with self._request_semaphore:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, functools.partial(function, **kwargs))
+
+    async def _acquire_quota_slot(self) -> None:
+        """Acquire a slot of the job quota gate, if any, checking it at intervals instead of waiting in a thread"""
+        while self.job_quota_gate is not None and not self.job_quota_gate.try_acquire():
+            await asyncio.sleep(self.JOB_QUOTA_CHECK_INTERVAL_SEC)
+
+    async def generate_results(self,
+                               rows: Iterable[Dict],
+                               recipe_job_id: AnyStr,
+                               display_json: bool,
+                               transcript_json_loader: Callable,
+                               language: AnyStr,
+                               input_folder_bucket: AnyStr = "",
+                               input_folder_root_path: AnyStr = "",
+                               output_folder_bucket: AnyStr = "",
+                               output_folder_root_path: AnyStr = "",
+                               **kwargs) -> AsyncGenerator[Dict, None]:
+        """
+        Submit a job for each row, and yield the result of each job as soon as it is known,
+        like `iter_results` does for jobs already submitted. Rows are read lazily, e.g., while a folder is listed.
+        The submission arguments are the ones of `start_transcription_job`, the other ones the ones of `get_results`.
+
+        Yields:
+            Dictionary {'path': str, 'job_name': str, 'transcript': str, 'language': str, 'language_code': str
+                        'json': str, 'output_error_type': str, 'output_error_message': str}
+
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_requests)
+        self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        job_slots = asyncio.Semaphore(self.max_jobs_in_flight)
+        results = asyncio.Queue()
+        new_job_event = asyncio.Event()
+        pending_jobs = {}  # Path of each job being polled, by job name
+        num_rows = None  # Set once all the rows have been read
+        scheduler = PollingScheduler(max_requests_per_sec=self.max_polling_requests_per_sec)
+        tasks = set()
+
+        def start_task(coroutine) -> None:
+            task = asyncio.ensure_future(coroutine)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        async def forward_errors(coroutine) -> None:
+            # Errors of the tasks which do not report them in a row are raised by the consumer, which would else
+            # wait forever for the results of the rows not read yet or of the jobs not polled anymore
+            try:
+                await coroutine
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await results.put((None, e))
+
+        async def put_result(job_data: Dict = None, error: Exception = None) -> None:
+            job_slots.release()
+            await results.put((job_data, error))
+
+        async def fetch(path: AnyStr, **fetch_kwargs) -> None:
+            try:
+                await put_result(await self._call(self._fetch_result, path=path, display_json=display_json,
+                                                  transcript_json_loader=transcript_json_loader, **fetch_kwargs))
+            except Exception as e:
+                await put_result(error=e)
+
+        async def submit(row: Dict) -> None:
+            # Submissions failed transiently are attempted again after their backoff delay, without holding a thread.
+            # The quota slot of the first attempt is acquired by `submit_all`, and given back if the attempt fails.
+            attempt = 1
+            try:
+                while True:
+                    if attempt > 1:
+                        await self._acquire_quota_slot()
+                    if self.circuit_breaker is not None:
+                        await asyncio.sleep(self.circuit_breaker.get_waiting_time_sec())
+                    response, retry_delay_sec = await self._call(self.try_start_transcription_job,
+                                                                 row=row,
+                                                                 attempt=attempt,
+                                                                 language=language,
+                                                                 input_folder_bucket=input_folder_bucket,
+                                                                 input_folder_root_path=input_folder_root_path,
+                                                                 output_folder_bucket=output_folder_bucket,
+                                                                 output_folder_root_path=output_folder_root_path,
+                                                                 job_id=recipe_job_id,
+                                                                 quota_slot_acquired=self.job_quota_gate is not None)
+                    if retry_delay_sec is None:
+                        break
+                    await asyncio.sleep(retry_delay_sec)
+                    attempt += 1
+            except Exception as e:
+                await put_result(error=e)
+                return
+            job_name, error = response["job_name"], response["error"]
+            if error is not None:
+                job_data = self._get_empty_job_data(path=row[PATH_COLUMN], job_name="", display_json=display_json)
+                job_data["output_error_type"] = f"{type(error).__module__}.{type(error).__qualname__}"
+                job_data["output_error_message"] = str(error)
+                await put_result(job_data)
+                return
+            if job_name in self._cache_hits:
+                try:
+                    await put_result(await self._call(self._get_cached_result,
+                                                      path=row[PATH_COLUMN],
+                                                      cache_key=self._cache_hits.pop(job_name),
+                                                      display_json=display_json))
+                except Exception as e:
+                    await put_result(error=e)
+                return
+            pending_jobs[job_name] = row[PATH_COLUMN]
+            scheduler.add_job(job_name, size_bytes=row.get("size"))
+            new_job_event.set()
+
+        async def submit_all() -> None:
+            nonlocal num_rows
+            # The rows may be read from a remote storage, so they are read in the thread pool too
+            row_iterator = iter(rows)
+            num_rows_read = 0
+            while True:
+                await job_slots.acquire()
+                # The slot is acquired at once, so that no other submission can take it before this one starts
+                await self._acquire_quota_slot()
+                try:
+                    row = await asyncio.get_event_loop().run_in_executor(self._executor, next, row_iterator,
+                                                                         _NO_MORE_ROWS)
+                except BaseException:
+                    if self.job_quota_gate is not None:
+                        self.job_quota_gate.release_slot()
+                    raise
+                if row is _NO_MORE_ROWS:
+                    job_slots.release()
+                    if self.job_quota_gate is not None:
+                        self.job_quota_gate.release_slot()
+                    break
+                num_rows_read += 1
+                start_task(submit(row))
+            num_rows = num_rows_read
+            await results.put(None)  # Wakes up the consumer, in case all the results are already yielded
+
+        async def poll() -> None:
+            num_polling_requests = self.num_polling_requests
+            while True:
+                new_job_event.clear()
+                if not pending_jobs:
+                    await new_job_event.wait()
+                    continue
+                waiting_time_sec = scheduler.get_waiting_time_sec(
+                    num_requests_last_round=self.num_polling_requests - num_polling_requests
+                )
+                if waiting_time_sec > 0:
+                    try:
+                        # The waiting time is computed again when a job is added, as it may be due earlier
+                        await asyncio.wait_for(new_job_event.wait(), timeout=waiting_time_sec)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+                num_polling_requests = self.num_polling_requests
+                jobs = await self._call(self.get_pending_jobs_update,
+                                        pending_jobs=set(pending_jobs),
+                                        recipe_job_id=recipe_job_id,
+                                        due_jobs=self._get_due_jobs(scheduler, pending_jobs))
+                for job in jobs:
+                    job_name = job.get("TranscriptionJobName")
+                    if job_name not in pending_jobs:
+                        continue
+                    if self.job_timings is not None:
+                        self._record_job_events(job)
+                    if job.get("TranscriptionJobStatus") == AWSTranscribeAPIWrapper.COMPLETED:
+                        scheduler.complete(job_name, duration_sec=self._get_job_duration_sec(job))
+                        start_task(fetch(path=pending_jobs.pop(job_name), job=job, **kwargs))
+                        continue
+                    # Failed and timed out jobs are parsed without any download, but in the thread pool
+                    # as a timed out job is deleted
+                    job_data = await self._call(self._result_parser, path=pending_jobs[job_name],
+                                                display_json=display_json, job=job,
+                                                transcript_json_loader=transcript_json_loader, **kwargs)
+                    if job_data is not None:
+                        del pending_jobs[job_name]
+                        scheduler.complete(job_name, update_estimate=False)
+                        await put_result(job_data)
+                    else:
+                        scheduler.reschedule(job_name)
+                self.metrics.gauge("pending_jobs", len(pending_jobs))
+                logging.info(f"Polling state: {scheduler.get_state()}, {len(tasks)} task(s) in progress")
+
+        start_task(forward_errors(submit_all()))
+        start_task(forward_errors(poll()))
+        num_results = 0
+        try:
+            while num_rows is None or num_results < num_rows:
+                item = await results.get()
+                if item is None:
+                    continue
+                job_data, error = item
+                if error is not None:
+                    raise error
+                num_results += 1
+                yield self._record_result(job_data)
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._executor.shutdown(wait=True)
+
+    def iter_results_from_rows(self, rows: Iterable[Dict], **kwargs) -> Generator[Dict, None, None]:
+        """
+        Run `generate_results` in a new event loop, yielding its results to synchronous code like `iter_results`.
+        Arguments are the same as `generate_results`.
+        """
+        loop = asyncio.new_event_loop()
+        results = self.generate_results(rows=rows, **kwargs)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Module with concurrency limiters adapting themselves to the throttling and quotas of an API"""
+
+import logging
+import threading
+import time
+from typing import AnyStr, Callable, Set
+
+from dku_constants import DEFAULT_MAX_CONCURRENT_JOBS
+from dku_constants import JOB_QUOTA_GATE_REFRESH_INTERVAL_SEC
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the number of concurrent calls to an API, finding the highest limit which is not throttled.
+
+    Used as a context manager around each call. The limit starts low and increases by one each time
+    as many calls as the current limit have succeeded. When a call is throttled, the limit is set just below
+    the number of calls in flight at that time, and is held there for the rest of the run.
+
+    Attributes:
+        max_limit: Maximum number of concurrent calls, typically the number of threads making the calls
+        initial_limit: Number of concurrent calls allowed at the start
+        name: Name of the API operation, for logging
+    """
+
+    def __init__(self, max_limit: int, initial_limit: int = 1, name: AnyStr = "API"):
+        self.max_limit = max_limit
+        self.limit = min(initial_limit, max_limit)
+        self.name = name
+        self.ceiling = max_limit
+        self._in_flight = 0
+        self._num_successes = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._condition:
+            self._in_flight -= 1
+            if exc_type is None:
+                self._num_successes += 1
+                if self._num_successes >= self.limit and self.limit < self.ceiling:
+                    self.limit += 1
+                    self._num_successes = 0
+            self._condition.notify_all()
+        return False
+
+    def on_throttle(self) -> None:
+        """Lower the limit just below the number of calls in flight when a call is throttled, and hold it there"""
+        with self._condition:
+            ceiling = max(1, min(self.ceiling, self._in_flight - 1))
+            if ceiling < self.ceiling:
+                logging.warning(f"{self.name} throttled with {self._in_flight} concurrent call(s), "
+                                f"limiting concurrency to {ceiling}")
+            self.ceiling = ceiling
+            self.limit = min(self.limit, self.ceiling)
+            self._num_successes = 0
+
+
+class JobQuotaGate:
+    """Holds job submissions while the number of jobs in flight is at the quota of concurrent jobs of the account.
+
+    A slot is acquired before each submission, and kept by the submitted job until it is seen finished by the poller.
+    When no poller runs during the submissions, the waiting threads refresh the jobs in flight themselves with the
+    function given to `acquire`, at most every `refresh_interval_sec`. When a submission is rejected for exceeding
+    the quota, e.g., because other jobs of the account use part of it, the quota is lowered to the number of jobs
+    in flight and held there for the rest of the run.
+
+    Attributes:
+        max_jobs: Maximum number of jobs in flight, either configured or discovered
+        refresh_interval_sec: Minimum time between two refreshes of the jobs in flight
+        clock: Function returning a monotonic time in seconds
+    """
+
+    def __init__(self,
+                 max_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                 refresh_interval_sec: float = JOB_QUOTA_GATE_REFRESH_INTERVAL_SEC,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_jobs = max_jobs
+        self.refresh_interval_sec = refresh_interval_sec
+        self.clock = clock
+        self._num_reserved = 0  # Slots acquired by submissions in progress
+        self._jobs = {}  # Sequence number of each job in flight, by job name
+        self._sequence = 0
+        self._refreshing = False
+        self._last_refresh = None
+        self._condition = threading.Condition()
+
+    @property
+    def num_jobs_in_flight(self) -> int:
+        return self._num_reserved + len(self._jobs)
+
+    def has_capacity(self) -> bool:
+        """Whether a slot can be acquired without waiting"""
+        with self._condition:
+            return self.num_jobs_in_flight < self.max_jobs
+
+    def try_acquire(self) -> bool:
+        """Acquire a slot only if one is free, without waiting. The slot is then used like one from `acquire`"""
+        with self._condition:
+            if self.num_jobs_in_flight < self.max_jobs:
+                self._num_reserved += 1
+                return True
+            return False
+
+    def acquire(self, refresh_function: Callable[[], Set[AnyStr]] = None) -> None:
+        """
+        Wait for a slot before a submission. The slot is then either given to the submitted job with `add_job`,
+        or given back with `release_slot` if the submission failed.
+        While waiting, the jobs in flight are refreshed with `refresh_function` if specified,
+        which returns the names of the jobs which are still QUEUED or IN_PROGRESS.
+        """
+        while True:
+            with self._condition:
+                if self.num_jobs_in_flight < self.max_jobs:
+                    self._num_reserved += 1
+                    return
+                refresh_due = self._last_refresh is None or \
+                    self.clock() - self._last_refresh >= self.refresh_interval_sec
+                if refresh_function is None or self._refreshing or not refresh_due:
+                    self._condition.wait(timeout=self.refresh_interval_sec if refresh_function else None)
+                    continue
+                self._refreshing = True
+                sequence = self._sequence
+            # The jobs are listed outside of the lock, so that finished jobs can be released in the meantime
+            try:
+                active_job_names = refresh_function()
+            except Exception as e:
+                logging.warning(f"Jobs in flight could not be refreshed: {e}")
+                active_job_names = None
+            with self._condition:
+                self._refreshing = False
+                self._last_refresh = self.clock()
+                if active_job_names is not None:
+                    # Jobs submitted during the refresh may not be listed yet, so they are kept
+                    self._jobs = {
+                        job_name: job_sequence for job_name, job_sequence in self._jobs.items()
+                        if job_sequence >= sequence or job_name in active_job_names
+                    }
+                    # Jobs submitted by a previous run of the recipe use the quota too
+                    for job_name in active_job_names:
+                        self._jobs.setdefault(job_name, -1)
+                self._condition.notify_all()
+
+    def release_slot(self) -> None:
+        """Give back the slot of a submission which failed"""
+        with self._condition:
+            self._num_reserved -= 1
+            self._condition.notify_all()
+
+    def add_job(self, job_name: AnyStr) -> None:
+        """Give the slot of a submission to the job it started, until the job is released"""
+        with self._condition:
+            self._num_reserved -= 1
+            self._jobs[job_name] = self._sequence
+            self._sequence += 1
+
+    def release_job(self, job_name: AnyStr) -> None:
+        """Free the slot of a job which is finished, if it is in flight"""
+        with self._condition:
+            if self._jobs.pop(job_name, None) is not None:
+                self._condition.notify_all()
+
+    def on_quota_exceeded(self) -> bool:
+        """
+        Lower the quota to the number of jobs in flight when a submission is rejected for exceeding it.
+
+        Returns:
+            True if jobs are in flight, so that the submission can wait for one of them to finish
+        """
+        with self._condition:
+            num_jobs = len(self._jobs)
+            if num_jobs == 0:
+                # The quota is used by other jobs of the account, none of which can be waited for
+                return False
+            if num_jobs < self.max_jobs:
+                logging.warning(f"Quota of concurrent jobs exceeded with {num_jobs} job(s) in flight, "
+                                f"limiting jobs in flight to {num_jobs}")
+                self.max_jobs = num_jobs
+            return True
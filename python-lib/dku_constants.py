@@ -1,6 +1,112 @@
 # -*- coding: utf-8 -*-
 
-SLEEPING_TIME_BETWEEN_ROUNDS_SEC = 5
+MIN_POLLING_INTERVAL_SEC = 2
+"""Minimum time between two status checks of the same job"""
+
+MAX_POLLING_INTERVAL_SEC = 60
+"""Maximum time between two status checks of the same job"""
+
+POLLING_BACKOFF_FACTOR = 2
+"""Multiplier applied to the time between two status checks of a job which is still pending"""
+
+DEFAULT_EXPECTED_JOB_DURATION_SEC = 30
+"""Expected duration of a job before any job of the run has completed, bounding the backoff of its checks"""
+
+DEFAULT_MAX_POLLING_REQUESTS_PER_SEC = 5
+"""Default budget of status requests per second while waiting for jobs"""
+
+SUBMITTED_JOBS_CHECK_INTERVAL_SEC = 1
+"""Maximum time between two reads of the jobs submitted while the results of the previous ones are polled"""
+
+MAX_PENDING_JOBS_TO_PROBE = 10
+"""Below this number of pending jobs, each job is probed with `get_transcription_job` instead of listing jobs"""
+
+LIST_JOBS_MAX_RESULTS = 100
+"""Maximum number of job summaries returned by one page of `list_transcription_jobs`"""
+
+S3_DELETE_MAX_KEYS = 1000
+"""Maximum number of objects deleted by one call to `delete_objects`"""
+
+DEFAULT_DOWNLOAD_WORKERS = 4
+"""Default number of threads downloading the transcripts of completed jobs"""
+
+DEFAULT_SUBMISSION_BATCH_SIZE = 10
+"""Default number of jobs submitted one after the other by a submission thread, for each task of the thread pool"""
+
+DEFAULT_ASYNC_MAX_CONCURRENT_REQUESTS = 16
+"""Default number of threads making the blocking API calls of the asyncio engine, across all stages"""
+
+DEFAULT_MAX_JOBS_IN_FLIGHT = 500
+"""Default number of jobs tracked at once by the asyncio engine, from their submission until their result is known"""
+
+DEFAULT_MAX_CONCURRENT_JOBS = 250
+"""Default quota of concurrent Amazon Transcribe jobs of an account in a region, held by the job quota gate"""
+
+JOB_QUOTA_GATE_REFRESH_INTERVAL_SEC = 10
+"""Minimum time between two listings of the jobs in flight by the submissions waiting for the job quota gate"""
+
+DEFAULT_MAX_CONCURRENT_JOBS_PER_REGION = 250
+"""Default quota of concurrent Amazon Transcribe jobs of a region, used to spread jobs across the regions of a pool"""
+
+DEFAULT_MAX_SUBMISSION_ATTEMPTS = 3
+"""Default number of attempts of a submission failed because of throttling or a transient error"""
+
+SUBMISSION_RETRY_BASE_DELAY_SEC = 2
+"""Maximum delay before the first new attempt of a submission, doubled at each attempt"""
+
+SUBMISSION_RETRY_MAX_DELAY_SEC = 60
+"""Maximum delay before any new attempt of a submission"""
+
+DEFAULT_CIRCUIT_BREAKER_ERROR_RATE = 0.5
+"""Default share of transient errors in the last submissions which pauses all the submissions"""
+
+CIRCUIT_BREAKER_WINDOW_SIZE = 50
+"""Number of last submissions whose outcome is used to decide whether to pause the submissions"""
+
+CIRCUIT_BREAKER_MIN_CALLS = 20
+"""Minimum number of submissions before they can be paused"""
+
+CIRCUIT_BREAKER_COOLDOWN_SEC = 30
+"""Time during which submissions are paused when transient errors spike"""
+
+DEFAULT_SUBMISSION_REQUESTS_PER_SEC = 10
+"""Default pace of `start_transcription_job` calls"""
+
+DEFAULT_GET_JOB_REQUESTS_PER_SEC = 10
+"""Default pace of `get_transcription_job` calls"""
+
+DEFAULT_LIST_JOBS_REQUESTS_PER_SEC = 5
+"""Default pace of `list_transcription_jobs` calls"""
+
+DEFAULT_DOWNLOAD_REQUESTS_PER_SEC = 50
+"""Default pace of transcript downloads"""
+
+RUN_LEDGER_FOLDER_PATH = "ledger"
+"""Path of the run ledgers in the output folder, next to the `response` folder of the job results"""
+
+RUN_LEDGER_SYNC_INTERVAL_SEC = 30
+"""Minimum time between two uploads of the run ledger to the output folder"""
+
+TRANSCRIPT_CACHE_FOLDER_PATH = "transcript_cache"
+"""Path of the transcript cache in the output folder, when it is stored there"""
+
+TRANSCRIPT_CACHE_INDEX_SYNC_INTERVAL_SEC = 30
+"""Minimum time between two writes of the index of the transcript cache while a run is in progress"""
+
+FOLDER_SNAPSHOT_FOLDER_PATH = "snapshots"
+"""Path of the snapshots of the input folder listing in the output folder, used by the incremental mode"""
+
+OUTPUT_BATCH_SIZE = 100
+"""Number of result rows written at once to the output dataset"""
+
+METRICS_FOLDER_PATH = "metrics"
+"""Path of the metrics of each run in the output folder"""
+
+METRICS_FLUSH_INTERVAL_SEC = 30
+"""Time between two exports of the metrics by a background thread while a run is in progress"""
+
+DEFAULT_STATSD_PORT = 8125
+"""Default port of the StatsD server receiving the metrics"""
 
 SUPPORTED_AUDIO_FORMATS = ["flac", "mp3", "mp4", "ogg", "webm", "amr", "wav"]
 
@@ -1,48 +1,107 @@
 # -*- coding: utf-8 -*-
 """Module with read/write utility functions based on the Dataiku API"""
 
+import logging
 import os
-from typing import Dict, AnyStr, List
+import shutil
+from typing import Dict, AnyStr, Generator, Iterable, List
 
 import pandas as pd
+from more_itertools import chunked
 
 import dataiku
 
+from plugin_io_utils import NUM_ATTEMPTS_COLUMN
+from plugin_io_utils import PATH_COLUMN
+
 # ==============================================================================
 # CLASS AND FUNCTION DEFINITION
 # ==============================================================================
 
 
-def generate_path_df(folder: dataiku.Folder, file_extensions: List[AnyStr], path_column: AnyStr) -> pd.DataFrame:
-    """Generate a dataframe of file paths in a Dataiku Folder matching a list of extensions
+def iter_folder_paths(folder: dataiku.Folder) -> Generator[AnyStr, None, None]:
+    """Yield the file paths in a Dataiku Folder, partition by partition if the folder is partitioned"""
+    if folder.read_partitions:
+        for partition in folder.read_partitions:
+            yield from folder.list_paths_in_partition(partition)
+    else:
+        yield from folder.list_paths_in_partition()
+
+
+def list_path_details(folder: dataiku.Folder) -> Dict[AnyStr, Dict]:
+    """Get the size and last modification time of all the files in a Dataiku Folder, read at once from its root
+
+    Returns:
+        Dictionary {"size": int, "last_modified": int} (value) by file path (key)
+
+    """
+    path_details = {}
+    directories = [folder.get_path_details("/")]
+    while directories:
+        for item in directories.pop().get("children", []):
+            if item.get("directory"):
+                directories.append(item)
+            else:
+                path_details[item.get("fullPath")] = {
+                    "size": item.get("size"),
+                    "last_modified": item.get("lastModified"),
+                }
+    return path_details
+
+
+def get_path_details(folder: dataiku.Folder, path: AnyStr, listed_path_details: Dict[AnyStr, Dict]) -> Dict:
+    """Get the size and last modification time of a file in a Dataiku Folder
 
     Args:
         folder: Dataiku managed folder where files are stored
-            This folder can be partitioned or not, this function handles both
-        file_extensions: list of file extensions to match, ex: ["JPG", "PNG"]
-            Expected format is not case-sensitive but should not include leading "."
-        path_column: Name of the column in the output dataframe
+        path: File path in the folder
+        listed_path_details: Details of the files listed with `list_path_details`
+            A file missing from the listed details is looked up on its own
+
+    Returns:
+        Dictionary {"size": int, "last_modified": int}
+
+    """
+    if path in listed_path_details:
+        return listed_path_details[path]
+    details = folder.get_path_details(path)
+    return {"size": details.get("size"), "last_modified": details.get("lastModified")}
+
+
+def read_priorities(dataset: dataiku.Dataset, path_column: AnyStr, priority_column: AnyStr) -> Dict[AnyStr, float]:
+    """Read the priority of each file path from two columns of a dataset
 
     Returns:
-        DataFrame with one column named `path_column` with all the file paths matching the list of `file_extensions`
+        Dictionary of priorities (value) by file path (key), for the paths with a numeric priority
+
+    """
+    df = dataset.get_dataframe(columns=[path_column, priority_column])
+    df[priority_column] = pd.to_numeric(df[priority_column], errors="coerce")
+    df = df.dropna(subset=[path_column, priority_column])
+    # Paths are matched with the paths listed in the folder, which start with "/"
+    paths = ["/" + str(path).lstrip("/") for path in df[path_column]]
+    return dict(zip(paths, df[priority_column].astype(float)))
 
-    Raises:
-        RuntimeError: If there are not files matching the list of `file_extensions`
+
+def read_failed_files(dataset: dataiku.Dataset) -> Dict[AnyStr, int]:
+    """Read the failed files of a previous run from its dataset of failed files
+
+    Returns:
+        Dictionary of the number of runs which attempted to transcribe each file (value) by file path (key).
+        The number of attempts is 0 if the dataset has no such column, e.g., a list of paths made by hand.
 
     """
-    path_list = []
-    if folder.read_partitions:
-        for partition in folder.read_partitions:
-            path_list += folder.list_paths_in_partition(partition)
+    df = dataset.get_dataframe()
+    if PATH_COLUMN not in df.columns:
+        raise ValueError(f"Column {PATH_COLUMN} missing from the dataset of failed files {dataset.name}")
+    if NUM_ATTEMPTS_COLUMN in df.columns:
+        num_attempts = pd.to_numeric(df[NUM_ATTEMPTS_COLUMN], errors="coerce").fillna(0).astype(int)
     else:
-        path_list = folder.list_paths_in_partition()
-    filtered_path_list = [
-        path for path in path_list if os.path.splitext(path)[1][1:].lower().strip() in file_extensions
-    ]
-    if len(filtered_path_list) == 0:
-        raise RuntimeError(f"No files detected with supported extensions {file_extensions}, check input folder")
-    path_df = pd.DataFrame(filtered_path_list, columns=[path_column])
-    return path_df
+        num_attempts = pd.Series(0, index=df.index)
+    df = df.assign(**{NUM_ATTEMPTS_COLUMN: num_attempts}).dropna(subset=[PATH_COLUMN])
+    # Paths are submitted as the paths listed in the folder, which start with "/"
+    paths = ["/" + str(path).lstrip("/") for path in df[PATH_COLUMN]]
+    return dict(zip(paths, (int(num) for num in df[NUM_ATTEMPTS_COLUMN])))
 
 
 def set_column_description(
@@ -78,5 +137,95 @@ def set_column_description(
                 output_col_info["comment"] = matched_comment[0]
     output_dataset.write_schema(output_dataset_schema)
 
+
+def write_rows_by_batch(
+    output_dataset: dataiku.Dataset, rows: Iterable[Dict], columns: List[AnyStr], batch_size: int
+) -> int:
+    """Write rows to a dataset by batches, as soon as they are yielded, with a fixed schema
+
+    Only one batch of rows is held in memory at a time, and the rows already written are kept if a later one fails.
+
+    Args:
+        output_dataset: Output dataiku.Dataset instance
+        rows: Iterable of dictionaries holding the values (value) by column name (key)
+        columns: Names of the columns of the output dataset, in order
+        batch_size: Number of rows written at once
+
+    Returns:
+        Number of rows written
+
+    """
+    output_dataset.write_schema_from_dataframe(
+        pd.DataFrame(columns=columns), dropAndCreate=bool(not output_dataset.writePartition)
+    )
+    num_rows = 0
+    with output_dataset.get_writer() as writer:
+        for batch in chunked(rows, batch_size):
+            writer.write_dataframe(pd.DataFrame(batch, columns=columns))
+            num_rows += len(batch)
+            logging.info(f"{num_rows} row(s) written to dataset {output_dataset.name}")
+    return num_rows
+
+
+def copy_dataset_to_local_files(dataset: dataiku.Dataset, local_directory: AnyStr, chunk_size: int) -> List[AnyStr]:
+    """Copy the rows of a dataset to local pickle files, chunk by chunk, to read them back while it is overwritten
+
+    Only one chunk of rows is held in memory at a time.
+
+    Args:
+        dataset: dataiku.Dataset instance to copy
+        local_directory: Local directory where the files are written
+        chunk_size: Number of rows per file
+
+    Returns:
+        Paths of the local files, in the order of the rows
+
+    """
+    local_paths = []
+    for i, df in enumerate(dataset.iter_dataframes(chunksize=chunk_size, infer_with_pandas=False)):
+        local_path = os.path.join(local_directory, f"{dataset.short_name}_{i}.pkl")
+        df.to_pickle(local_path)
+        local_paths.append(local_path)
+    logging.info(f"Dataset {dataset.name} copied to {len(local_paths)} local file(s)")
+    return local_paths
+
+
+def iter_rows_from_local_files(local_paths: List[AnyStr]) -> Generator[Dict, None, None]:
+    """Yield the rows copied by `copy_dataset_to_local_files`, reading one file at a time"""
+    for local_path in local_paths:
+        yield from pd.read_pickle(local_path).to_dict("records")
+
+
+def download_file_from_folder(folder: dataiku.Folder, folder_path: AnyStr, local_path: AnyStr) -> bool:
+    """Download a file from a Dataiku Folder to a local path
+
+    Returns:
+        True if the file was downloaded, False if it does not exist in the folder
+
+    """
+    try:
+        with folder.get_download_stream(folder_path) as stream, open(local_path, "wb") as local_file:
+            shutil.copyfileobj(stream, local_file)
+    except Exception as e:
+        logging.info(f"File {folder_path} not downloaded from folder {folder.get_name()}: {e}")
+        return False
+    return True
+
+
+def upload_file_to_folder(folder: dataiku.Folder, folder_path: AnyStr, local_path: AnyStr) -> None:
+    """Upload a local file to a Dataiku Folder, overwriting the existing file if any"""
+    with open(local_path, "rb") as local_file:
+        folder.upload_stream(folder_path, local_file)
+
+
+def read_json_from_folder_if_exists(folder: dataiku.Folder, folder_path: AnyStr) -> Dict:
+    """Read a JSON file from a Dataiku Folder, returning an empty dictionary if it cannot be read"""
+    try:
+        return folder.read_json(folder_path)
+    except Exception as e:
+        logging.info(f"File {folder_path} not read from folder {folder.get_name()}: {e}")
+        return {}
+
+
 def read_json_from_folder(input_folder: dataiku.Folder, job_name: AnyStr):
-    return input_folder.read_json(f"response/{job_name}.json")
\ No newline at end of file
+    return input_folder.read_json(f"response/{job_name}.json")
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Module tracking the deadline of each Amazon Transcribe job, after which the job is given up"""
+
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+from typing import AnyStr, Callable, List
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class JobDeadlineTracker:
+    """Absolute deadline of each job in flight, on a monotonic clock, kept in a heap ordered by deadline.
+
+    A job submitted by the run gets its deadline at submission, `timeout_sec` later. A job submitted by a previous
+    run gets its deadline when it is first seen, from its creation time: this is the only date arithmetic,
+    done once per job. Deciding whether a job is expired is then a lookup, and the expired jobs are popped
+    from the heap in O(log n) each, without going through all the jobs in flight.
+
+    Attributes:
+        timeout_sec: Time after the creation of a job at which it expires
+        clock: Function returning a monotonic time in seconds
+    """
+
+    def __init__(self, timeout_sec: float, clock: Callable[[], float] = time.monotonic):
+        self.timeout_sec = timeout_sec
+        self.clock = clock
+        self._deadlines = {}
+        self._heap = []  # (deadline, job name), with the entries of removed jobs left until they are popped
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def add_job(self, job_name: AnyStr, created_at: datetime = None) -> None:
+        """Start tracking a job, unless it is tracked already
+
+        Args:
+            job_name: Name of the job
+            created_at: Creation time of a job submitted by a previous run, None for a job just submitted.
+                A naive datetime is assumed to be in UTC, like all the timestamps of Amazon Transcribe.
+
+        """
+        with self._lock:
+            if job_name in self._deadlines:
+                return
+            deadline = self.clock() + self.timeout_sec
+            if created_at is not None:
+                deadline -= self.get_job_age_sec(created_at)
+            self._deadlines[job_name] = deadline
+            heapq.heappush(self._heap, (deadline, job_name))
+
+    def remove_job(self, job_name: AnyStr) -> None:
+        """Stop tracking a finished job, ignoring jobs which are not tracked"""
+        with self._lock:
+            self._deadlines.pop(job_name, None)
+
+    def is_expired(self, job_name: AnyStr) -> bool:
+        """True if the deadline of a tracked job has passed, False for jobs which are not tracked"""
+        with self._lock:
+            deadline = self._deadlines.get(job_name)
+            return deadline is not None and deadline <= self.clock()
+
+    def pop_expired(self) -> List[AnyStr]:
+        """List the tracked jobs expired since the last call, which stay tracked until they are removed"""
+        expired_job_names = []
+        with self._lock:
+            now = self.clock()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, job_name = heapq.heappop(self._heap)
+                if self._deadlines.get(job_name) == deadline:
+                    expired_job_names.append(job_name)
+        return expired_job_names
+
+    @staticmethod
+    def get_job_age_sec(created_at: datetime) -> float:
+        """Time elapsed since the creation of a job, in seconds, including whole days"""
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (datetime.now(timezone.utc) - created_at).total_seconds())
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Module recording the lifecycle of each Amazon Transcribe job, to break down the time spent in a run"""
+
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import AnyStr, Callable, Dict, List
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class JobTimings:
+    """Timestamps of the lifecycle of each job, and distribution of the time spent in each stage.
+
+    Events are recorded in seconds since the epoch, so that our timestamps can be compared with the ones of AWS.
+    When the result row of a job is output, its timestamps are returned as columns and the durations
+    of its stages are added to the run summary.
+
+    Attributes:
+        clock: Function returning the current time, in seconds since the epoch
+    """
+
+    SUBMITTED = "submitted_at"
+    IN_PROGRESS_SEEN = "in_progress_seen_at"
+    AWS_COMPLETED = "aws_completed_at"
+    COMPLETION_DETECTED = "completion_detected_at"
+    TRANSCRIPT_FETCHED = "transcript_fetched_at"
+    RESULT_OUTPUT = "result_output_at"
+    COLUMNS = [SUBMITTED, IN_PROGRESS_SEEN, AWS_COMPLETED, COMPLETION_DETECTED, TRANSCRIPT_FETCHED, RESULT_OUTPUT]
+    COLUMN_DESCRIPTIONS = {
+        SUBMITTED: "Time at which the submission of the job was acknowledged by AWS.",
+        IN_PROGRESS_SEEN: "Time at which the job was first seen in progress, empty if it never was.",
+        AWS_COMPLETED: "Time at which the job was completed or failed, according to AWS.",
+        COMPLETION_DETECTED: "Time at which the completion or failure of the job was detected by polling.",
+        TRANSCRIPT_FETCHED: "Time at which the transcript was read from the output folder.",
+        RESULT_OUTPUT: "Time at which the result row was yielded to the output writer, before it is written.",
+    }
+    # Stages of a job as (start event, end event) by stage name
+    STAGES = {
+        "aws_queueing": (SUBMITTED, IN_PROGRESS_SEEN),
+        "aws_total": (SUBMITTED, AWS_COMPLETED),
+        "polling_delay": (AWS_COMPLETED, COMPLETION_DETECTED),
+        "transcript_download": (COMPLETION_DETECTED, TRANSCRIPT_FETCHED),
+        "output": (TRANSCRIPT_FETCHED, RESULT_OUTPUT),
+        "end_to_end": (SUBMITTED, RESULT_OUTPUT),
+    }
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._events = {}
+        self._durations_sec = {stage: [] for stage in self.STAGES}
+
+    def record(self, job_name: AnyStr, event: AnyStr, timestamp: float = None, overwrite: bool = True) -> None:
+        """Record the time of an event of a job, now if the timestamp is not given
+
+        If `overwrite` is False, an event already recorded is kept, e.g., to keep the first time it was seen.
+        """
+        with self._lock:
+            events = self._events.setdefault(job_name, {})
+            if overwrite or event not in events:
+                events[event] = self.clock() if timestamp is None else timestamp
+
+    def pop(self, job_name: AnyStr) -> Dict[AnyStr, AnyStr]:
+        """Stop tracking a job whose row is output, and return its timestamps as ISO 8601 strings by column"""
+        self.record(job_name, self.RESULT_OUTPUT)
+        with self._lock:
+            events = self._events.pop(job_name, {})
+            for stage, (start_event, end_event) in self.STAGES.items():
+                if start_event in events and end_event in events:
+                    self._durations_sec[stage].append(events[end_event] - events[start_event])
+        return {
+            column: datetime.fromtimestamp(events[column], timezone.utc).isoformat() if column in events else ""
+            for column in self.COLUMNS
+        }
+
+    @staticmethod
+    def _get_percentile(sorted_values: List[float], percentile: float) -> float:
+        """Percentile of sorted values with the nearest-rank method"""
+        rank = max(1, math.ceil(percentile / 100 * len(sorted_values)))
+        return sorted_values[rank - 1]
+
+    def get_summary(self) -> Dict[AnyStr, Dict]:
+        """Number of jobs and percentiles of the duration of each stage, in seconds"""
+        summary = {}
+        with self._lock:
+            for stage, durations_sec in self._durations_sec.items():
+                if not durations_sec:
+                    continue
+                sorted_durations_sec = sorted(durations_sec)
+                summary[stage] = {"count": len(sorted_durations_sec)}
+                for percentile in self.PERCENTILES:
+                    summary[stage][f"p{percentile}"] = round(self._get_percentile(sorted_durations_sec, percentile), 3)
+        return summary
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Module with a metrics interface to watch the throughput and throttling of a run while it is in progress"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import AnyStr, Callable, Dict, List
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class Metrics:
+    """Interface to record counters, gauges, histograms and spans, which does nothing by default.
+
+    Metrics are identified by a name and optional tags, e.g., {"operation": "ListTranscriptionJobs"}.
+    """
+
+    def increment(self, name: AnyStr, value: float = 1, tags: Dict[AnyStr, AnyStr] = None) -> None:
+        """Add a value to a counter"""
+        pass
+
+    def gauge(self, name: AnyStr, value: float, tags: Dict[AnyStr, AnyStr] = None) -> None:
+        """Set the current value of a gauge"""
+        pass
+
+    def observe(self, name: AnyStr, value: float, tags: Dict[AnyStr, AnyStr] = None) -> None:
+        """Add a value to the distribution of a histogram"""
+        pass
+
+    @contextmanager
+    def span(self, name: AnyStr, tags: Dict[AnyStr, AnyStr] = None):
+        """Time a block of code in the histogram `<name>_duration_sec`, and count its errors in `<name>_errors`"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            self.increment(f"{name}_errors", tags={**(tags or {}), "error_type": type(error).__name__})
+            raise
+        finally:
+            self.observe(f"{name}_duration_sec", time.perf_counter() - start, tags=tags)
+
+    def flush(self) -> None:
+        """Export the current values of the metrics"""
+        pass
+
+    def close(self) -> None:
+        """Export the final values of the metrics"""
+        pass
+
+
+class MetricsExporter(ABC):
+    """Interface of the destinations of the metrics, receiving a snapshot of all the metrics at each flush"""
+
+    @abstractmethod
+    def export(self, snapshot: Dict) -> None:
+        """Send a snapshot of all the metrics to the destination"""
+
+
+class MetricsRegistry(Metrics):
+    """Metrics aggregated in memory, and exported every `flush_interval_sec` seconds and when closed.
+
+    The exports run in a background thread, so that the threads recording metrics, e.g., the submission threads
+    or the botocore event handlers, never wait for a slow exporter.
+
+    The snapshot of the metrics is a dictionary with one entry per kind of metric: "counters", "gauges" and
+    "histograms", each of them a list of {"name": str, "tags": dict, ...} with the values of the metric.
+    Histograms are exported as cumulative bucket counts, along with their count, sum, min and max.
+
+    Attributes:
+        exporters: Destinations of the metrics
+        flush_interval_sec: Time between two exports by the background thread
+        histogram_buckets: Upper bounds of the histogram buckets
+    """
+
+    DEFAULT_HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800, 7200)
+
+    def __init__(
+        self,
+        exporters: List[MetricsExporter] = None,
+        flush_interval_sec: float = 30,
+        histogram_buckets: List[float] = DEFAULT_HISTOGRAM_BUCKETS,
+    ):
+        self.exporters = exporters or []
+        self.flush_interval_sec = flush_interval_sec
+        self.histogram_buckets = sorted(histogram_buckets)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._closed = threading.Event()
+        self._flush_thread = None
+        if self.exporters:
+            self._flush_thread = threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+            self._flush_thread.start()
+
+    @staticmethod
+    def _get_key(name: AnyStr, tags: Dict[AnyStr, AnyStr]) -> tuple:
+        return (name, tuple(sorted((tags or {}).items())))
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(timeout=self.flush_interval_sec):
+            self.flush()
+
+    def increment(self, name: AnyStr, value: float = 1, tags: Dict[AnyStr, AnyStr] = None) -> None:
+        key = self._get_key(name, tags)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: AnyStr, value: float, tags: Dict[AnyStr, AnyStr] = None) -> None:
+        with self._lock:
+            self._gauges[self._get_key(name, tags)] = value
+
+    def observe(self, name: AnyStr, value: float, tags: Dict[AnyStr, AnyStr] = None) -> None:
+        key = self._get_key(name, tags)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "min": value, "max": value,
+                             "buckets": [0] * len(self.histogram_buckets)}
+                self._histograms[key] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["min"] = min(histogram["min"], value)
+            histogram["max"] = max(histogram["max"], value)
+            for i, upper_bound in enumerate(self.histogram_buckets):
+                if value <= upper_bound:
+                    histogram["buckets"][i] += 1
+
+    def get_snapshot(self) -> Dict[AnyStr, List[Dict]]:
+        """Current values of all the metrics"""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "tags": dict(tags), "value": value}
+                    for (name, tags), value in self._counters.items()
+                ],
+                "gauges": [
+                    {"name": name, "tags": dict(tags), "value": value}
+                    for (name, tags), value in self._gauges.items()
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "tags": dict(tags),
+                        "count": histogram["count"],
+                        "sum": round(histogram["sum"], 6),
+                        "min": histogram["min"],
+                        "max": histogram["max"],
+                        "buckets": dict(zip(self.histogram_buckets, histogram["buckets"])),
+                    }
+                    for (name, tags), histogram in self._histograms.items()
+                ],
+            }
+
+    def flush(self) -> None:
+        # Only one thread exports at a time, the others go on without waiting
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            snapshot = self.get_snapshot()
+            for exporter in self.exporters:
+                try:
+                    exporter.export(snapshot)
+                except Exception as e:
+                    logging.warning(f"Metrics could not be exported by {type(exporter).__name__}: {e}")
+        finally:
+            self._flush_lock.release()
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        self.flush()
+
+
+class JSONExporter(MetricsExporter):
+    """Exports the snapshot of the metrics as JSON with a write function, e.g., to a file of a Dataiku Folder"""
+
+    def __init__(self, write_function: Callable[[Dict], None]):
+        self.write_function = write_function
+
+    def export(self, snapshot: Dict) -> None:
+        self.write_function(snapshot)
+
+
+class PrometheusTextfileExporter(MetricsExporter):
+    """Exports the metrics to a file in the Prometheus text format, for the textfile collector of node_exporter
+
+    The file is replaced atomically, so that it is never read half-written.
+    """
+
+    def __init__(self, path: AnyStr, prefix: AnyStr = "dss_amazon_transcribe"):
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def _format_labels(tags: Dict[AnyStr, AnyStr], **extra_labels) -> AnyStr:
+        labels = {**tags, **extra_labels}
+        if not labels:
+            return ""
+        escaped = {name: str(value).replace("\\", "\\\\").replace('"', '\\"') for name, value in labels.items()}
+        return "{" + ",".join(f'{name}="{value}"' for name, value in sorted(escaped.items())) + "}"
+
+    def format(self, snapshot: Dict) -> AnyStr:
+        """Metrics in the Prometheus text format"""
+        lines = []
+        declared = set()
+        for kind, prometheus_type in [("counters", "counter"), ("gauges", "gauge"), ("histograms", "histogram")]:
+            for metric in snapshot[kind]:
+                name = f"{self.prefix}_{metric['name']}"
+                if kind == "counters":
+                    name += "_total"
+                if name not in declared:
+                    lines.append(f"# TYPE {name} {prometheus_type}")
+                    declared.add(name)
+                if kind != "histograms":
+                    lines.append(f"{name}{self._format_labels(metric['tags'])} {metric['value']}")
+                    continue
+                for upper_bound, count in metric["buckets"].items():
+                    lines.append(f"{name}_bucket{self._format_labels(metric['tags'], le=upper_bound)} {count}")
+                lines.append(f"{name}_bucket{self._format_labels(metric['tags'], le='+Inf')} {metric['count']}")
+                lines.append(f"{name}_sum{self._format_labels(metric['tags'])} {metric['sum']}")
+                lines.append(f"{name}_count{self._format_labels(metric['tags'])} {metric['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, snapshot: Dict) -> None:
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(self.format(snapshot))
+        os.replace(temporary_path, self.path)
+
+
+class StatsDExporter(MetricsExporter):
+    """Sends the metrics to a StatsD server over UDP, with the tags in the DogStatsD format
+
+    Counters and histogram counts and sums are sent as the increments since the previous export.
+    """
+
+    def __init__(self, host: AnyStr = "localhost", port: int = 8125, prefix: AnyStr = "dss_amazon_transcribe"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._previous_values = {}
+
+    def _get_increment(self, key: tuple, value: float) -> float:
+        increment = value - self._previous_values.get(key, 0)
+        self._previous_values[key] = value
+        return increment
+
+    def _format(self, name: AnyStr, value: float, statsd_type: AnyStr, tags: Dict[AnyStr, AnyStr]) -> AnyStr:
+        line = f"{self.prefix}.{name}:{value}|{statsd_type}"
+        if tags:
+            line += "|#" + ",".join(f"{tag}:{tag_value}" for tag, tag_value in sorted(tags.items()))
+        return line
+
+    def format(self, snapshot: Dict) -> List[AnyStr]:
+        """Metrics as StatsD lines"""
+        lines = []
+        for metric in snapshot["counters"]:
+            key = (metric["name"], json.dumps(metric["tags"], sort_keys=True))
+            lines.append(self._format(metric["name"], self._get_increment(key, metric["value"]), "c", metric["tags"]))
+        for metric in snapshot["gauges"]:
+            lines.append(self._format(metric["name"], metric["value"], "g", metric["tags"]))
+        for metric in snapshot["histograms"]:
+            for statistic in ["count", "sum"]:
+                key = (metric["name"], statistic, json.dumps(metric["tags"], sort_keys=True))
+                increment = self._get_increment(key, metric[statistic])
+                lines.append(self._format(f"{metric['name']}.{statistic}", increment, "c", metric["tags"]))
+        return lines
+
+    def export(self, snapshot: Dict) -> None:
+        for line in self.format(snapshot):
+            self._socket.sendto(line.encode("utf-8"), self.address)
@@ -3,10 +3,11 @@
 
 import logging
 import json
+import os
 import pandas as pd
 
 from enum import Enum
-from typing import AnyStr, List, NamedTuple, Dict
+from typing import AnyStr, Generator, Iterable, List, NamedTuple, Dict
 from collections import OrderedDict, namedtuple
 
 
@@ -17,6 +18,20 @@ from collections import OrderedDict, namedtuple
 PATH_COLUMN = "path"
 """Default name of the column to store file paths"""
 
+NUM_ATTEMPTS_COLUMN = "num_attempts"
+"""Name of the column with the number of runs which attempted to transcribe a failed file"""
+
+DEAD_LETTER_COLUMN_DESCRIPTIONS = OrderedDict(
+    [
+        (PATH_COLUMN, "Path to the audio file in the S3 bucket."),
+        ("job_name", "Name of the last job of the file in Amazon Transcribe, empty if its submission failed."),
+        ("output_error_type", "The error type of the last attempt."),
+        ("output_error_message", "The error message of the last attempt."),
+        (NUM_ATTEMPTS_COLUMN, "Number of runs which attempted to transcribe the file."),
+    ]
+)
+"""Dictionary of the column names (key) of the dataset of failed files and their descriptions (value)"""
+
 API_COLUMN_NAMES_DESCRIPTION_DICT = OrderedDict(
     [
         ("response", "Raw response from the API in JSON format"),
@@ -92,3 +107,56 @@ def move_api_columns_to_end(
     new_columns = columns + list(api_column_names_dict.values())
     df = df.reindex(columns=new_columns)
     return df
+
+
+def get_changed_paths(path_details: Dict[AnyStr, Dict], previous_path_details: Dict[AnyStr, Dict]) -> List[AnyStr]:
+    """List the paths which are new or whose size or last modification time changed since a previous listing"""
+    return [path for path, details in path_details.items() if previous_path_details.get(path) != details]
+
+
+def is_unchanged_since_submission(submitted_details: Dict, details: Dict) -> bool:
+    """Whether a file is unchanged since the submission of its job, from its size and last modification time
+
+    The details which were not recorded at submission, e.g., by a run of a version which did not read them,
+    are not compared, so that the job is matched on its path alone.
+    """
+    details = details or {}
+    return all(pd.isna(value) or value == details.get(key) for key, value in submitted_details.items())
+
+
+def filter_paths_by_extension(paths: Iterable[AnyStr], file_extensions: List[AnyStr]) -> Generator[AnyStr, None, None]:
+    """Yield the paths matching a list of extensions, as soon as they are read from `paths`
+
+    Args:
+        paths: Iterable of file paths, typically a lazy listing of a folder
+        file_extensions: list of file extensions to match, ex: ["JPG", "PNG"]
+            Expected format is not case-sensitive but should not include leading "."
+
+    Raises:
+        RuntimeError: If there are no files matching the list of `file_extensions` once `paths` is exhausted
+
+    """
+    num_paths = 0
+    for path in paths:
+        if os.path.splitext(path)[1][1:].lower().strip() in file_extensions:
+            num_paths += 1
+            yield path
+    if num_paths == 0:
+        raise RuntimeError(f"No files detected with supported extensions {file_extensions}, check input folder")
+
+
+def get_dead_letter_row(result: Dict, num_previous_attempts: int = 0) -> Dict:
+    """Get the row of a failed file in the dataset of failed files from its row in the output dataset
+
+    Args:
+        result: Row of the file in the output dataset, with a non-empty "output_error_type"
+        num_previous_attempts: Number of previous runs which attempted to transcribe the file,
+            0 if the file is not reprocessed from the failed files of a previous run
+
+    Returns:
+        Dictionary with the keys of `DEAD_LETTER_COLUMN_DESCRIPTIONS`
+
+    """
+    dead_letter_row = {column: result.get(column) or "" for column in DEAD_LETTER_COLUMN_DESCRIPTIONS}
+    dead_letter_row[NUM_ATTEMPTS_COLUMN] = num_previous_attempts + 1
+    return dead_letter_row
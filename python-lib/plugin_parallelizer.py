@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""Module extending the parallelizer of dkulib to stream rows through it, with a bounded memory footprint"""
+
+import logging
+import inspect
+import math
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from time import perf_counter
+from typing import Any, AnyStr, Dict, Generator, Iterable, List, Tuple, Union
+
+import pandas as pd
+from more_itertools import chunked
+from more_itertools import flatten
+from tqdm.auto import tqdm as tqdm_auto
+
+from dkulib.core.parallelizer import DataFrameParallelizer
+from dkulib.core.parallelizer.parallelizer import BatchError
+from dkulib.core.parallelizer.parallelizer import ErrorHandling
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class StreamingDataFrameParallelizer(DataFrameParallelizer):
+    """`DataFrameParallelizer` of dkulib, applying the function to rows as they are generated.
+
+    On top of `run`, rows can be read lazily from a generator with `run_on_rows`, or read and yielded back
+    one at a time with `iter_run`. At most `max_batches_in_flight` batches are in progress at any time, so that
+    memory does not grow with the number of rows. Rows and results are built column by column, only the rows
+    which failed in a batch get errors, and the duration and outcome of each batch can be recorded in metrics.
+    The vendored dkulib is left as it is, the behaviour of the plugin is kept in this subclass.
+
+    Attributes:
+        max_batches_in_flight: Maximum number of batches submitted to the threads and not yet collected.
+            Default is None, meaning twice the number of `parallel_workers`. The rows are read from the input
+            only when a batch completes, so that memory does not grow with the number of rows waiting for a thread.
+        metrics: Optional object with `observe(name, value, tags)` and `increment(name, value, tags)` methods,
+            receiving the duration of each batch and the number of rows processed with and without error.
+            Default is None, in which case nothing is recorded.
+        Other attributes are the ones of `DataFrameParallelizer`.
+    """
+
+    def __init__(self, *args, max_batches_in_flight: int = None, metrics: Any = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_batches_in_flight = max_batches_in_flight or 2 * self.parallel_workers
+        self.metrics = metrics
+
+    def _apply_function_with_error_logging(
+        self, batch: List[Dict] = None, **function_kwargs,
+    ) -> Union[Dict, List[Dict]]:  # sourcery skip: or-if-exp-identity
+        """Wraps a row-by-row or batch function with error logging
+        It applies `self.function` and:
+        - If batch, parse the function response to extract results and errors using `self.batch_response_parser`
+            Else, in the row-by-row case, the batch only contains one row.
+            We thus use the `_parse_batch_response_default` function, which simply assigns the function response
+            to a new key in the dictionary, without parsing errors from the response.
+            Parsing the function response to extract errors is only required for batch functions,
+            as most batch APIs return succesful responses (and make users pay for the request)
+            even if all rows within the batch failed from a functional perspective.
+        - handles errors from the function with two methods:
+            * (default) log the error message as a warning and return the row with error keys
+            * fail if there is an error (if `self.error_handling == ErrorHandling.FAIL`)
+            If the errors were parsed from the response of a batch, only the rows which failed get error keys.
+        """
+        start = perf_counter()
+        output = None
+        try:
+            if not self.batch_support:
+                # In the row-by-row case, there is only one element in the list as batch_size=1
+                response = [(self.function(row=batch[0], **function_kwargs))]
+            else:
+                response = self.function(batch=batch, **function_kwargs)
+            output = self.batch_response_parser(
+                batch=batch,
+                response=response,
+                output_column_names=self._output_column_names,
+            )
+            errors = [
+                row[self._output_column_names.error_message]
+                for row in output
+                if row[self._output_column_names.error_message]
+            ]
+            if errors:
+                raise BatchError(str(errors))
+        except self.exceptions_to_catch + (BatchError,) as error:
+            if self.error_handling == ErrorHandling.FAIL:
+                raise error
+            logging.warning(
+                f"Function {self.function.__name__} failed on: {batch} because of error: {error}"
+            )
+            if isinstance(error, BatchError):
+                # The other rows of the batch succeeded, and the failed ones hold the errors parsed from the response
+                self._record_batch_metrics(start, output)
+                return output
+            error_type = str(type(error).__qualname__)
+            module = inspect.getmodule(error)
+            if module:
+                error_type = f"{module.__name__}.{error_type}"
+            error_columns = {
+                self._output_column_names.response: "",
+                self._output_column_names.error_message: str(error),
+                self._output_column_names.error_type: error_type,
+                self._output_column_names.error_raw: str(error.args),
+            }
+            # Shallow copies of the input rows are enough, as only the output keys are set
+            output = [{**row, **error_columns} for row in batch]
+        self._record_batch_metrics(start, output)
+        return output
+
+    def _record_batch_metrics(self, start: float, output: List[Dict]) -> None:
+        """Records the duration of a batch and its number of rows with and without error, if metrics are set"""
+        if self.metrics is None:
+            return
+        tags = {"function": self.function.__name__}
+        self.metrics.observe("parallelizer_batch_duration_sec", perf_counter() - start, tags=tags)
+        num_errors = sum(1 for row in output if row[self._output_column_names.error_message])
+        for status, num_rows in [("success", len(output) - num_errors), ("error", num_errors)]:
+            if num_rows:
+                self.metrics.increment("parallelizer_rows", num_rows, tags={**tags, "status": status})
+
+    def _get_dropped_column_names(self) -> List[AnyStr]:
+        """Returns the output columns left out of the results: raw errors unless verbose, all errors if FAIL"""
+        if self.error_handling == ErrorHandling.FAIL:
+            return [
+                self._output_column_names.error_message,
+                self._output_column_names.error_type,
+                self._output_column_names.error_raw,
+            ]
+        if not self.verbose:
+            return [self._output_column_names.error_raw]
+        return []
+
+    def _post_process_results(
+        self, results: List[List[Dict]], columns: List[AnyStr], input_df: pd.DataFrame = None
+    ) -> pd.DataFrame:
+        """Combines results from the function with the input columns
+
+        The output dataframe is built column by column. If the input dataframe is given, its columns are reused
+        as they are, since the results hold one row per input row in the same order.
+        """
+        output_rows = list(flatten(results))
+        dropped_column_names = self._get_dropped_column_names()
+        output_column_names = [
+            column_name for column_name in self._output_column_names if column_name not in dropped_column_names
+        ]
+        output_columns = {
+            column_name: pd.Series([row.get(column_name) for row in output_rows], dtype=object).astype(str)
+            for column_name in output_column_names
+        }
+        if input_df is not None:
+            input_columns = {column_name: input_df[column_name].reset_index(drop=True) for column_name in columns}
+        else:
+            input_columns = {
+                column_name: [row.get(column_name) for row in output_rows] for column_name in columns
+            }
+        output_df = pd.DataFrame({**input_columns, **output_columns}, columns=list(columns) + output_column_names)
+        num_error = sum(output_df[self._output_column_names.response] == "")
+        num_success = len(output_df.index) - num_error
+        logging.info(
+            f"Applying function {self.function.__name__} in parallel to {len(output_df.index)} row(s): "
+            + f"{num_success} row(s) succeeded, {num_error} failed."
+        )
+        return output_df
+
+    def _iter_batch_results(
+        self, row_generator: Iterable[Dict], len_generator: int = None, **function_kwargs,
+    ) -> Generator[Tuple[int, List[Dict]], None, None]:
+        """Applies the function to batches of rows with at most `self.max_batches_in_flight` batches in flight
+
+        Batches are submitted as soon as they are generated, and progress is tracked as they complete,
+        so that the function is applied while the generator is still being consumed.
+
+        Yields:
+            Tuple with the index of each batch and its output, in the order in which the batches complete
+        """
+        pool_kwargs = function_kwargs.copy()
+        for kwarg in ["function", "row", "batch"]:  # Reserved pool keyword arguments
+            pool_kwargs.pop(kwarg, None)
+        futures = {}
+        with tqdm_auto(
+            total=len_generator, desc=self.function.__name__, miniters=1, mininterval=1.0
+        ) as progress_bar:
+            with ThreadPoolExecutor(max_workers=self.parallel_workers) as pool:
+                for batch_index, batch in enumerate(chunked(row_generator, self.batch_size)):
+                    if len(futures) >= self.max_batches_in_flight:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield futures.pop(future), future.result()
+                    future = pool.submit(
+                        self._apply_function_with_error_logging,
+                        batch=batch,
+                        **pool_kwargs,
+                    )
+                    future.add_done_callback(lambda _: progress_bar.update(1))
+                    futures[future] = batch_index
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield futures.pop(future), future.result()
+
+    def _run(
+        self,
+        row_generator: Iterable[Dict],
+        columns: List[AnyStr],
+        input_df: pd.DataFrame = None,
+        **function_kwargs,
+    ) -> pd.DataFrame:
+        """Applies the function to rows consumed lazily from a generator, see `run` and `run_on_rows`"""
+        start = perf_counter()
+        self._output_column_names = self._get_unique_output_column_names(
+            existing_names=columns
+        )
+        len_generator = (
+            math.ceil(len(input_df.index) / self.batch_size) if input_df is not None else None
+        )
+        # Results are put back in the order of the input rows
+        results = [None] * (len_generator or 0)
+        for batch_index, output in self._iter_batch_results(row_generator, len_generator, **function_kwargs):
+            if batch_index >= len(results):
+                results.extend([None] * (batch_index + 1 - len(results)))
+            results[batch_index] = output
+        output_df = self._post_process_results(results, columns=columns, input_df=input_df)
+        logging.info(f"Parallelization done in {(perf_counter() - start):.2f} seconds.")
+        return output_df
+
+    def run(self, df: pd.DataFrame, **function_kwargs,) -> pd.DataFrame:
+        """Applies a function to a pandas.DataFrame with parallelization, error logging and progress tracking.
+
+        The DataFrame is iterated on and fed to the function as dictionaries, row-by-row or by batches of rows.
+        This process is accelerated by the use of concurrent threads and is tracked with a progress bar.
+        Errors are catched if they match the `self.exceptions_to_catch` attribute and automatically logged.
+        Once the whole DataFrame has been iterated on, results and errors are added as additional columns.
+
+        Args:
+            df: Input dataframe on which the function will be applied
+            **function_kwargs: Arbitrary keyword arguments passed to the `function`
+
+        Returns:
+            Input dataframe with additional columns:
+            - response from the `function`
+            - error message if any
+            - error type if any
+
+        """
+        # First, we create a generator expression to yield each row of the input dataframe.
+        # Each row will be represented as a dictionary like {"column_name_1": "foo", "column_name_2": 42}
+        # The values are read column by column with `itertuples`, instead of building a Series per row
+        columns = list(df.columns)
+        df_row_generator = (
+            dict(zip(columns, values)) for values in df.itertuples(index=False, name=None)
+        )
+        logging.info(
+            f"Applying function {self.function.__name__} in parallel to {len(df.index)} row(s)"
+            + f" using batch size of {self.batch_size}..."
+        )
+        return self._run(
+            df_row_generator,
+            columns=columns,
+            input_df=df,
+            **function_kwargs,
+        )
+
+    def run_on_rows(
+        self, rows: Iterable[Dict], columns: List[AnyStr], **function_kwargs,
+    ) -> pd.DataFrame:
+        """Applies a function to an iterable of rows with parallelization, error logging and progress tracking.
+
+        Same as `run`, except that the rows are consumed lazily: each batch is sent to the function as soon as
+        it is generated, while the next rows are still being generated, e.g., listed from a remote storage.
+        The total number of rows is not known in advance, so the progress bar only shows the number of batches done.
+
+        Args:
+            rows: Iterable of dictionaries like {"column_name_1": "foo", "column_name_2": 42}
+            columns: Names of the input columns, to keep in the output dataframe
+            **function_kwargs: Arbitrary keyword arguments passed to the `function`
+
+        Returns:
+            Dataframe with the input columns and additional columns:
+            - response from the `function`
+            - error message if any
+            - error type if any
+
+        """
+        logging.info(
+            f"Applying function {self.function.__name__} in parallel to rows as they are generated"
+            + f" using batch size of {self.batch_size}..."
+        )
+        return self._run(rows, columns=columns, **function_kwargs)
+
+    def iter_run(
+        self, rows: Iterable[Dict], columns: List[AnyStr], **function_kwargs,
+    ) -> Generator[Dict, None, None]:
+        """Applies a function to an iterable of rows with parallelization, yielding each result as soon as it is ready.
+
+        Same as `run_on_rows`, except that the results are yielded one row at a time instead of being gathered
+        in a dataframe, in the order in which the batches complete. At most `self.max_batches_in_flight` batches
+        are in progress: the next rows are only read from `rows` when the caller has consumed the results,
+        so that memory stays constant whatever the number of rows.
+
+        Args:
+            rows: Iterable of dictionaries like {"column_name_1": "foo", "column_name_2": 42}
+            columns: Names of the input columns, to keep in the output rows
+            **function_kwargs: Arbitrary keyword arguments passed to the `function`
+
+        Yields:
+            Dictionary with the input columns and additional keys:
+            - response from the `function`
+            - error message if any
+            - error type if any
+
+        """
+        self._output_column_names = self._get_unique_output_column_names(
+            existing_names=columns
+        )
+        dropped_column_names = self._get_dropped_column_names()
+        output_column_names = [
+            column_name
+            for column_name in list(columns) + list(self._output_column_names)
+            if column_name not in dropped_column_names
+        ]
+        for _, output in self._iter_batch_results(rows, **function_kwargs):
+            for output_row in output:
+                yield {column_name: output_row.get(column_name) for column_name in output_column_names}
@@ -5,18 +5,29 @@ import logging
 from typing import List, Dict, AnyStr
 from enum import Enum
 
-import pandas as pd
 from fastcore.utils import store_attr
 
 import dataiku
 from dataiku.customrecipe import get_recipe_config, get_input_names_for_role, get_output_names_for_role
 
 from plugin_io_utils import ErrorHandling
-from plugin_io_utils import PATH_COLUMN
-from dku_io_utils import generate_path_df
+from submission_order import SUBMISSION_ORDERS
 
 from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
 
+from dku_constants import DEFAULT_CIRCUIT_BREAKER_ERROR_RATE
+from dku_constants import DEFAULT_DOWNLOAD_REQUESTS_PER_SEC
+from dku_constants import DEFAULT_DOWNLOAD_WORKERS
+from dku_constants import DEFAULT_GET_JOB_REQUESTS_PER_SEC
+from dku_constants import DEFAULT_LIST_JOBS_REQUESTS_PER_SEC
+from dku_constants import DEFAULT_MAX_CONCURRENT_JOBS
+from dku_constants import DEFAULT_MAX_CONCURRENT_JOBS_PER_REGION
+from dku_constants import DEFAULT_MAX_JOBS_IN_FLIGHT
+from dku_constants import DEFAULT_MAX_POLLING_REQUESTS_PER_SEC
+from dku_constants import DEFAULT_MAX_SUBMISSION_ATTEMPTS
+from dku_constants import DEFAULT_SUBMISSION_BATCH_SIZE
+from dku_constants import DEFAULT_SUBMISSION_REQUESTS_PER_SEC
+from dku_constants import DEFAULT_STATSD_PORT
 from dku_constants import SUPPORTED_LANGUAGES
 from dku_constants import SUPPORTED_AUDIO_FORMATS
 
@@ -46,7 +57,7 @@ class PluginParams:
             aws_session_token: str,
             aws_region_name: str,
             max_attempts: str,
-            input_df: pd.DataFrame,
+            file_extensions: List[AnyStr],
             input_folder: dataiku.Folder,
             column_prefix: AnyStr = "api",
             input_folder_is_s3: bool = True,
@@ -59,9 +70,49 @@ class PluginParams:
             output_folder_root_path: AnyStr = "",
             language: AnyStr = "auto",
             display_json: bool = False,
+            record_job_timings: bool = False,
             timeout_min: int = 120,
             use_timeout: bool = True,
+            resume_previous_run: bool = True,
+            delete_finished_jobs: bool = False,
+            incremental_mode: bool = False,
+            submission_order: AnyStr = "listing",
+            priority_rules: Dict[AnyStr, float] = None,
+            priority_dataset: dataiku.Dataset = None,
+            priority_path_column: AnyStr = "",
+            priority_column: AnyStr = "",
+            input_source: AnyStr = "folder",
+            failed_files_dataset: dataiku.Dataset = None,
+            dead_letter_dataset: dataiku.Dataset = None,
+            submission_order_window: int = 0,
+            use_transcript_cache: bool = False,
+            transcript_cache_location: AnyStr = "output_folder",
+            transcript_cache_directory: AnyStr = "",
+            transcript_cache_max_size_mb: int = 1024,
+            record_metrics: bool = False,
+            metrics_exporter: AnyStr = "none",
+            statsd_host: AnyStr = "localhost",
+            statsd_port: int = DEFAULT_STATSD_PORT,
+            prometheus_textfile_path: AnyStr = "",
             parallel_workers: int = 4,
+            submission_concurrency_mode: AnyStr = "fixed",
+            use_region_pool: bool = False,
+            additional_region_names: List[AnyStr] = None,
+            max_concurrent_jobs_per_region: int = DEFAULT_MAX_CONCURRENT_JOBS_PER_REGION,
+            use_job_quota_gate: bool = False,
+            max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+            execution_engine: AnyStr = "threads",
+            max_jobs_in_flight: int = 500,
+            submission_batch_size: int = 10,
+            max_submission_attempts: int = DEFAULT_MAX_SUBMISSION_ATTEMPTS,
+            use_circuit_breaker: bool = True,
+            circuit_breaker_error_rate: float = DEFAULT_CIRCUIT_BREAKER_ERROR_RATE,
+            max_polling_requests_per_sec: float = 5,
+            download_workers: int = 4,
+            submission_requests_per_sec: float = 10,
+            get_job_requests_per_sec: float = 10,
+            list_jobs_requests_per_sec: float = 5,
+            download_requests_per_sec: float = 50,
             **kwargs,
     ):
         store_attr()
@@ -84,10 +135,8 @@ class PluginParamsLoader:
             raise PluginParamValidationError("Please specify input folder")
         input_params["input_folder"] = dataiku.Folder(input_folder_names[0])
 
-        file_extensions = SUPPORTED_AUDIO_FORMATS
-        input_params["input_df"] = generate_path_df(
-            folder=input_params["input_folder"], file_extensions=file_extensions, path_column=PATH_COLUMN
-        )
+        # Files are not listed here but by the recipe, lazily, so that they can be submitted while the listing goes on
+        input_params["file_extensions"] = SUPPORTED_AUDIO_FORMATS
         input_folder_type = input_params["input_folder"].get_info().get("type", "")
         input_params["input_folder_is_s3"] = input_folder_type == "S3"
         if input_params["input_folder_is_s3"]:
@@ -98,6 +147,13 @@ class PluginParamsLoader:
         else:
             logging.info(f"Input folder is not stored on S3 ({input_folder_type})")
             raise PluginParamValidationError("Input folder not stored on S3")
+
+        priority_dataset_names = get_input_names_for_role("priority_dataset")
+        if len(priority_dataset_names) != 0:
+            input_params["priority_dataset"] = dataiku.Dataset(priority_dataset_names[0])
+        failed_files_dataset_names = get_input_names_for_role("failed_files_dataset")
+        if len(failed_files_dataset_names) != 0:
+            input_params["failed_files_dataset"] = dataiku.Dataset(failed_files_dataset_names[0])
         return input_params
 
     def validate_output_params(self) -> Dict:
@@ -127,6 +183,10 @@ class PluginParamsLoader:
                 logging.info(f"Output folder is not stored on S3 ({output_folder_type})")
                 raise PluginParamValidationError("Output folder not stored on S3")
 
+        # Optional dataset of failed files
+        dead_letter_dataset_names = get_output_names_for_role("dead_letter_dataset")
+        if len(dead_letter_dataset_names) != 0:
+            output_params["dead_letter_dataset"] = dataiku.Dataset(dead_letter_dataset_names[0])
         return output_params
 
 
@@ -142,11 +202,94 @@ class PluginParamsLoader:
         preset_params["aws_region_name"] = api_configuration_preset.get("aws_region_name")
         preset_params["max_attempts"] = api_configuration_preset.get("max_attempts")
 
+        preset_params["use_region_pool"] = bool(api_configuration_preset.get("use_region_pool", False))
+        if preset_params["use_region_pool"]:
+            preset_params["additional_region_names"] = [
+                region_name.strip() for region_name in api_configuration_preset.get("additional_region_names") or []
+                if region_name.strip()
+            ]
+            if not preset_params["additional_region_names"]:
+                raise PluginParamValidationError("Please specify the additional regions of the region pool")
+            if not preset_params["aws_region_name"]:
+                raise PluginParamValidationError("Please specify the AWS region name to use a region pool")
+            if preset_params["aws_region_name"] in preset_params["additional_region_names"]:
+                raise PluginParamValidationError("The additional regions must differ from the AWS region name")
+            preset_params["max_concurrent_jobs_per_region"] = int(
+                api_configuration_preset.get("max_concurrent_jobs_per_region") or DEFAULT_MAX_CONCURRENT_JOBS_PER_REGION
+            )
+            max_concurrent_jobs_per_region = preset_params["max_concurrent_jobs_per_region"]
+            if max_concurrent_jobs_per_region < 1 or max_concurrent_jobs_per_region > 10000:
+                raise PluginParamValidationError("Concurrent jobs per region must be between 1 and 10000")
+
         if not api_configuration_preset.get("parallel_workers"):
             raise PluginParamValidationError(f"Please specify concurrency in the preset according to {DOC_URL}")
         preset_params["parallel_workers"] = int(api_configuration_preset.get("parallel_workers"))
         if preset_params["parallel_workers"] < 1 or preset_params["parallel_workers"] > 100:
             raise PluginParamValidationError("Concurrency must be between 1 and 100")
+        preset_params["submission_concurrency_mode"] = api_configuration_preset.get(
+            "submission_concurrency_mode", "fixed"
+        )
+        if preset_params["submission_concurrency_mode"] not in {"fixed", "auto"}:
+            raise PluginParamValidationError(
+                f"Invalid concurrency mode: {preset_params['submission_concurrency_mode']}"
+            )
+
+        preset_params["execution_engine"] = api_configuration_preset.get("execution_engine", "threads")
+        if preset_params["execution_engine"] not in {"threads", "asyncio"}:
+            raise PluginParamValidationError(f"Invalid execution engine: {preset_params['execution_engine']}")
+        preset_params["max_jobs_in_flight"] = int(
+            api_configuration_preset.get("max_jobs_in_flight") or DEFAULT_MAX_JOBS_IN_FLIGHT
+        )
+        if preset_params["max_jobs_in_flight"] < 1 or preset_params["max_jobs_in_flight"] > 10000:
+            raise PluginParamValidationError("Jobs in flight must be between 1 and 10000")
+
+        preset_params["use_job_quota_gate"] = bool(api_configuration_preset.get("use_job_quota_gate", False))
+        preset_params["max_concurrent_jobs"] = int(
+            api_configuration_preset.get("max_concurrent_jobs") or DEFAULT_MAX_CONCURRENT_JOBS
+        )
+        if preset_params["max_concurrent_jobs"] < 1 or preset_params["max_concurrent_jobs"] > 10000:
+            raise PluginParamValidationError("Concurrent jobs quota must be between 1 and 10000")
+
+        preset_params["submission_batch_size"] = int(
+            api_configuration_preset.get("submission_batch_size") or DEFAULT_SUBMISSION_BATCH_SIZE
+        )
+        if preset_params["submission_batch_size"] < 1 or preset_params["submission_batch_size"] > 1000:
+            raise PluginParamValidationError("Submission batch size must be between 1 and 1000")
+
+        preset_params["max_submission_attempts"] = int(
+            api_configuration_preset.get("max_submission_attempts") or DEFAULT_MAX_SUBMISSION_ATTEMPTS
+        )
+        if preset_params["max_submission_attempts"] < 1 or preset_params["max_submission_attempts"] > 10:
+            raise PluginParamValidationError("Submission attempts must be between 1 and 10")
+        preset_params["use_circuit_breaker"] = bool(api_configuration_preset.get("use_circuit_breaker", True))
+        preset_params["circuit_breaker_error_rate"] = float(
+            api_configuration_preset.get("circuit_breaker_error_rate") or DEFAULT_CIRCUIT_BREAKER_ERROR_RATE
+        )
+        if preset_params["circuit_breaker_error_rate"] <= 0 or preset_params["circuit_breaker_error_rate"] > 1:
+            raise PluginParamValidationError("Error rate to pause must be between 0 and 1")
+
+        preset_params["download_workers"] = int(
+            api_configuration_preset.get("download_workers") or DEFAULT_DOWNLOAD_WORKERS
+        )
+        if preset_params["download_workers"] < 1 or preset_params["download_workers"] > 100:
+            raise PluginParamValidationError("Download concurrency must be between 1 and 100")
+
+        preset_params["max_polling_requests_per_sec"] = float(
+            api_configuration_preset.get("max_polling_requests_per_sec") or DEFAULT_MAX_POLLING_REQUESTS_PER_SEC
+        )
+        if preset_params["max_polling_requests_per_sec"] <= 0:
+            raise PluginParamValidationError("Polling requests per second must be strictly positive")
+
+        rate_limit_defaults = {
+            "submission_requests_per_sec": DEFAULT_SUBMISSION_REQUESTS_PER_SEC,
+            "get_job_requests_per_sec": DEFAULT_GET_JOB_REQUESTS_PER_SEC,
+            "list_jobs_requests_per_sec": DEFAULT_LIST_JOBS_REQUESTS_PER_SEC,
+            "download_requests_per_sec": DEFAULT_DOWNLOAD_REQUESTS_PER_SEC,
+        }
+        for param_name, default_value in rate_limit_defaults.items():
+            preset_params[param_name] = float(api_configuration_preset.get(param_name) or default_value)
+            if preset_params[param_name] <= 0:
+                raise PluginParamValidationError(f"Rate limit {param_name} must be strictly positive")
 
         preset_params_displayable = {
             param_name: param_value
@@ -168,6 +311,76 @@ class PluginParamsLoader:
 
         if "display_json" in self.recipe_config:
             recipe_params["display_json"] = self.recipe_config["display_json"]
+        recipe_params["record_job_timings"] = bool(self.recipe_config.get("record_job_timings", False))
+
+        recipe_params["resume_previous_run"] = bool(self.recipe_config.get("resume_previous_run", True))
+        recipe_params["delete_finished_jobs"] = bool(self.recipe_config.get("delete_finished_jobs", False))
+
+        recipe_params["input_source"] = self.recipe_config.get("input_source") or "folder"
+        if recipe_params["input_source"] not in {"folder", "failed_files"}:
+            raise PluginParamValidationError(f"Invalid input files: {recipe_params['input_source']}")
+        if recipe_params["input_source"] == "failed_files" and not get_input_names_for_role("failed_files_dataset"):
+            raise PluginParamValidationError("Please specify the failed files to reprocess")
+
+        # The failed files are reprocessed regardless of the changes of the input folder
+        recipe_params["incremental_mode"] = bool(self.recipe_config.get("incremental_mode", False)) and \
+            recipe_params["input_source"] == "folder"
+
+        recipe_params["submission_order"] = self.recipe_config.get("submission_order") or "listing"
+        if recipe_params["submission_order"] not in SUBMISSION_ORDERS:
+            raise PluginParamValidationError(f"Invalid submission order: {recipe_params['submission_order']}")
+        if recipe_params["submission_order"] == "path_rules":
+            try:
+                priority_rules = self.recipe_config.get("priority_rules") or {}
+                recipe_params["priority_rules"] = {
+                    pattern: float(priority) for pattern, priority in priority_rules.items()
+                }
+            except ValueError as e:
+                raise PluginParamValidationError(f"Path rule priorities must be numbers: {e}")
+            if not recipe_params["priority_rules"]:
+                raise PluginParamValidationError("Please specify the path rules")
+        if recipe_params["submission_order"] == "priority_column":
+            if not get_input_names_for_role("priority_dataset"):
+                raise PluginParamValidationError("Please specify the priority dataset")
+            recipe_params["priority_path_column"] = self.recipe_config.get("priority_path_column")
+            recipe_params["priority_column"] = self.recipe_config.get("priority_column")
+            if not recipe_params["priority_path_column"] or not recipe_params["priority_column"]:
+                raise PluginParamValidationError("Please specify the path and priority columns")
+        recipe_params["submission_order_window"] = int(self.recipe_config.get("submission_order_window") or 0)
+        if recipe_params["submission_order_window"] < 0:
+            raise PluginParamValidationError("Ordering window cannot be negative")
+
+        recipe_params["use_transcript_cache"] = bool(self.recipe_config.get("use_transcript_cache", False))
+        if recipe_params["use_transcript_cache"]:
+            recipe_params["transcript_cache_location"] = self.recipe_config.get(
+                "transcript_cache_location", "output_folder"
+            )
+            if recipe_params["transcript_cache_location"] not in {"output_folder", "local_directory"}:
+                raise PluginParamValidationError(
+                    f"Invalid cache location: {recipe_params['transcript_cache_location']}"
+                )
+            if recipe_params["transcript_cache_location"] == "local_directory":
+                recipe_params["transcript_cache_directory"] = self.recipe_config.get("transcript_cache_directory")
+                if not recipe_params["transcript_cache_directory"]:
+                    raise PluginParamValidationError("Please specify the cache directory")
+            recipe_params["transcript_cache_max_size_mb"] = int(
+                self.recipe_config.get("transcript_cache_max_size_mb") or 1024
+            )
+            if recipe_params["transcript_cache_max_size_mb"] < 1:
+                raise PluginParamValidationError("Cache size has to be larger than zero")
+
+        recipe_params["record_metrics"] = bool(self.recipe_config.get("record_metrics", False))
+        if recipe_params["record_metrics"]:
+            recipe_params["metrics_exporter"] = self.recipe_config.get("metrics_exporter") or "none"
+            if recipe_params["metrics_exporter"] not in {"none", "statsd", "prometheus_textfile"}:
+                raise PluginParamValidationError(f"Invalid metrics exporter: {recipe_params['metrics_exporter']}")
+            if recipe_params["metrics_exporter"] == "statsd":
+                recipe_params["statsd_host"] = self.recipe_config.get("statsd_host") or "localhost"
+                recipe_params["statsd_port"] = int(self.recipe_config.get("statsd_port") or DEFAULT_STATSD_PORT)
+            if recipe_params["metrics_exporter"] == "prometheus_textfile":
+                recipe_params["prometheus_textfile_path"] = self.recipe_config.get("prometheus_textfile_path")
+                if not recipe_params["prometheus_textfile_path"]:
+                    raise PluginParamValidationError("Please specify the path of the Prometheus textfile")
 
         recipe_params["use_timeout"] = "timeout_min" in self.recipe_config
         recipe_params["timeout_min"] = None
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Module with a scheduler deciding when to poll the status of Amazon Transcribe jobs"""
+
+import time
+from typing import AnyStr, Callable, Dict, List
+
+from dku_constants import DEFAULT_EXPECTED_JOB_DURATION_SEC
+from dku_constants import MAX_POLLING_INTERVAL_SEC
+from dku_constants import MIN_POLLING_INTERVAL_SEC
+from dku_constants import POLLING_BACKOFF_FACTOR
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class PollingScheduler:
+    """Schedules the next status check of each pending job.
+
+    The first check of a job happens when it is expected to finish. The expected duration is estimated
+    from the file size and the throughput (seconds per byte) observed on the jobs completed so far in the run,
+    or from their mean duration when the file size is unknown. Until a job has completed, jobs are first checked
+    after `min_interval_sec`, so that the first completions, and thus the estimate, are known early.
+    Jobs still pending after that are checked again with an exponential backoff, so short clips are polled early
+    and often, and long ones less and less often.
+    The waiting time between two rounds is bounded so that the request budget per second is never exceeded.
+
+    Attributes:
+        min_interval_sec: Minimum time between two checks of the same job
+        max_interval_sec: Maximum time between two checks of the same job
+        backoff_factor: Multiplier applied to the interval between two checks of a job still pending
+        max_requests_per_sec: Maximum number of polling requests per second, on average over a round
+        clock: Function returning a monotonic time in seconds
+    """
+
+    def __init__(
+        self,
+        min_interval_sec: float = MIN_POLLING_INTERVAL_SEC,
+        max_interval_sec: float = MAX_POLLING_INTERVAL_SEC,
+        backoff_factor: float = POLLING_BACKOFF_FACTOR,
+        max_requests_per_sec: float = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.backoff_factor = backoff_factor
+        self.max_requests_per_sec = max_requests_per_sec
+        self.clock = clock
+        self._submitted_at = {}
+        self._size_bytes = {}
+        self._interval_sec = {}  # Only set for jobs which have already been checked once
+        self._next_check = {}
+        self._num_completed = 0
+        self._total_duration_sec = 0.0
+        self._total_duration_sized_sec = 0.0
+        self._total_size_bytes = 0
+
+    def add_job(self, job_name: AnyStr, size_bytes: int = None, submitted_at: float = None) -> None:
+        """Start tracking a submitted job, with its file size in bytes if known"""
+        self._submitted_at[job_name] = self.clock() if submitted_at is None else submitted_at
+        if size_bytes and size_bytes > 0:
+            self._size_bytes[job_name] = size_bytes
+
+    def expected_duration_sec(self, job_name: AnyStr) -> float:
+        """Estimate the duration of a job from the jobs completed so far"""
+        size_bytes = self._size_bytes.get(job_name)
+        if size_bytes and self._total_size_bytes > 0:
+            return size_bytes * self._total_duration_sized_sec / self._total_size_bytes
+        if self._num_completed > 0:
+            return self._total_duration_sec / self._num_completed
+        return DEFAULT_EXPECTED_JOB_DURATION_SEC
+
+    def _get_next_check(self, job_name: AnyStr) -> float:
+        if job_name in self._next_check:
+            return self._next_check[job_name]
+        if self._num_completed == 0:
+            # Nothing is known of the duration of the jobs yet: the job is checked early, then with a backoff
+            return self._submitted_at[job_name] + self.min_interval_sec
+        # Never checked yet: the estimate is computed lazily so that it benefits from the latest completions
+        return self._submitted_at[job_name] + max(self.min_interval_sec, self.expected_duration_sec(job_name))
+
+    def get_due_jobs(self) -> List[AnyStr]:
+        """List the jobs which should be checked now"""
+        now = self.clock()
+        return [job_name for job_name in self._submitted_at if self._get_next_check(job_name) <= now]
+
+    def get_waiting_time_sec(self, num_requests_last_round: int = 0) -> float:
+        """Time to wait before the next polling round
+
+        Waits until the next job is due, and long enough for the requests of the last round
+        to fit in the request budget per second.
+        """
+        if not self._submitted_at:
+            return 0.0
+        waiting_time_sec = min(self._get_next_check(job_name) for job_name in self._submitted_at) - self.clock()
+        if self.max_requests_per_sec:
+            waiting_time_sec = max(waiting_time_sec, num_requests_last_round / self.max_requests_per_sec)
+        return max(0.0, waiting_time_sec)
+
+    def reschedule(self, job_name: AnyStr) -> None:
+        """Schedule the next check of a job which is still pending, backing off exponentially"""
+        if job_name not in self._submitted_at:
+            return
+        if job_name in self._interval_sec:
+            interval_sec = self._interval_sec[job_name] * self.backoff_factor
+        else:
+            interval_sec = self.min_interval_sec
+        # Long jobs are allowed to back off further than short ones
+        max_interval_sec = min(
+            self.max_interval_sec, max(self.min_interval_sec, self.expected_duration_sec(job_name) / 4)
+        )
+        self._interval_sec[job_name] = min(interval_sec, max_interval_sec)
+        self._next_check[job_name] = self.clock() + self._interval_sec[job_name]
+
+    def complete(self, job_name: AnyStr, duration_sec: float = None, update_estimate: bool = True) -> None:
+        """Stop tracking a finished job and update the throughput estimate with its duration
+
+        The estimate should not be updated with failed or abandoned jobs, as their duration is not representative.
+        """
+        submitted_at = self._submitted_at.pop(job_name, None)
+        size_bytes = self._size_bytes.pop(job_name, None)
+        self._interval_sec.pop(job_name, None)
+        self._next_check.pop(job_name, None)
+        if submitted_at is None or not update_estimate:
+            return
+        if duration_sec is None:
+            duration_sec = self.clock() - submitted_at
+        self._num_completed += 1
+        self._total_duration_sec += duration_sec
+        if size_bytes:
+            self._total_duration_sized_sec += duration_sec
+            self._total_size_bytes += size_bytes
+
+    def get_state(self) -> Dict:
+        """Summary of the scheduler state, for logging"""
+        return {
+            "pending_jobs": len(self._submitted_at),
+            "completed_jobs": self._num_completed,
+            "mean_duration_sec": round(self._total_duration_sec / self._num_completed, 2)
+            if self._num_completed
+            else None,
+        }
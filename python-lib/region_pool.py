@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Module spreading Amazon Transcribe jobs across several AWS regions"""
+
+import threading
+from typing import Any, AnyStr, Dict, List
+
+from dku_constants import DEFAULT_MAX_CONCURRENT_JOBS_PER_REGION
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class RegionPool:
+    """Transcribe clients of several regions, across which jobs are spread to go beyond the quota of a single region.
+
+    Each job is submitted to the region with the lowest ratio of jobs in flight to its quota of concurrent jobs.
+    The region is appended to the job name, so that jobs are polled in the right region, even by a later run.
+    Thread-safe, as submissions come from several threads.
+
+    Attributes:
+        max_concurrent_jobs_per_region: Default quota of concurrent jobs of a region
+        clients: Transcribe client of each region, by region name
+        max_concurrent_jobs: Quota of concurrent jobs of each region, by region name
+    """
+
+    def __init__(self, max_concurrent_jobs_per_region: int = DEFAULT_MAX_CONCURRENT_JOBS_PER_REGION):
+        self.max_concurrent_jobs_per_region = max_concurrent_jobs_per_region
+        self.clients = {}
+        self.max_concurrent_jobs = {}
+        self._lock = threading.Lock()
+        self._num_jobs_in_flight = {}
+        self._job_regions = {}  # Region of each job in flight, by job name
+
+    def add_region(self,
+                   region_name: AnyStr,
+                   client: Any,
+                   max_concurrent_jobs: int = None) -> None:
+        """Add a region to the pool, with its Transcribe client and its quota of concurrent jobs if not the default"""
+        with self._lock:
+            self.clients[region_name] = client
+            self.max_concurrent_jobs[region_name] = max_concurrent_jobs or self.max_concurrent_jobs_per_region
+            self._num_jobs_in_flight.setdefault(region_name, 0)
+
+    def remove_region(self, region_name: AnyStr) -> None:
+        """Remove a region from the pool, before any job is submitted to it"""
+        with self._lock:
+            self.clients.pop(region_name, None)
+            self.max_concurrent_jobs.pop(region_name, None)
+            self._num_jobs_in_flight.pop(region_name, None)
+
+    @property
+    def region_names(self) -> List[AnyStr]:
+        return list(self.clients.keys())
+
+    @property
+    def total_max_concurrent_jobs(self) -> int:
+        """Quota of concurrent jobs summed across the regions of the pool"""
+        with self._lock:
+            return sum(self.max_concurrent_jobs.values())
+
+    def acquire_region(self) -> AnyStr:
+        """Choose the region of the next job, the least loaded relative to its quota, and count the job in it"""
+        with self._lock:
+            region_name = min(
+                self.clients, key=lambda name: self._num_jobs_in_flight[name] / self.max_concurrent_jobs[name]
+            )
+            self._num_jobs_in_flight[region_name] += 1
+        return region_name
+
+    def release_region(self, region_name: AnyStr) -> None:
+        """Stop counting a job whose submission to the region failed"""
+        with self._lock:
+            self._num_jobs_in_flight[region_name] -= 1
+
+    def add_job(self, job_name: AnyStr, region_name: AnyStr) -> None:
+        """Track a job submitted to a region acquired with `acquire_region`, until it is released"""
+        with self._lock:
+            self._job_regions[job_name] = region_name
+
+    def release_job(self, job_name: AnyStr) -> None:
+        """Stop counting a finished job, if it was submitted by this run"""
+        with self._lock:
+            region_name = self._job_regions.pop(job_name, None)
+            if region_name is not None:
+                self._num_jobs_in_flight[region_name] -= 1
+
+    @staticmethod
+    def make_job_name(job_name: AnyStr, region_name: AnyStr) -> AnyStr:
+        """Name of a job submitted to a region, from which the region can be read back"""
+        return f"{job_name}_{region_name}"
+
+    def get_client(self, job_name: AnyStr) -> Any:
+        """Transcribe client of the region a job was submitted to, None if the job name holds no region of the pool"""
+        return self.clients.get(job_name.rsplit("_", 1)[-1])
+
+    def get_state(self) -> Dict[AnyStr, int]:
+        """Number of jobs in flight by region, for logging"""
+        with self._lock:
+            return dict(self._num_jobs_in_flight)
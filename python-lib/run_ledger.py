@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Module with a ledger recording the jobs submitted by a recipe run, so that the run can be resumed"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import AnyStr, Callable, Dict, List
+
+import pandas as pd
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class RunLedger:
+    """Durable record of the jobs of a recipe run, stored in a local SQLite file.
+
+    Each file path is mapped to the name of its Amazon Transcribe job and to the job status, as soon as the
+    submission is acknowledged, together with the size and last modification time of the file if known.
+    A rerun can then reattach to the jobs in flight, reuse the completed transcripts of the files which did not
+    change and only submit the files which are missing, modified or failed.
+    The ledger is meant to be reset once a run succeeds, so that the next run starts anew.
+    The SQLite file is synchronized with `sync_function` (typically an upload to the output folder)
+    at most every `sync_interval_sec` seconds, and when the ledger is closed.
+
+    Attributes:
+        path: Path to the local SQLite file
+        sync_function: Function called with `path` to persist the SQLite file, optional
+        sync_interval_sec: Minimum time between two calls to `sync_function`
+    """
+
+    SUBMITTED = "SUBMITTED"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+    def __init__(self, path: AnyStr, sync_function: Callable[[AnyStr], None] = None, sync_interval_sec: float = 30):
+        self.path = path
+        self.sync_function = sync_function
+        self.sync_interval_sec = sync_interval_sec
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "path TEXT PRIMARY KEY, job_name TEXT, status TEXT, language_code TEXT, updated_at REAL, "
+                "size INTEGER, last_modified INTEGER)"
+            )
+            # Ledgers written before the file details were recorded are completed with empty details
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")]
+            for column in ["size", "last_modified"]:
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _write(self, query: AnyStr, parameters: tuple) -> None:
+        with self._lock:
+            with self._connection:
+                self._connection.execute(query, parameters)
+            if self.sync_function is not None and time.monotonic() - self._last_sync >= self.sync_interval_sec:
+                self._sync()
+
+    def _sync(self) -> None:
+        self._last_sync = time.monotonic()
+        try:
+            self.sync_function(self.path)
+        except Exception as e:
+            logging.warning(f"Run ledger could not be synchronized: {e}")
+
+    def get_recipe_job_id(self) -> AnyStr:
+        """Identifier of the recipe run which submitted the jobs, None if the ledger is new"""
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM metadata WHERE key = 'recipe_job_id'").fetchone()
+        return row[0] if row else None
+
+    def set_recipe_job_id(self, recipe_job_id: AnyStr) -> None:
+        """Record the identifier of the recipe run, which prefixes the names of its jobs"""
+        self._write("INSERT OR REPLACE INTO metadata VALUES ('recipe_job_id', ?)", (recipe_job_id,))
+
+    def record_submission(self, path: AnyStr, job_name: AnyStr, size: int = None, last_modified: int = None) -> None:
+        """Record a job as soon as its submission is acknowledged, with the size and modification time of its file"""
+        self._write(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, '', ?, ?, ?)",
+            (path, job_name, self.SUBMITTED, time.time(), self._to_int(size), self._to_int(last_modified)),
+        )
+
+    @staticmethod
+    def _to_int(value) -> int:
+        """Integer stored by SQLite, None for missing values, e.g., NaN in the rows of a DataFrame"""
+        return None if value is None or pd.isna(value) else int(value)
+
+    def record_result(self, job_data: Dict) -> None:
+        """Record the final status of a job from its result row"""
+        if not job_data.get("job_name"):
+            return
+        status = self.FAILED if job_data.get("output_error_type") else self.COMPLETED
+        self._write(
+            "UPDATE jobs SET status = ?, language_code = ?, updated_at = ? WHERE job_name = ?",
+            (status, job_data.get("language_code", ""), time.time(), job_data["job_name"]),
+        )
+
+    def get_completed_job(self, job_name: AnyStr) -> Dict:
+        """Job summary of a job recorded as completed, None otherwise"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT language_code FROM jobs WHERE job_name = ? AND status = ?", (job_name, self.COMPLETED)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"TranscriptionJobName": job_name, "TranscriptionJobStatus": self.COMPLETED, "LanguageCode": row[0]}
+
+    def get_reusable_jobs(self, paths: List[AnyStr] = None) -> pd.DataFrame:
+        """Jobs submitted or completed for the given paths, or for all paths if None,
+        in the format of the submitted jobs DataFrame, with the "size" and "last_modified" of their file
+
+        Failed jobs are not reusable, their files should be submitted again.
+        """
+        with self._lock:
+            records = self._connection.execute(
+                "SELECT path, job_name, size, last_modified FROM jobs WHERE status IN (?, ?)",
+                (self.SUBMITTED, self.COMPLETED),
+            ).fetchall()
+        if paths is not None:
+            paths = set(paths)
+            records = [record for record in records if record[0] in paths]
+        reusable_jobs = pd.DataFrame(records, columns=["path", "output_response", "size", "last_modified"])
+        reusable_jobs["output_error_message"] = ""
+        reusable_jobs["output_error_type"] = ""
+        return reusable_jobs
+
+    def reset(self) -> None:
+        """Forget all the jobs of the previous runs"""
+        with self._lock:
+            with self._connection:
+                self._connection.execute("DELETE FROM jobs")
+                self._connection.execute("DELETE FROM metadata")
+
+    def close(self) -> None:
+        """Synchronize the ledger a last time and close it"""
+        with self._lock:
+            if self.sync_function is not None:
+                self._sync()
+            self._connection.close()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Module ordering the files to transcribe before their submission, to shorten runs and get first results earlier"""
+
+import heapq
+import itertools
+from fnmatch import fnmatch
+from typing import AnyStr, Callable, Dict, Generator, Iterable
+
+from plugin_io_utils import PATH_COLUMN
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+SUBMISSION_ORDERS = {"listing", "size_ascending", "size_descending", "path_rules", "priority_column"}
+"""Policies ordering the files before their submission, "listing" keeping the order in which they are listed"""
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def get_priority_function(submission_order: AnyStr,
+                          priority_rules: Dict[AnyStr, float] = None,
+                          priorities: Dict[AnyStr, float] = None) -> Callable[[Dict], float]:
+    """Get the function giving the priority of a row, the rows with the lowest values being submitted first
+
+    Args:
+        submission_order: One of `SUBMISSION_ORDERS`, except "listing"
+            - "size_ascending": smallest files first, to get many results early
+            - "size_descending": largest files first, so that long jobs do not end the run on their own
+            - "path_rules": files matching the rule with the highest priority first
+            - "priority_column": files with the highest priority first
+        priority_rules: Priority (value) by glob pattern of file paths (key), for the "path_rules" order.
+            A file takes the priority of the first pattern it matches, 0 if none.
+        priorities: Priority (value) by file path (key), for the "priority_column" order. 0 for missing paths.
+
+    Returns:
+        Function taking a row and returning its priority. Rows of unknown size are submitted last.
+
+    """
+    if submission_order == "size_ascending":
+        return lambda row: float("inf") if row.get("size") is None else row["size"]
+    if submission_order == "size_descending":
+        return lambda row: float("inf") if row.get("size") is None else -row["size"]
+    if submission_order == "path_rules":
+        rules = list((priority_rules or {}).items())
+
+        def get_path_priority(row: Dict) -> float:
+            return -next((priority for pattern, priority in rules if fnmatch(row[PATH_COLUMN], pattern)), 0)
+
+        return get_path_priority
+    if submission_order == "priority_column":
+        return lambda row: -(priorities or {}).get(row[PATH_COLUMN], 0)
+    raise ValueError(f"Invalid submission order: {submission_order}")
+
+
+def order_rows(rows: Iterable[Dict],
+               priority_function: Callable[[Dict], float],
+               window_size: int = 0) -> Generator[Dict, None, None]:
+    """Yield rows by increasing priority value, rows of equal priority keeping their order
+
+    Args:
+        rows: Rows to order, read lazily
+        priority_function: Function returning the priority of a row, see `get_priority_function`
+        window_size: Number of rows held at once: once the window is full, the row with the lowest value is yielded
+            for each row read, so that the first rows are submitted before the end of the listing.
+            All the rows are read before the first one is yielded if 0.
+
+    """
+    counter = itertools.count()  # Tie breaker, so that rows are never compared
+    heap = []
+    for row in rows:
+        heapq.heappush(heap, (priority_function(row), next(counter), row))
+        if window_size and len(heap) > window_size:
+            yield heapq.heappop(heap)[-1]
+    while heap:
+        yield heapq.heappop(heap)[-1]
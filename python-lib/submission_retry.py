@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Module with the backoff and circuit breaker used to submit again the files whose submission failed transiently"""
+
+import collections
+import logging
+import random
+import threading
+import time
+from typing import Callable
+
+from dku_constants import CIRCUIT_BREAKER_COOLDOWN_SEC
+from dku_constants import CIRCUIT_BREAKER_MIN_CALLS
+from dku_constants import CIRCUIT_BREAKER_WINDOW_SIZE
+from dku_constants import DEFAULT_CIRCUIT_BREAKER_ERROR_RATE
+from dku_constants import DEFAULT_MAX_SUBMISSION_ATTEMPTS
+from dku_constants import SUBMISSION_RETRY_BASE_DELAY_SEC
+from dku_constants import SUBMISSION_RETRY_MAX_DELAY_SEC
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class SubmissionRetryPolicy:
+    """Number of attempts of a submission and delay before each new attempt, with exponential backoff and full jitter.
+
+    The delay before the n-th retry is drawn uniformly between 0 and `base_delay_sec * 2 ** (n - 1)`,
+    capped at `max_delay_sec`, so that rows failed at the same time are not submitted again at the same time.
+
+    Attributes:
+        max_attempts: Maximum number of attempts of each submission, 1 to never submit again
+        base_delay_sec: Maximum delay before the first retry
+        max_delay_sec: Maximum delay before any retry
+    """
+
+    def __init__(self,
+                 max_attempts: int = DEFAULT_MAX_SUBMISSION_ATTEMPTS,
+                 base_delay_sec: float = SUBMISSION_RETRY_BASE_DELAY_SEC,
+                 max_delay_sec: float = SUBMISSION_RETRY_MAX_DELAY_SEC,
+                 seed: int = None):
+        self.max_attempts = max_attempts
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self._random = random.Random(seed)
+
+    def get_delay_sec(self, attempt: int) -> float:
+        """Delay before the attempt following the failed attempt number `attempt`, starting at 1"""
+        return self._random.uniform(0, min(self.max_delay_sec, self.base_delay_sec * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Pauses all the submissions for `cooldown_sec` when the rate of transient errors spikes.
+
+    The outcomes of the last `window_size` submissions are kept. Once at least `min_calls` are known and the
+    share of errors reaches `error_rate_threshold`, the breaker opens: submissions wait until the end of the
+    cooldown, and the outcomes are forgotten so that the next ones decide whether to pause again.
+
+    Attributes:
+        error_rate_threshold: Share of transient errors in the window which opens the breaker
+        window_size: Number of last submissions whose outcome is kept
+        min_calls: Minimum number of outcomes before the breaker can open
+        cooldown_sec: Time during which submissions are paused once the breaker is open
+        clock: Function returning a monotonic time in seconds
+    """
+
+    def __init__(self,
+                 error_rate_threshold: float = DEFAULT_CIRCUIT_BREAKER_ERROR_RATE,
+                 window_size: int = CIRCUIT_BREAKER_WINDOW_SIZE,
+                 min_calls: int = CIRCUIT_BREAKER_MIN_CALLS,
+                 cooldown_sec: float = CIRCUIT_BREAKER_COOLDOWN_SEC,
+                 clock: Callable[[], float] = time.monotonic):
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.cooldown_sec = cooldown_sec
+        self.clock = clock
+        self.num_openings = 0
+        self._outcomes = collections.deque(maxlen=window_size)
+        self._open_until = None
+        self._lock = threading.Lock()
+
+    def get_waiting_time_sec(self) -> float:
+        """Time left before submissions can go on, 0 if the breaker is closed"""
+        with self._lock:
+            if self._open_until is None:
+                return 0.0
+            return max(0.0, self._open_until - self.clock())
+
+    def wait(self) -> None:
+        """Wait until the breaker is closed"""
+        waiting_time_sec = self.get_waiting_time_sec()
+        while waiting_time_sec > 0:
+            time.sleep(waiting_time_sec)
+            waiting_time_sec = self.get_waiting_time_sec()
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of a submission, opening the breaker if the error rate reaches the threshold"""
+        with self._lock:
+            self._outcomes.append(success)
+            num_errors = self._outcomes.count(False)
+            if len(self._outcomes) < self.min_calls or num_errors < self.error_rate_threshold * len(self._outcomes):
+                return
+            logging.warning(f"{num_errors} transient error(s) in the last {len(self._outcomes)} submissions, "
+                            f"pausing submissions for {self.cooldown_sec} seconds")
+            self._open_until = self.clock() + self.cooldown_sec
+            self._outcomes.clear()
+            self.num_openings += 1
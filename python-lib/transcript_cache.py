@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Module with a cache of transcription results, keyed by the content of the audio file and the job options"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from io import BytesIO
+from typing import AnyStr, Dict
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class CacheBackend(ABC):
+    """Interface of the storage of the transcript cache: files identified by name"""
+
+    @abstractmethod
+    def read(self, name: AnyStr) -> bytes:
+        """Content of the file, None if it does not exist"""
+
+    @abstractmethod
+    def write(self, name: AnyStr, content: bytes) -> None:
+        """Create or overwrite the file"""
+
+    @abstractmethod
+    def delete(self, name: AnyStr) -> None:
+        """Delete the file, if it exists"""
+
+
+class LocalDirectoryCacheBackend(CacheBackend):
+    """Cache files stored in a local directory"""
+
+    def __init__(self, directory: AnyStr):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def read(self, name: AnyStr) -> bytes:
+        try:
+            with open(os.path.join(self.directory, name), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name: AnyStr, content: bytes) -> None:
+        with open(os.path.join(self.directory, name), "wb") as file:
+            file.write(content)
+
+    def delete(self, name: AnyStr) -> None:
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+
+class FolderCacheBackend(CacheBackend):
+    """Cache files stored under a prefix of a Dataiku Folder"""
+
+    def __init__(self, folder, prefix: AnyStr):
+        self.folder = folder
+        self.prefix = prefix.rstrip("/")
+
+    def read(self, name: AnyStr) -> bytes:
+        try:
+            with self.folder.get_download_stream(f"{self.prefix}/{name}") as stream:
+                return stream.read()
+        except Exception:
+            return None
+
+    def write(self, name: AnyStr, content: bytes) -> None:
+        self.folder.upload_stream(f"{self.prefix}/{name}", BytesIO(content))
+
+    def delete(self, name: AnyStr) -> None:
+        self.folder.delete_path(f"{self.prefix}/{name}")
+
+
+class TranscriptCache:
+    """Cache of transcription results with a size-based LRU eviction.
+
+    Entries are keyed by the identity of the audio content (S3 ETag and size) and the job options,
+    so that the same audio is not transcribed twice, even when it is copied to another folder.
+    The index of entries is kept in memory, ordered from the least to the most recently used, and persisted
+    with the entries at most every `index_sync_interval_sec` seconds when entries are added, and when the cache
+    is closed, so that the entries of a run which fails are still found by the next one.
+    Entries found with `contains(key, pin=True)` are not evicted until they are read and unpinned, so that the
+    entries of the files not submitted to Amazon Transcribe are still there when their results are written.
+
+    Attributes:
+        backend: Storage of the cache entries
+        max_size_bytes: Maximum total size of the entries, beyond which the least recently used are evicted
+        index_sync_interval_sec: Minimum time between two writes of the index while entries are added
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, backend: CacheBackend, max_size_bytes: int, index_sync_interval_sec: float = 30):
+        self.backend = backend
+        self.max_size_bytes = max_size_bytes
+        self.index_sync_interval_sec = index_sync_interval_sec
+        self.num_hits = 0
+        self.num_misses = 0
+        self._lock = threading.Lock()
+        index_content = backend.read(self.INDEX_NAME)
+        index = json.loads(index_content) if index_content else []
+        # Ordered from the least to the most recently used: [key, size_bytes] pairs
+        self._index = OrderedDict((key, size_bytes) for key, size_bytes in index)
+        self._pins = {}  # Number of pins by key, for the entries which cannot be evicted
+        self._total_size_bytes = sum(self._index.values())
+        self._last_index_sync = time.monotonic()
+
+    @staticmethod
+    def make_key(etag: AnyStr, size_bytes: int, **job_options) -> AnyStr:
+        """Key of a cache entry from the identity of the audio content and the options of the job"""
+        key_content = json.dumps({"etag": etag, "size_bytes": size_bytes, **job_options}, sort_keys=True)
+        return hashlib.sha256(key_content.encode("utf-8")).hexdigest()
+
+    def contains(self, key: AnyStr, pin: bool = False) -> bool:
+        """Look up a key, counting hits and misses and marking the entry as recently used
+
+        Args:
+            key: Key of the entry
+            pin: If True, the entry found is not evicted until it is unpinned with `unpin`
+
+        """
+        with self._lock:
+            if key not in self._index:
+                self.num_misses += 1
+                return False
+            self._index.move_to_end(key)
+            self.num_hits += 1
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            return True
+
+    def unpin(self, key: AnyStr) -> None:
+        """Allow the eviction of an entry pinned by `contains` again, once it has been read"""
+        with self._lock:
+            num_pins = self._pins.pop(key, 0) - 1
+            if num_pins > 0:
+                self._pins[key] = num_pins
+
+    def get(self, key: AnyStr) -> Dict:
+        """Cached entry, None if it is not in the cache"""
+        content = self.backend.read(f"{key}.json")
+        if content is None:
+            with self._lock:
+                self._total_size_bytes -= self._index.pop(key, 0)
+            return None
+        return json.loads(content)
+
+    def put(self, key: AnyStr, entry: Dict) -> None:
+        """Add an entry to the cache and evict the least recently used entries beyond the maximum size"""
+        content = json.dumps(entry).encode("utf-8")
+        self.backend.write(f"{key}.json", content)
+        evicted_keys = []
+        with self._lock:
+            self._total_size_bytes += len(content) - self._index.pop(key, 0)
+            self._index[key] = len(content)
+            for candidate_key in list(self._index):
+                if self._total_size_bytes <= self.max_size_bytes:
+                    break
+                if candidate_key == key or candidate_key in self._pins:
+                    continue
+                self._total_size_bytes -= self._index.pop(candidate_key)
+                evicted_keys.append(candidate_key)
+            sync_index = time.monotonic() - self._last_index_sync >= self.index_sync_interval_sec
+            if sync_index:
+                self._last_index_sync = time.monotonic()
+        for evicted_key in evicted_keys:
+            self.backend.delete(f"{evicted_key}.json")
+        if sync_index:
+            try:
+                self._write_index()
+            except Exception as e:
+                logging.warning(f"Index of the transcript cache could not be written: {e}")
+
+    def _write_index(self) -> None:
+        with self._lock:
+            index = [[key, size_bytes] for key, size_bytes in self._index.items()]
+        self.backend.write(self.INDEX_NAME, json.dumps(index).encode("utf-8"))
+
+    def get_stats(self) -> Dict:
+        """Hit and miss counters, and current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.num_hits,
+                "misses": self.num_misses,
+                "entries": len(self._index),
+                "size_bytes": self._total_size_bytes,
+            }
+
+    def close(self) -> None:
+        """Persist the index of entries"""
+        self._write_index()
+        logging.info(f"Transcript cache closed: {self.get_stats()}")
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""End-to-end benchmark of job submission, polling and result collection against the fake AWS backend
+
+Each number of files is benchmarked in a fresh process, so that its peak memory is measured on its own.
+Results are saved as JSON, along with the commit and the parameters, to be compared across commits.
+
+Usage (from the root of the repository):
+    python tests/python/benchmark/run_benchmark.py --num-files 100 1000 --output benchmark.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Dict, List
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+sys.path[:0] = [os.path.join(ROOT_DIR, "python-lib"), os.path.join(ROOT_DIR, "tests", "python")]
+
+import pandas as pd  # noqa: E402
+
+from more_itertools import chunked  # noqa: E402
+
+from amazon_transcribe_api_client import APIRateLimiter, AWSTranscribeAPIWrapper  # noqa: E402
+from dku_constants import OUTPUT_BATCH_SIZE  # noqa: E402
+from fake_aws import FakeAWSBackend, FakeAWSServer, FakeS3Client, FakeTranscribeClient  # noqa: E402
+from job_timings import JobTimings  # noqa: E402
+from plugin_io_utils import PATH_COLUMN  # noqa: E402
+from plugin_parallelizer import StreamingDataFrameParallelizer  # noqa: E402
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+DEFAULT_NUM_FILES = [100, 1000, 10000, 100000]
+"""Default numbers of files to benchmark"""
+
+BUCKET = "benchmark"
+"""Bucket of the simulated input and output folders"""
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def get_peak_rss_mb() -> float:
+    """Peak resident memory of the current process, in MB"""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 ** 2 if sys.platform == "darwin" else peak_rss / 1024  # Bytes on macOS, KB on Linux
+
+
+def get_percentiles(values: List[float]) -> Dict:
+    """Percentiles of a list of durations, in seconds"""
+    if not values:
+        return {}
+    series = pd.Series(values)
+    return {
+        "p50": round(series.quantile(0.5), 3),
+        "p95": round(series.quantile(0.95), 3),
+        "p99": round(series.quantile(0.99), 3),
+        "max": round(series.max(), 3),
+    }
+
+
+def run_benchmark(num_files: int, params: Dict) -> Dict:
+    """
+    Submit `num_files` files, poll their jobs and collect their results, measuring each step.
+    As in the recipe, the jobs are polled while the next files are submitted, and the results are gathered
+    by batches of the size written to the output dataset, so that the memory measured is the one of a run.
+    """
+    logging.basicConfig(level=params["log_level"])
+    backend = FakeAWSBackend(
+        queue_latency_sec=params["queue_latency_sec"],
+        processing_latency_sec=params["processing_latency_sec"],
+        failure_rate=params["failure_rate"],
+        request_latency_sec=params["request_latency_sec"],
+        requests_per_sec=params["throttling_requests_per_sec"],
+        seed=params["seed"],
+    )
+    backend.put_audio_files(BUCKET, [f"input/audio_{i}.mp3" for i in range(num_files)])
+    server = None
+    if params["http"]:
+        server = FakeAWSServer(backend)
+        server.start()
+    rate_limiter = APIRateLimiter(params["rate_limits"]) if params["rate_limits"] else None
+    job_timings = JobTimings()
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=params["max_polling_requests_per_sec"],
+                                          download_workers=params["download_workers"],
+                                          rate_limiter=rate_limiter,
+                                          job_timings=job_timings)
+    if server is not None:
+        api_wrapper.client = server.create_client("transcribe", max_attempts=params["max_attempts"])
+        api_wrapper.s3_client = server.create_client("s3", max_attempts=params["max_attempts"])
+    else:
+        api_wrapper.client = FakeTranscribeClient(backend)
+        api_wrapper.s3_client = FakeS3Client(backend)
+    if rate_limiter is not None:
+        api_wrapper.client.meta.events.register("before-send.transcribe", api_wrapper._pace_request)
+    baseline_rss_mb = get_peak_rss_mb()
+
+    start = time.time()
+    submission_end = None
+    parallelizer = StreamingDataFrameParallelizer(function=api_wrapper.start_transcription_jobs,
+                                                  exceptions_to_catch=api_wrapper.API_EXCEPTIONS,
+                                                  parallel_workers=params["parallel_workers"],
+                                                  batch_support=True,
+                                                  batch_size=params["submission_batch_size"],
+                                                  batch_response_parser=api_wrapper.parse_batch_submission_response)
+
+    def generate_submitted_jobs():
+        nonlocal submission_end
+        yield from api_wrapper.iter_submissions(parallelizer,
+                                                rows=({PATH_COLUMN: f"/audio_{i}.mp3"} for i in range(num_files)),
+                                                columns=[PATH_COLUMN],
+                                                input_folder_bucket=BUCKET,
+                                                input_folder_root_path="input",
+                                                output_folder_bucket=BUCKET,
+                                                output_folder_root_path="output",
+                                                job_id="benchmark",
+                                                language=params["language"])
+        submission_end = time.time()
+
+    # Rows are timed as they are yielded, i.e., when they would be handed to the writer of the output dataset
+    completion_to_row_sec = []
+    num_rows = 0
+    num_completed = 0
+    columns = api_wrapper.get_output_columns(display_json=False, include_timings=True)
+    job_results = api_wrapper.iter_results(submitted_jobs=generate_submitted_jobs(),
+                                           recipe_job_id="benchmark",
+                                           display_json=False,
+                                           transcript_json_loader=backend.transcript_json_loader,
+                                           folder=None)
+    for batch in chunked(job_results, OUTPUT_BATCH_SIZE):
+        for row in batch:
+            if row["job_name"]:
+                completion_to_row_sec.append(time.time() - backend.get_completion_time(row["job_name"]))
+        batch_df = pd.DataFrame(batch, columns=columns)
+        num_rows += len(batch_df.index)
+        num_completed += int((batch_df["output_error_type"] == "").sum())
+    total_time_sec = time.time() - start
+    submission_time_sec = submission_end - start
+
+    if server is not None:
+        server.stop()
+    stats = backend.get_stats()
+    num_api_calls = sum(stats["requests"].values())
+    return {
+        "num_files": num_files,
+        "num_completed": num_completed,
+        "num_failed": num_rows - num_completed,
+        "submission_time_sec": round(submission_time_sec, 3),
+        "submission_rate_per_sec": round(num_files / submission_time_sec, 1) if submission_time_sec else None,
+        "results_time_sec": round(total_time_sec - submission_time_sec, 3),
+        "total_time_sec": round(total_time_sec, 3),
+        "api_calls": stats["requests"],
+        "throttled_api_calls": stats["throttled"],
+        "api_calls_per_completed_job": round(num_api_calls / num_completed, 3) if num_completed else None,
+        "completion_to_row_sec": get_percentiles(completion_to_row_sec),
+        "stage_durations_sec": job_timings.get_summary(),
+        "baseline_rss_mb": round(baseline_rss_mb, 1),
+        "peak_rss_mb": round(get_peak_rss_mb(), 1),
+    }
+
+
+def get_commit() -> str:
+    """Commit of the benchmarked code, with a suffix if the working tree has uncommitted changes"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+        is_dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=ROOT_DIR) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if is_dirty else commit
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-files", type=int, nargs="+", default=DEFAULT_NUM_FILES)
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON results")
+    parser.add_argument("--http", action="store_true", help="Use boto3 clients and the local HTTP endpoint")
+    parser.add_argument("--queue-latency-sec", type=float, default=5.0)
+    parser.add_argument("--processing-latency-sec", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--request-latency-sec", type=float, default=0.0)
+    parser.add_argument("--throttling", type=json.loads, default={}, dest="throttling_requests_per_sec",
+                        help='Requests per second by operation beyond which the backend throttles, as JSON')
+    parser.add_argument("--rate-limits", type=json.loads, default={},
+                        help='Client-side rate limits by operation, as JSON, e.g. {"StartTranscriptionJob": 10}')
+    parser.add_argument("--parallel-workers", type=int, default=4)
+    parser.add_argument("--submission-batch-size", type=int, default=10)
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--max-polling-requests-per-sec", type=float, default=5)
+    parser.add_argument("--max-attempts", type=int, default=20)
+    parser.add_argument("--language", default="auto")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    params = {key: value for key, value in vars(args).items() if key not in ("num_files", "output")}
+    results = []
+    for num_files in args.num_files:
+        # A new process for each run, so that the peak memory of a run is not hidden by the previous ones
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(run_benchmark, num_files, params).result()
+        print(json.dumps(result), flush=True)
+        results.append(result)
+    with open(args.output, "w") as file:
+        json.dump({
+            "commit": get_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "parameters": params,
+            "results": results,
+        }, file, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""Fake Amazon Transcribe and S3 backend, to test the plugin at scale without any network"""
+
+from fake_aws.backend import FakeAWSBackend, FakeAWSError  # noqa
+from fake_aws.clients import FakeS3Client, FakeTranscribeClient  # noqa
+from fake_aws.server import FakeAWSServer  # noqa
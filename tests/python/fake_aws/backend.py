@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""In-memory stand-in for the Amazon Transcribe and S3 operations used by the plugin"""
+
+import bisect
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import AnyStr, Callable, Dict, List
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class FakeAWSError(Exception):
+    """Error returned by the fake backend, in the shape of an AWS error response"""
+
+    def __init__(self, code: AnyStr, message: AnyStr, status_code: int = 400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+
+class _RequestBucket:
+    """Token bucket refusing the requests beyond a rate, with a burst of one second of requests"""
+
+    def __init__(self, rate: float, clock: Callable[[], float]):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.last_refill = clock()
+
+    def try_acquire(self) -> bool:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class FakeAWSBackend:
+    """Simulates Amazon Transcribe jobs and the S3 objects they read and write, without any network.
+
+    The status of a job is derived from the clock: it is QUEUED for `queue_latency_sec` after its submission,
+    then IN_PROGRESS while it is processed, then COMPLETED (or FAILED, with a probability of `failure_rate`).
+    Nothing runs in the background, so tens of thousands of jobs can be simulated in a single process.
+    Completed jobs write their transcript JSON to their output location, readable as an S3 object.
+
+    The backend is used through the in-process clients of `fake_aws.clients`, or through the local HTTP
+    endpoint of `fake_aws.server` with real boto3 clients.
+
+    Attributes:
+        queue_latency_sec: Time spent by each job in the QUEUED status
+        processing_latency_sec: Time spent by each job in the IN_PROGRESS status, on top of the time per MB
+        processing_sec_per_mb: Additional processing time per MB of the audio file
+        failure_rate: Probability of a job to end in the FAILED status
+        requests_per_sec: Maximum number of requests per second by operation name, beyond which requests are
+            throttled, e.g., {"StartTranscriptionJob": 10}. Operations which are not set are not throttled.
+        request_latency_sec: Time taken by each request, to simulate the network round trip
+        max_concurrent_jobs: Quota of QUEUED and IN_PROGRESS jobs, beyond which submissions are rejected with
+            a LimitExceededException. No quota if None.
+        max_results_per_page: Maximum number of jobs in a page of `ListTranscriptionJobs`
+        seed: Seed of the random failures
+        clock: Function returning the current time, in seconds since the epoch
+    """
+
+    TRANSCRIBE_OPERATIONS = (
+        "StartTranscriptionJob", "GetTranscriptionJob", "ListTranscriptionJobs", "DeleteTranscriptionJob"
+    )
+    S3_OPERATIONS = ("PutObject", "HeadObject", "GetObject", "ListObjectsV2", "DeleteObjects")
+    THROTTLING_ERROR_CODES = {"transcribe": "ThrottlingException", "s3": "SlowDown"}
+    DEFAULT_LANGUAGE_CODE = "en-US"
+
+    def __init__(
+        self,
+        queue_latency_sec: float = 0.0,
+        processing_latency_sec: float = 1.0,
+        processing_sec_per_mb: float = 0.0,
+        failure_rate: float = 0.0,
+        requests_per_sec: Dict[AnyStr, float] = None,
+        request_latency_sec: float = 0.0,
+        max_concurrent_jobs: int = None,
+        max_results_per_page: int = 100,
+        seed: int = 0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.queue_latency_sec = queue_latency_sec
+        self.processing_latency_sec = processing_latency_sec
+        self.processing_sec_per_mb = processing_sec_per_mb
+        self.failure_rate = failure_rate
+        self.request_latency_sec = request_latency_sec
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_results_per_page = max_results_per_page
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._request_buckets = {
+            operation: _RequestBucket(rate, clock) for operation, rate in (requests_per_sec or {}).items()
+        }
+        self._lock = threading.Lock()
+        self._jobs = {}  # Ordered by submission time
+        self._objects = {}  # {(bucket, key): bytes}
+        self._sorted_keys = {}  # Sorted keys by bucket, for the listing
+        self._job_by_output = {}  # {(bucket, key): job name} of the transcripts to be written by the jobs
+        self.num_requests = {}
+        self.num_throttled = {}
+
+    # Requests
+
+    def handle(self, service: AnyStr, operation: AnyStr, params: Dict) -> Dict:
+        """Handle a request to an operation, given its parameters in the shape of the boto3 client method
+
+        Raises:
+            FakeAWSError: If the request is throttled or fails, in the shape of the corresponding AWS error
+
+        """
+        operations = self.TRANSCRIBE_OPERATIONS if service == "transcribe" else self.S3_OPERATIONS
+        if operation not in operations:
+            raise FakeAWSError("InvalidAction", f"Operation {operation} is not supported by the fake {service}")
+        if self.request_latency_sec:
+            time.sleep(self.request_latency_sec)
+        with self._lock:
+            self.num_requests[operation] = self.num_requests.get(operation, 0) + 1
+            bucket = self._request_buckets.get(operation)
+            if bucket is not None and not bucket.try_acquire():
+                self.num_throttled[operation] = self.num_throttled.get(operation, 0) + 1
+                status_code = 400 if service == "transcribe" else 503
+                raise FakeAWSError(self.THROTTLING_ERROR_CODES[service], "Rate exceeded", status_code)
+            return getattr(self, f"_{operation}")(**params)
+
+    def get_stats(self) -> Dict:
+        """Number of requests and throttled requests by operation, and number of jobs by status"""
+        with self._lock:
+            now = self.clock()
+            num_jobs_by_status = {}
+            for job in self._jobs.values():
+                status = self._get_status(job, now)
+                num_jobs_by_status[status] = num_jobs_by_status.get(status, 0) + 1
+            return {
+                "requests": dict(self.num_requests),
+                "throttled": dict(self.num_throttled),
+                "jobs": num_jobs_by_status,
+            }
+
+    # Helpers for tests
+
+    def put_audio_files(self, bucket: AnyStr, keys: List[AnyStr], size_bytes: int = 1024) -> None:
+        """Add placeholder audio files, only their size matters to the simulated jobs"""
+        body = b"\0" * size_bytes  # Shared by all the files, so that the fake holds 100k+ files in little memory
+        with self._lock:
+            for key in keys:
+                self._put(bucket, key, body)
+
+    def transcript_json_loader(self, folder, job_name: AnyStr) -> Dict:
+        """Read the transcript JSON of a completed job, with the signature expected by the API wrapper"""
+        with self._lock:
+            job = self._jobs[job_name]
+            return json.loads(self._get_object_body(job["output_bucket"], job["output_key"]))
+
+    def get_completion_time(self, job_name: AnyStr) -> float:
+        """Time at which a job is completed or failed, in seconds since the epoch"""
+        with self._lock:
+            return self._jobs[job_name]["completed_at"]
+
+    # Job lifecycle
+
+    def _get_status(self, job: Dict, now: float) -> AnyStr:
+        if now < job["started_at"]:
+            return "QUEUED"
+        if now < job["completed_at"]:
+            return "IN_PROGRESS"
+        return job["final_status"]
+
+    def _get_job_description(self, job: Dict, now: float, summary: bool = False) -> Dict:
+        status = self._get_status(job, now)
+        description = {
+            "TranscriptionJobName": job["name"],
+            "TranscriptionJobStatus": status,
+            "CreationTime": datetime.fromtimestamp(job["created_at"], timezone.utc),
+        }
+        if job["language_code"]:
+            description["LanguageCode"] = job["language_code"]
+        if status != "QUEUED":
+            description["StartTime"] = datetime.fromtimestamp(job["started_at"], timezone.utc)
+        if status in ("COMPLETED", "FAILED"):
+            description["CompletionTime"] = datetime.fromtimestamp(job["completed_at"], timezone.utc)
+        if status == "FAILED":
+            description["FailureReason"] = job["failure_reason"]
+        if summary:
+            if status == "COMPLETED":
+                description["OutputLocationType"] = "CUSTOMER_BUCKET"
+            return description
+        description["Media"] = {"MediaFileUri": job["media_uri"]}
+        if job["identify_language"]:
+            description["IdentifyLanguage"] = True
+        if status == "COMPLETED":
+            description["Transcript"] = {
+                "TranscriptFileUri": f"https://s3.amazonaws.com/{job['output_bucket']}/{job['output_key']}"
+            }
+        return description
+
+    # Transcribe operations
+
+    def _StartTranscriptionJob(
+        self,
+        TranscriptionJobName: AnyStr,
+        Media: Dict,
+        LanguageCode: AnyStr = None,
+        IdentifyLanguage: bool = False,
+        OutputBucketName: AnyStr = None,
+        OutputKey: AnyStr = "",
+        **kwargs,
+    ) -> Dict:
+        if TranscriptionJobName in self._jobs:
+            raise FakeAWSError(
+                "ConflictException", "The requested job name already exists. Use a different job name."
+            )
+        if not LanguageCode and not IdentifyLanguage:
+            raise FakeAWSError("BadRequestException", "Specify a language code or enable language identification.")
+        now = self.clock()
+        if self.max_concurrent_jobs is not None:
+            num_active_jobs = sum(
+                self._get_status(job, now) in ("QUEUED", "IN_PROGRESS") for job in self._jobs.values()
+            )
+            if num_active_jobs >= self.max_concurrent_jobs:
+                raise FakeAWSError("LimitExceededException", "You have reached the limit of concurrent jobs.")
+        media_uri = Media.get("MediaFileUri", "")
+        media_bucket, _, media_key = media_uri[len("s3://"):].partition("/")
+        media = self._objects.get((media_bucket, media_key))
+        job = {
+            "name": TranscriptionJobName,
+            "media_uri": media_uri,
+            "identify_language": bool(IdentifyLanguage),
+            "language_code": LanguageCode,
+            "created_at": now,
+            "started_at": now + self.queue_latency_sec,
+            "final_status": "COMPLETED",
+            "failure_reason": "",
+        }
+        size_mb = len(media) / 1024 ** 2 if media is not None else 0
+        job["completed_at"] = job["started_at"] + self.processing_latency_sec + size_mb * self.processing_sec_per_mb
+        if media is None:
+            job["final_status"] = "FAILED"
+            job["failure_reason"] = (
+                "The URI that you provided doesn't point to an S3 object. "
+                "Make sure that the object exists and try your request again."
+            )
+        elif self._random.random() < self.failure_rate:
+            job["final_status"] = "FAILED"
+            job["failure_reason"] = "Internal failure (simulated)."
+        elif IdentifyLanguage:
+            job["language_code"] = self.DEFAULT_LANGUAGE_CODE
+        job["output_bucket"] = OutputBucketName or media_bucket
+        job["output_key"] = f"{OutputKey}{TranscriptionJobName}.json"
+        self._jobs[TranscriptionJobName] = job
+        self._job_by_output[(job["output_bucket"], job["output_key"])] = TranscriptionJobName
+        description = self._get_job_description(job, now)
+        if IdentifyLanguage:
+            description.pop("LanguageCode", None)  # Not known until the job is processed
+        return {"TranscriptionJob": description}
+
+    def _GetTranscriptionJob(self, TranscriptionJobName: AnyStr) -> Dict:
+        job = self._jobs.get(TranscriptionJobName)
+        if job is None:
+            raise FakeAWSError(
+                "BadRequestException", "The requested job couldn't be found. Check the job name and try again."
+            )
+        return {"TranscriptionJob": self._get_job_description(job, self.clock())}
+
+    def _ListTranscriptionJobs(
+        self,
+        Status: AnyStr = None,
+        JobNameContains: AnyStr = None,
+        NextToken: AnyStr = None,
+        MaxResults: int = 5,
+    ) -> Dict:
+        now = self.clock()
+        jobs = [
+            job
+            for job in reversed(list(self._jobs.values()))  # Most recent first
+            if (not JobNameContains or JobNameContains in job["name"])
+            and (not Status or self._get_status(job, now) == Status)
+        ]
+        start = int(NextToken) if NextToken else 0
+        end = start + min(MaxResults, self.max_results_per_page)
+        response = {
+            "TranscriptionJobSummaries": [
+                self._get_job_description(job, now, summary=True) for job in jobs[start:end]
+            ]
+        }
+        if Status:
+            response["Status"] = Status
+        if end < len(jobs):
+            response["NextToken"] = str(end)
+        return response
+
+    def _DeleteTranscriptionJob(self, TranscriptionJobName: AnyStr) -> Dict:
+        job = self._jobs.get(TranscriptionJobName)
+        if job is None:
+            raise FakeAWSError(
+                "BadRequestException", "The requested job couldn't be found. Check the job name and try again."
+            )
+        if self._get_status(job, self.clock()) == "COMPLETED":
+            # The transcript is written at completion, and kept once the job is deleted
+            self._get_object_body(job["output_bucket"], job["output_key"])
+        else:
+            # Deleting a job which is still QUEUED or IN_PROGRESS stops it, and frees its slot of the quota
+            del self._job_by_output[(job["output_bucket"], job["output_key"])]
+        del self._jobs[TranscriptionJobName]
+        return {}
+
+    # S3 operations
+
+    def _put(self, bucket: AnyStr, key: AnyStr, body: bytes) -> None:
+        if (bucket, key) not in self._objects:
+            bisect.insort(self._sorted_keys.setdefault(bucket, []), key)
+        self._objects[(bucket, key)] = body
+
+    def _get_object_body(self, bucket: AnyStr, key: AnyStr) -> bytes:
+        body = self._objects.get((bucket, key))
+        if body is None:
+            # The transcript of a job is written once the job is completed
+            job = self._jobs.get(self._job_by_output.get((bucket, key)))
+            if job is None or self._get_status(job, self.clock()) != "COMPLETED":
+                raise FakeAWSError("NoSuchKey", "The specified key does not exist.", 404)
+            body = json.dumps({
+                "jobName": job["name"],
+                "accountId": "123456789012",
+                "results": {"transcripts": [{"transcript": f"Transcript of {job['media_uri']}"}], "items": []},
+                "status": "COMPLETED",
+            }).encode("utf-8")
+            self._put(bucket, key, body)
+        return body
+
+    def _PutObject(self, Bucket: AnyStr, Key: AnyStr, Body: bytes = b"", **kwargs) -> Dict:
+        body = Body.read() if hasattr(Body, "read") else Body
+        self._put(Bucket, Key, body)
+        return {"ETag": self._get_etag(body)}
+
+    def _HeadObject(self, Bucket: AnyStr, Key: AnyStr, **kwargs) -> Dict:
+        body = self._get_object_body(Bucket, Key)
+        return {"ETag": self._get_etag(body), "ContentLength": len(body)}
+
+    def _GetObject(self, Bucket: AnyStr, Key: AnyStr, **kwargs) -> Dict:
+        body = self._get_object_body(Bucket, Key)
+        return {"ETag": self._get_etag(body), "ContentLength": len(body), "Body": body}
+
+    def _ListObjectsV2(
+        self, Bucket: AnyStr, Prefix: AnyStr = "", ContinuationToken: AnyStr = None, MaxKeys: int = 1000, **kwargs
+    ) -> Dict:
+        keys = self._sorted_keys.get(Bucket, [])
+        start = bisect.bisect_left(keys, ContinuationToken or Prefix)
+        page_keys = []
+        for key in keys[start:]:
+            if not key.startswith(Prefix) or len(page_keys) == MaxKeys:
+                break
+            page_keys.append(key)
+        next_index = start + len(page_keys)
+        is_truncated = next_index < len(keys) and keys[next_index].startswith(Prefix)
+        response = {
+            "Name": Bucket,
+            "Prefix": Prefix,
+            "KeyCount": len(page_keys),
+            "MaxKeys": MaxKeys,
+            "IsTruncated": is_truncated,
+            "Contents": [
+                {
+                    "Key": key,
+                    "Size": len(self._objects[(Bucket, key)]),
+                    "ETag": self._get_etag(self._objects[(Bucket, key)]),
+                }
+                for key in page_keys
+            ],
+        }
+        if is_truncated:
+            response["NextContinuationToken"] = keys[next_index]
+        return response
+
+    def _DeleteObjects(self, Bucket: AnyStr, Delete: Dict, **kwargs) -> Dict:
+        deleted = []
+        for item in Delete.get("Objects", []):
+            key = item["Key"]
+            # The transcript of a completed job may not have been read yet, it is deleted all the same
+            self._job_by_output.pop((Bucket, key), None)
+            if self._objects.pop((Bucket, key), None) is not None:
+                keys = self._sorted_keys[Bucket]
+                del keys[bisect.bisect_left(keys, key)]
+            deleted.append({"Key": key})
+        return {} if Delete.get("Quiet") else {"Deleted": deleted}
+
+    @staticmethod
+    def _get_etag(body: bytes) -> AnyStr:
+        return f'"{hashlib.md5(body).hexdigest()}"'
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""In-process clients of the fake backend, with the interface of the boto3 clients used by the plugin"""
+
+import re
+from io import BytesIO
+from types import SimpleNamespace
+from typing import AnyStr, Dict, Generator
+
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+from fake_aws.backend import FakeAWSBackend, FakeAWSError
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class _FakePaginator:
+    """Paginator following the token of the next page, like the boto3 paginators"""
+
+    def __init__(self, client: "FakeClient", method_name: AnyStr, input_token: AnyStr, output_token: AnyStr):
+        self.client = client
+        self.method_name = method_name
+        self.input_token = input_token
+        self.output_token = output_token
+
+    def paginate(self, **params) -> Generator[Dict, None, None]:
+        while True:
+            page = getattr(self.client, self.method_name)(**params)
+            yield page
+            if not page.get(self.output_token):
+                return
+            params = {**params, self.input_token: page[self.output_token]}
+
+
+class FakeClient:
+    """Client calling the fake backend directly, raising the same `ClientError` as boto3 clients.
+
+    Client methods are the snake case names of the operations, e.g., `start_transcription_job`.
+    The botocore events `before-send.<service>.<Operation>` and `needs-retry.<service>.<Operation>` are emitted
+    on `meta.events` around each call, so that the event handlers registered by the API wrapper are called.
+    Failed calls are not retried: use the local HTTP endpoint with a boto3 client to test retries.
+
+    Attributes:
+        backend: Fake backend handling the requests
+        service_name: "transcribe" or "s3"
+    """
+
+    # Only the operations with a boto3 paginator, Transcribe jobs are listed page by page with `NextToken`
+    PAGINATION_TOKENS = {"list_objects_v2": ("ContinuationToken", "NextContinuationToken")}
+
+    def __init__(self, backend: FakeAWSBackend, service_name: AnyStr):
+        self.backend = backend
+        self.service_name = service_name
+        operations = backend.TRANSCRIBE_OPERATIONS if service_name == "transcribe" else backend.S3_OPERATIONS
+        self._operations = {re.sub(r"(?<!^)(?=[A-Z])", "_", operation).lower(): operation for operation in operations}
+        self.meta = SimpleNamespace(events=HierarchicalEmitter())
+
+    def __getattr__(self, method_name: AnyStr):
+        operations = self.__dict__.get("_operations", {})
+        if method_name not in operations:
+            raise AttributeError(f"Fake {self.service_name} client has no method {method_name}")
+        return lambda **params: self._call(operations[method_name], params)
+
+    def _call(self, operation: AnyStr, params: Dict) -> Dict:
+        self.meta.events.emit(f"before-send.{self.service_name}.{operation}", request=None)
+        try:
+            response = self.backend.handle(self.service_name, operation, params)
+        except FakeAWSError as error:
+            error_response = {
+                "Error": {"Code": error.code, "Message": error.message},
+                "ResponseMetadata": {"HTTPStatusCode": error.status_code},
+            }
+            self.meta.events.emit(
+                f"needs-retry.{self.service_name}.{operation}", response=(None, error_response), attempts=1
+            )
+            raise ClientError(error_response, operation)
+        if "Body" in response:
+            response = {**response, "Body": BytesIO(response["Body"])}
+        return {**response, "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def get_paginator(self, method_name: AnyStr) -> _FakePaginator:
+        input_token, output_token = self.PAGINATION_TOKENS[method_name]
+        return _FakePaginator(self, method_name, input_token, output_token)
+
+
+class FakeTranscribeClient(FakeClient):
+    """In-process stand-in for `boto3.client("transcribe")`"""
+
+    def __init__(self, backend: FakeAWSBackend):
+        super().__init__(backend, "transcribe")
+
+
+class FakeS3Client(FakeClient):
+    """In-process stand-in for `boto3.client("s3")`"""
+
+    def __init__(self, backend: FakeAWSBackend):
+        super().__init__(backend, "s3")
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP endpoint serving the fake backend to real boto3 clients"""
+
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import AnyStr, Dict
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import boto3
+from botocore.config import Config
+
+from fake_aws.backend import FakeAWSBackend, FakeAWSError
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def _to_json(value):
+    """Serialize the timestamps as epoch seconds, as in the responses of the AWS JSON protocol"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _FakeAWSRequestHandler(BaseHTTPRequestHandler):
+    """Routes Transcribe requests (JSON protocol, with a X-Amz-Target header) and S3 requests (REST, path style)"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Requests are counted by the backend, logging each of them would flood the test output
+
+    @property
+    def backend(self) -> FakeAWSBackend:
+        return self.server.backend
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status_code: int, body: bytes = b"", headers: Dict = None) -> None:
+        self.send_response(status_code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_POST(self):
+        target = self.headers.get("X-Amz-Target", "")
+        if not target.startswith("Transcribe."):
+            return self._send(400, b"Only Transcribe operations are supported with POST")
+        params = json.loads(self._read_body() or b"{}")
+        headers = {"Content-Type": "application/x-amz-json-1.1"}
+        try:
+            response = self.backend.handle("transcribe", target.split(".", 1)[1], params)
+        except FakeAWSError as error:
+            body = json.dumps({"__type": error.code, "Message": error.message}).encode("utf-8")
+            return self._send(error.status_code, body, headers)
+        self._send(200, json.dumps(response, default=_to_json).encode("utf-8"), headers)
+
+    def _handle_s3(self, operation: AnyStr, params: Dict) -> Dict:
+        try:
+            return self.backend.handle("s3", operation, params)
+        except FakeAWSError as error:
+            body = (
+                f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                f"<Error><Code>{error.code}</Code><Message>{escape(error.message)}</Message></Error>"
+            ).encode("utf-8")
+            self._send(error.status_code, body, {"Content-Type": "application/xml"})
+            return None
+
+    def _parse_s3_path(self):
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        return unquote(bucket), unquote(key), query
+
+    def do_PUT(self):
+        bucket, key, _ = self._parse_s3_path()
+        response = self._handle_s3("PutObject", {"Bucket": bucket, "Key": key, "Body": self._read_body()})
+        if response is not None:
+            self._send(200, headers={"ETag": response["ETag"]})
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse_s3_path()
+        response = self._handle_s3("HeadObject", {"Bucket": bucket, "Key": key})
+        if response is not None:
+            self.send_response(200)
+            self.send_header("ETag", response["ETag"])
+            self.send_header("Content-Length", str(response["ContentLength"]))
+            self.end_headers()
+
+    def do_GET(self):
+        bucket, key, query = self._parse_s3_path()
+        if key:
+            response = self._handle_s3("GetObject", {"Bucket": bucket, "Key": key})
+            if response is not None:
+                self._send(200, response["Body"], {"ETag": response["ETag"]})
+            return
+        params = {"Bucket": bucket, "Prefix": query.get("prefix", ""), "MaxKeys": int(query.get("max-keys", 1000))}
+        if query.get("continuation-token"):
+            params["ContinuationToken"] = query["continuation-token"]
+        response = self._handle_s3("ListObjectsV2", params)
+        if response is None:
+            return
+        contents = "".join(
+            f"<Contents><Key>{escape(item['Key'])}</Key><ETag>{escape(item['ETag'])}</ETag>"
+            f"<Size>{item['Size']}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+            for item in response["Contents"]
+        )
+        next_token = response.get("NextContinuationToken")
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(params['Prefix'])}</Prefix>"
+            f"<KeyCount>{response['KeyCount']}</KeyCount><MaxKeys>{response['MaxKeys']}</MaxKeys>"
+            f"<IsTruncated>{str(response['IsTruncated']).lower()}</IsTruncated>"
+            + (f"<NextContinuationToken>{escape(next_token)}</NextContinuationToken>" if next_token else "")
+            + contents
+            + "</ListBucketResult>"
+        ).encode("utf-8")
+        self._send(200, body, {"Content-Type": "application/xml"})
+
+
+class FakeAWSServer:
+    """Local HTTP endpoint of the fake backend, for Transcribe and S3, used with real boto3 clients.
+
+    Requests go through the whole botocore stack: serialization, event handlers, retries and parsing.
+    Used as a context manager, the server runs in a background thread.
+
+    Attributes:
+        backend: Fake backend handling the requests
+        host: Host to listen on
+        port: Port to listen on, a free port is chosen if 0
+    """
+
+    def __init__(self, backend: FakeAWSBackend, host: AnyStr = "127.0.0.1", port: int = 0):
+        self.backend = backend
+        self._server = ThreadingHTTPServer((host, port), _FakeAWSRequestHandler)
+        self._server.daemon_threads = True
+        self._server.backend = backend
+        self._thread = None
+
+    @property
+    def endpoint_url(self) -> AnyStr:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def create_client(self, service_name: AnyStr, max_attempts: int = 1, **kwargs):
+        """Create a boto3 client of "transcribe" or "s3" sending its requests to this endpoint"""
+        config = Config(retries={"max_attempts": max_attempts, "mode": "adaptive"}, s3={"addressing_style": "path"})
+        return boto3.client(
+            service_name=service_name,
+            endpoint_url=self.endpoint_url,
+            region_name="us-east-1",
+            aws_access_key_id="fake",
+            aws_secret_access_key="fake",
+            config=config,
+            **kwargs,
+        )
@@ -0,0 +1,66 @@
+import pytest
+
+import polling_scheduler
+from fake_aws import FakeS3Client, FakeTranscribeClient
+from plugin_parallelizer import StreamingDataFrameParallelizer
+
+
+class FakeClock:
+    """Clock whose time is moved forward by the test, passed as the `clock` of the class under test"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class FakeRun:
+    """Submits audio files to a fake backend with the parallelizer, then collects the results of their jobs"""
+
+    @staticmethod
+    def submit(api_wrapper, paths, **parallelizer_kwargs):
+        """Submit the files at the paths with `start_transcription_job`, returning the output of the parallelizer"""
+        parallelizer = StreamingDataFrameParallelizer(function=api_wrapper.start_transcription_job,
+                                                      exceptions_to_catch=api_wrapper.API_EXCEPTIONS,
+                                                      **parallelizer_kwargs)
+        return parallelizer.run_on_rows(rows=({"path": path} for path in paths),
+                                        columns=["path"],
+                                        input_folder_bucket="bucket",
+                                        input_folder_root_path="root",
+                                        output_folder_bucket="bucket",
+                                        output_folder_root_path="output",
+                                        job_id="recipe",
+                                        language="auto")
+
+    @staticmethod
+    def get_results(api_wrapper, submitted_jobs, transcript_json_loader):
+        return api_wrapper.get_results(submitted_jobs=submitted_jobs,
+                                       recipe_job_id="recipe",
+                                       display_json=False,
+                                       transcript_json_loader=transcript_json_loader,
+                                       folder=None)
+
+    def __call__(self, api_wrapper, backend, num_files, **parallelizer_kwargs):
+        """Put audio files in the backend and connect the wrapper to it, then submit the files and get the results"""
+        backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(num_files)])
+        api_wrapper.client = FakeTranscribeClient(backend)
+        api_wrapper.s3_client = FakeS3Client(backend)
+        submitted_jobs = self.submit(api_wrapper, [f"/{i}.mp3" for i in range(num_files)], **parallelizer_kwargs)
+        return self.get_results(api_wrapper, submitted_jobs, backend.transcript_json_loader)
+
+
+@pytest.fixture
+def short_jobs(monkeypatch):
+    """Expect short jobs before any has completed, so that the jobs of the fake backend are polled early"""
+    monkeypatch.setattr(polling_scheduler, "DEFAULT_EXPECTED_JOB_DURATION_SEC", 0.05)
+
+
+@pytest.fixture
+def fake_run(short_jobs):
+    return FakeRun()
@@ -1,13 +1,41 @@
+import queue
 from datetime import datetime
 import pytest
+import pandas as pd
 
 import botocore.session
 from botocore.stub import Stubber
 
+from amazon_transcribe_api_client import APIRateLimiter
 from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
+from amazon_transcribe_api_client import TokenBucket
+from fake_aws import FakeAWSBackend, FakeS3Client
+from plugin_parallelizer import StreamingDataFrameParallelizer
+from transcript_cache import LocalDirectoryCacheBackend, TranscriptCache
 import amazon_transcribe_api_client
 
 
+class TestTokenBucket:
+
+    def test_reserve(self):
+        """ Test that calls beyond the burst capacity wait for the refill at the configured rate. """
+        now = [0.0]
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+
+        assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+        now[0] = 10.0
+        assert bucket.reserve() == 0.0
+        assert bucket.num_calls == 5
+        assert bucket.total_wait_sec == 1.5
+
+    def test_rate_limiter_unknown_operation(self):
+        """ Test that operations without a configured rate are not paced. """
+        rate_limiter = APIRateLimiter({"StartTranscriptionJob": 1})
+
+        assert rate_limiter.acquire("GetTranscriptionJob") == 0.0
+        assert list(rate_limiter.get_stats().keys()) == ["StartTranscriptionJob"]
+
+
 class TestAWSTranscribeAPIWrapper:
 
     def setup_class(self):
@@ -57,6 +85,33 @@ class TestAWSTranscribeAPIWrapper:
         assert type(response) == str
         assert response == "job_name"
 
+    def test_start_transcription_jobs_batch(self, stubber):
+        """ Test that the failed submissions of a batch are reported in their rows without failing the others. """
+        stubber.add_response('start_transcription_job', {"TranscriptionJob": {"TranscriptionJobName": "job_a"}})
+        stubber.add_client_error('start_transcription_job', "BadRequestException")
+        stubber.add_response('start_transcription_job', {"TranscriptionJob": {"TranscriptionJobName": "job_c"}})
+        stubber.activate()
+        parallelizer = StreamingDataFrameParallelizer(
+            function=self.api_wrapper.start_transcription_jobs,
+            exceptions_to_catch=self.api_wrapper.API_EXCEPTIONS,
+            parallel_workers=1,
+            batch_support=True,
+            batch_size=3,
+            batch_response_parser=self.api_wrapper.parse_batch_submission_response
+        )
+
+        submitted_jobs = parallelizer.run(df=pd.DataFrame({"path": ["/a.mp3", "/b.mp3", "/c.mp3"]}),
+                                          input_folder_bucket="bucket",
+                                          input_folder_root_path="root",
+                                          output_folder_bucket="bucket",
+                                          output_folder_root_path="root",
+                                          job_id="job_id",
+                                          language="fr-FR")
+
+        assert list(submitted_jobs["output_response"]) == ["job_a", "", "job_c"]
+        assert list(submitted_jobs["output_error_type"]) == \
+            ["", "amazon_transcribe_api_client.APITranscriptionJobError", ""]
+
     def test__result_parser(self):
         """ Test schema of the job result. """
 
@@ -89,3 +144,152 @@ class TestAWSTranscribeAPIWrapper:
         assert "language" in job_data
         assert "output_error_type" in job_data
         assert "output_error_message" in job_data
+
+    def test_get_pending_jobs_update_probes_few_jobs(self, stubber):
+        """ Test that a small set of pending jobs is probed job by job, without listing the jobs. """
+        for job_name in ["job_1", "job_2"]:
+            stubber.add_response('get_transcription_job',
+                                 {"TranscriptionJob": {"TranscriptionJobName": job_name,
+                                                       "TranscriptionJobStatus": self.api_wrapper.IN_PROGRESS}},
+                                 expected_params={"TranscriptionJobName": job_name})
+        stubber.activate()
+
+        jobs = self.api_wrapper.get_pending_jobs_update(pending_jobs=["job_1", "job_2"], recipe_job_id="recipe")
+
+        assert sorted(job["TranscriptionJobName"] for job in jobs) == ["job_1", "job_2"]
+
+    @pytest.mark.parametrize("due_jobs, num_jobs", [(None, 20), (["recipe_0", "recipe_14"], 7)])
+    def test_get_pending_jobs_update_lists_jobs(self, stubber, due_jobs, num_jobs):
+        """ Test that a large set of pending jobs is listed by active status and only the finished jobs are probed.
+        All the finished jobs are returned, but only the due jobs among the active ones. """
+        pending_jobs = [f"recipe_{i}" for i in range(20)]
+        statuses = {self.api_wrapper.QUEUED: range(8), self.api_wrapper.IN_PROGRESS: range(8, 14)}
+        for status, indices in statuses.items():
+            stubber.add_response('list_transcription_jobs',
+                                 {"TranscriptionJobSummaries": [
+                                     {"TranscriptionJobName": f"recipe_{i}", "TranscriptionJobStatus": status}
+                                     for i in indices]},
+                                 expected_params={"JobNameContains": "recipe", "MaxResults": 100, "Status": status})
+        for i in range(14, 20):
+            status = self.api_wrapper.FAILED if i == 18 else self.api_wrapper.COMPLETED
+            stubber.add_response('get_transcription_job',
+                                 {"TranscriptionJob": {"TranscriptionJobName": f"recipe_{i}",
+                                                       "TranscriptionJobStatus": status}},
+                                 expected_params={"TranscriptionJobName": f"recipe_{i}"})
+        stubber.activate()
+
+        jobs = self.api_wrapper.get_pending_jobs_update(pending_jobs=pending_jobs, recipe_job_id="recipe",
+                                                        due_jobs=due_jobs)
+
+        assert len(jobs) == num_jobs
+        assert sum(job["TranscriptionJobStatus"] == self.api_wrapper.COMPLETED for job in jobs) == 5
+        assert jobs[-1]["TranscriptionJobName"] == "recipe_19"
+
+    def test_iter_results_submission_errors(self):
+        """ Test that each job which could not be submitted is yielded with its error and the output columns. """
+        submitted_jobs = pd.DataFrame({
+            "path": ["/a.mp3", "/b.mp3"],
+            "output_response": ["", ""],
+            "output_error_message": ["throttled", "bad request"],
+            "output_error_type": ["APITranscriptionJobError", "APITranscriptionJobError"]
+        })
+        rows = list(self.api_wrapper.iter_results(submitted_jobs=submitted_jobs,
+                                                  recipe_job_id="recipe",
+                                                  display_json=False,
+                                                  transcript_json_loader=None,
+                                                  folder=''))
+
+        assert [row["path"] for row in rows] == ["/a.mp3", "/b.mp3"]
+        assert [row["output_error_message"] for row in rows] == ["throttled", "bad request"]
+        assert all(list(row.keys()) == self.api_wrapper.get_output_columns(display_json=False) for row in rows)
+
+    def test__get_downloaded_results(self):
+        """ Test that the results put in the download queue are yielded and that download errors are raised. """
+        download_queue = queue.Queue()
+        download_queue.put(({"job_name": "job_1"}, None))
+        download_queue.put(({"job_name": "job_2"}, None))
+
+        job_data_list = list(self.api_wrapper._get_downloaded_results(download_queue, waiting_time_sec=None))
+        assert [job_data["job_name"] for job_data in job_data_list] == ["job_1", "job_2"]
+
+        download_queue.put((None, amazon_transcribe_api_client.ResponseFormatError("missing keys")))
+        with pytest.raises(amazon_transcribe_api_client.ResponseFormatError):
+            list(self.api_wrapper._get_downloaded_results(download_queue, waiting_time_sec=0))
+
+    def test_start_transcription_job_cache_hit(self, tmp_path):
+        """ Test that no job is submitted for an audio file found in the transcript cache. """
+        transcript_cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=1000)
+        api_wrapper = AWSTranscribeAPIWrapper(transcript_cache=transcript_cache)
+        api_wrapper.client = self.api_wrapper.client
+        api_wrapper.s3_client = botocore.session.get_session().create_client("s3", region_name="eu-west-1")
+        cache_key = TranscriptCache.make_key(etag='"abc"', size_bytes=10, language="auto")
+        transcript_cache.put(cache_key, {"job_name": "previous_job", "language_code": "fr-FR",
+                                         "json": {"results": {"transcripts": [{"transcript": "bonjour"}]}}})
+
+        with Stubber(api_wrapper.s3_client) as s3_stubber:
+            s3_stubber.add_response('head_object', {"ETag": '"abc"', "ContentLength": 10},
+                                    expected_params={"Bucket": "bucket", "Key": "root/test-fr.mp3"})
+            job_name = api_wrapper.start_transcription_job(language="auto",
+                                                           row={"path": "/test-fr.mp3"},
+                                                           input_folder_bucket="bucket",
+                                                           input_folder_root_path="root",
+                                                           job_id="job_name")
+        rows = list(api_wrapper.iter_results(submitted_jobs=pd.DataFrame({"path": ["/test-fr.mp3"],
+                                                                          "output_response": [job_name],
+                                                                          "output_error_message": [""],
+                                                                          "output_error_type": [""]}),
+                                             recipe_job_id="job_name",
+                                             display_json=False,
+                                             transcript_json_loader=None,
+                                             folder=''))
+
+        assert [(row["job_name"], row["transcript"]) for row in rows] == [("previous_job", "bonjour")]
+
+    def test_iter_s3_paths(self):
+        """ Test that the files of a folder are listed page by page, relative to the root path of the folder. """
+        api_wrapper = AWSTranscribeAPIWrapper()
+        api_wrapper.s3_client = botocore.session.get_session().create_client("s3", region_name="eu-west-1")
+
+        with Stubber(api_wrapper.s3_client) as s3_stubber:
+            s3_stubber.add_response('list_objects_v2',
+                                    {"Contents": [{"Key": "root/a.mp3"}, {"Key": "root/sub/"}],
+                                     "IsTruncated": True, "NextContinuationToken": "token"},
+                                    expected_params={"Bucket": "bucket", "Prefix": "root/"})
+            s3_stubber.add_response('list_objects_v2',
+                                    {"Contents": [{"Key": "root/sub/b.wav"}], "IsTruncated": False},
+                                    expected_params={"Bucket": "bucket", "Prefix": "root/",
+                                                     "ContinuationToken": "token"})
+            paths = api_wrapper.iter_s3_paths(bucket="bucket", root_path="root")
+
+            assert next(paths) == "/a.mp3"
+            assert list(paths) == ["/sub/b.wav"]
+
+
+def test_timed_out_jobs_deleted(fake_run):
+    """ Test that jobs reaching the timeout are deleted, so that they no longer use the quota of concurrent jobs. """
+    backend = FakeAWSBackend(processing_latency_sec=3600)
+    api_wrapper = AWSTranscribeAPIWrapper(use_timeout=True, timeout_min=0, max_polling_requests_per_sec=1000)
+
+    results = fake_run(api_wrapper, backend, num_files=5)
+
+    assert list(results["output_error_type"]) == [amazon_transcribe_api_client.JOB_TIMEOUT_ERROR_TYPE] * 5
+    assert backend.get_stats()["jobs"] == {}
+
+
+def test_delete_finished_jobs(fake_run):
+    """ Test that the finished jobs of a run and their JSON results are deleted, but not the audio files. """
+    backend = FakeAWSBackend(processing_latency_sec=0.05, failure_rate=0.3)
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000)
+    results = fake_run(api_wrapper, backend, num_files=20)
+    assert sum(backend.get_stats()["jobs"].values()) == 20
+
+    num_deleted_jobs = api_wrapper.delete_finished_jobs(recipe_job_id="recipe",
+                                                        output_folder_bucket="bucket",
+                                                        output_folder_root_path="output")
+
+    assert num_deleted_jobs == 20
+    assert backend.get_stats()["jobs"] == {}
+    s3_client = FakeS3Client(backend)
+    assert s3_client.list_objects_v2(Bucket="bucket", Prefix="output/")["KeyCount"] == 0
+    assert s3_client.list_objects_v2(Bucket="bucket", Prefix="root/")["KeyCount"] == 20
+    assert (results["output_error_type"] == "").sum() > 0
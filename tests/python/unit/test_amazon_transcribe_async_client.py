@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from amazon_transcribe_async_client import AsyncAWSTranscribeAPIWrapper
+from concurrency_limiter import JobQuotaGate
+from fake_aws import FakeAWSBackend, FakeS3Client, FakeTranscribeClient
+from submission_retry import SubmissionRetryPolicy
+
+
+def iter_results_from_rows(api_wrapper, backend, rows):
+    return api_wrapper.iter_results_from_rows(rows=rows,
+                                              recipe_job_id="recipe",
+                                              display_json=False,
+                                              transcript_json_loader=backend.transcript_json_loader,
+                                              language="auto",
+                                              input_folder_bucket="bucket",
+                                              input_folder_root_path="root",
+                                              output_folder_bucket="bucket",
+                                              output_folder_root_path="output",
+                                              folder=None)
+
+
+def test_iter_results_from_rows(short_jobs):
+    """ Test that all the files are submitted and their results collected by the tasks of the event loop. """
+    backend = FakeAWSBackend(queue_latency_sec=0.02, processing_latency_sec=0.05, failure_rate=0.2, seed=42)
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(300)])
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, max_concurrent_requests=4)
+    api_wrapper.client = FakeTranscribeClient(backend)
+    api_wrapper.s3_client = FakeS3Client(backend)
+    paths = api_wrapper.iter_s3_paths(bucket="bucket", root_path="root")
+
+    results = list(iter_results_from_rows(api_wrapper, backend, ({"path": path} for path in paths)))
+
+    assert sorted(result["path"] for result in results) == sorted(f"/{i}.mp3" for i in range(300))
+    assert sum(result["output_error_type"] == "" for result in results) == backend.get_stats()["jobs"]["COMPLETED"]
+    assert all(result["transcript"].startswith("Transcript of")
+               for result in results if not result["output_error_type"])
+
+
+def test_submission_errors_reported_in_rows(short_jobs):
+    """ Test that a file which could not be submitted gets an error in its row, without stopping the others. """
+    backend = FakeAWSBackend(queue_latency_sec=0, processing_latency_sec=0.05,
+                             requests_per_sec={"StartTranscriptionJob": 0.01})
+    backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3"])
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000)
+    api_wrapper.client = FakeTranscribeClient(backend)
+
+    results = list(iter_results_from_rows(api_wrapper, backend, [{"path": "/a.mp3"}, {"path": "/b.mp3"}]))
+
+    assert sorted(result["output_error_type"] for result in results) == \
+        ["", "amazon_transcribe_api_client.APITranscriptionJobError"]
+
+
+def test_submissions_retried(short_jobs):
+    """ Test that a throttled submission is attempted again up to the attempts of the retry policy. """
+    backend = FakeAWSBackend(queue_latency_sec=0, processing_latency_sec=0.05,
+                             requests_per_sec={"StartTranscriptionJob": 0.01})
+    backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3"])
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000,
+                                               retry_policy=SubmissionRetryPolicy(max_attempts=3, base_delay_sec=0.01))
+    api_wrapper.client = FakeTranscribeClient(backend)
+
+    results = list(iter_results_from_rows(api_wrapper, backend, [{"path": "/a.mp3"}, {"path": "/b.mp3"}]))
+
+    assert sorted(result["output_error_type"] for result in results) == \
+        ["", "amazon_transcribe_api_client.APITranscriptionJobError"]
+    assert backend.get_stats()["requests"]["StartTranscriptionJob"] == 4
+
+
+def test_jobs_in_flight_are_bounded(short_jobs):
+    """ Test that the next rows are read only when jobs finish, so that at most `max_jobs_in_flight` are tracked. """
+    backend = FakeAWSBackend(queue_latency_sec=0, processing_latency_sec=0.05)
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(8)])
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, max_jobs_in_flight=4)
+    api_wrapper.client = FakeTranscribeClient(backend)
+    num_rows_read = []
+
+    def generate_rows():
+        for i in range(8):
+            num_rows_read.append(i)
+            yield {"path": f"/{i}.mp3"}
+
+    results = iter_results_from_rows(api_wrapper, backend, generate_rows())
+    next(results)
+    assert len(num_rows_read) <= 5
+    assert len(list(results)) == 7
+
+
+def test_job_quota_gate(short_jobs, monkeypatch):
+    """ Test that rows are submitted only when the job quota gate has room, so that no submission exceeds it. """
+    monkeypatch.setattr(AsyncAWSTranscribeAPIWrapper, "JOB_QUOTA_CHECK_INTERVAL_SEC", 0.01)
+    backend = FakeAWSBackend(queue_latency_sec=0, processing_latency_sec=0.05, max_concurrent_jobs=3)
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(12)])
+    gate = JobQuotaGate(max_jobs=3)
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, job_quota_gate=gate)
+    api_wrapper.client = FakeTranscribeClient(backend)
+
+    results = list(iter_results_from_rows(api_wrapper, backend, [{"path": f"/{i}.mp3"} for i in range(12)]))
+
+    assert [result["output_error_type"] for result in results] == [""] * 12
+    assert gate.max_jobs == 3  # Lowered if a submission had been rejected
+    assert gate.num_jobs_in_flight == 0  # Every slot acquired was given to a job, or given back
+
+
+@pytest.mark.parametrize("failing_stage", ["listing", "polling"])
+def test_task_errors_raised(short_jobs, failing_stage):
+    """ Test that an error of the listing or of the polling is raised to the consumer instead of hanging it. """
+    backend = FakeAWSBackend(queue_latency_sec=0, processing_latency_sec=0.05,
+                             requests_per_sec={"GetTranscriptionJob": 0.01} if failing_stage == "polling" else None)
+    backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3"])
+    api_wrapper = AsyncAWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000)
+    api_wrapper.client = FakeTranscribeClient(backend)
+
+    def generate_rows():
+        yield {"path": "/a.mp3"}
+        if failing_stage == "listing":
+            raise RuntimeError("Listing failed")
+        yield {"path": "/b.mp3"}
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(lambda: list(iter_results_from_rows(api_wrapper, backend, generate_rows())))
+        with pytest.raises(Exception) as error:
+            future.result(timeout=30)
+    if failing_stage == "listing":
+        assert str(error.value) == "Listing failed"
+    else:
+        assert type(error.value).__name__ == "APITranscriptionJobError"
@@ -0,0 +1,100 @@
+import threading
+
+from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
+from concurrency_limiter import AdaptiveConcurrencyLimiter
+from concurrency_limiter import JobQuotaGate
+from fake_aws import FakeAWSBackend, FakeTranscribeClient
+
+
+class TestAdaptiveConcurrencyLimiter:
+
+    def test_limit_increases_with_successes(self):
+        """ Test that the limit increases by one each time as many calls as the limit have succeeded. """
+        limiter = AdaptiveConcurrencyLimiter(max_limit=3)
+        limits = []
+        for _ in range(6):
+            with limiter:
+                pass
+            limits.append(limiter.limit)
+
+        assert limits == [2, 2, 3, 3, 3, 3]
+
+    def test_limit_held_below_throttling_point(self):
+        """ Test that a throttled call sets the limit below the calls in flight and stops the increase. """
+        limiter = AdaptiveConcurrencyLimiter(max_limit=10, initial_limit=5)
+        with limiter, limiter, limiter:
+            limiter.on_throttle()
+        for _ in range(10):
+            with limiter:
+                pass
+
+        assert limiter.limit == 2
+
+
+class TestJobQuotaGate:
+
+    def test_submissions_held_until_jobs_finish(self):
+        """ Test that a submission waits while the jobs in flight are at the quota, until one of them finishes. """
+        gate = JobQuotaGate(max_jobs=2)
+        for job_name in ["a", "b"]:
+            gate.acquire()
+            gate.add_job(job_name)
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (gate.acquire(), acquired.set()))
+        thread.start()
+
+        assert not acquired.wait(timeout=0.1)
+        gate.release_job("a")
+        assert acquired.wait(timeout=1)
+        thread.join()
+        assert gate.num_jobs_in_flight == 2
+
+    def test_refresh_drops_finished_jobs(self):
+        """ Test that waiting submissions refresh the jobs in flight, counting the ones of previous runs too. """
+        gate = JobQuotaGate(max_jobs=3)
+        for job_name in ["a", "b", "c"]:
+            gate.acquire()
+            gate.add_job(job_name)
+
+        gate.acquire(refresh_function=lambda: {"b", "job_of_a_previous_run"})
+        assert gate.num_jobs_in_flight == 3
+        gate.release_slot()
+        gate.release_job("job_of_a_previous_run")
+        assert gate.num_jobs_in_flight == 1
+
+    def test_quota_discovered(self):
+        """ Test that a submission rejected for exceeding the quota lowers it to the number of jobs in flight. """
+        gate = JobQuotaGate(max_jobs=10)
+        assert not gate.on_quota_exceeded()
+        for job_name in ["a", "b", "c"]:
+            gate.acquire()
+            gate.add_job(job_name)
+
+        assert gate.on_quota_exceeded()
+        assert gate.max_jobs == 3
+        assert not gate.has_capacity()
+
+    def test_try_acquire(self):
+        """ Test that a slot is acquired without waiting only when one is free, and counted as in flight. """
+        gate = JobQuotaGate(max_jobs=2)
+        assert gate.try_acquire()
+        assert gate.try_acquire()
+        assert not gate.try_acquire()
+        assert gate.num_jobs_in_flight == 2
+        gate.release_slot()
+        assert gate.try_acquire()
+
+
+def test_submissions_held_at_job_quota(fake_run):
+    """ Test that all the files are submitted without quota errors when the quota is lower than configured. """
+    backend = FakeAWSBackend(processing_latency_sec=0.05, max_concurrent_jobs=5)
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(30)])
+    gate = JobQuotaGate(max_jobs=8, refresh_interval_sec=0.01)
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, job_quota_gate=gate)
+    api_wrapper.client = FakeTranscribeClient(backend)
+
+    submitted_jobs = fake_run.submit(api_wrapper, [f"/{i}.mp3" for i in range(30)], parallel_workers=8)
+
+    assert (submitted_jobs["output_error_type"] == "").all()
+    assert gate.max_jobs == 5
+    assert sum(backend.get_stats()["jobs"].values()) == 30
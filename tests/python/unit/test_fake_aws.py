@@ -0,0 +1,186 @@
+import threading
+
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
+from fake_aws import FakeAWSBackend, FakeAWSServer, FakeS3Client, FakeTranscribeClient
+from job_timings import JobTimings
+from plugin_parallelizer import StreamingDataFrameParallelizer
+
+
+class TestFakeAWSBackend:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock):
+        clock.now = 1600000000.0
+        self.clock = clock
+        self.backend = FakeAWSBackend(queue_latency_sec=10, processing_latency_sec=20, clock=self.clock)
+        self.backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3"])
+        self.client = FakeTranscribeClient(self.backend)
+
+    def start_job(self, job_name, key="root/a.mp3"):
+        return self.client.start_transcription_job(TranscriptionJobName=job_name,
+                                                   Media={"MediaFileUri": f"s3://bucket/{key}"},
+                                                   IdentifyLanguage=True,
+                                                   OutputBucketName="bucket",
+                                                   OutputKey="root/response/")
+
+    def test_job_lifecycle(self):
+        """ Test that a job goes through the QUEUED, IN_PROGRESS and COMPLETED statuses, and writes its transcript. """
+        self.start_job("job")
+        statuses = []
+        for _ in range(3):
+            statuses.append(self.client.get_transcription_job(TranscriptionJobName="job")
+                            ["TranscriptionJob"]["TranscriptionJobStatus"])
+            self.clock.now += 15
+
+        assert statuses == ["QUEUED", "IN_PROGRESS", "COMPLETED"]
+        assert self.backend.transcript_json_loader(None, "job")["results"]["transcripts"][0]["transcript"]
+        assert FakeS3Client(self.backend).head_object(Bucket="bucket", Key="root/response/job.json")["ContentLength"]
+
+    def test_missing_media_fails(self):
+        """ Test that a job whose audio file does not exist ends in the FAILED status. """
+        self.start_job("job", key="root/missing.mp3")
+        self.clock.now += 30
+
+        job = self.client.get_transcription_job(TranscriptionJobName="job")["TranscriptionJob"]
+        assert job["TranscriptionJobStatus"] == "FAILED"
+        assert job["FailureReason"]
+
+    def test_list_transcription_jobs_paging(self):
+        """ Test that jobs are listed by status, most recent first, page by page. """
+        for i in range(5):
+            self.start_job(f"recipe_{i}")
+        self.start_job("other")
+        pages = [self.client.list_transcription_jobs(Status="QUEUED", JobNameContains="recipe", MaxResults=2)]
+        while "NextToken" in pages[-1]:
+            pages.append(self.client.list_transcription_jobs(Status="QUEUED", JobNameContains="recipe", MaxResults=2,
+                                                             NextToken=pages[-1]["NextToken"]))
+
+        assert [[job["TranscriptionJobName"] for job in page["TranscriptionJobSummaries"]] for page in pages] == \
+            [["recipe_4", "recipe_3"], ["recipe_2", "recipe_1"], ["recipe_0"]]
+
+    def test_throttling(self):
+        """ Test that requests beyond the configured rate are throttled with the error code of the API. """
+        backend = FakeAWSBackend(requests_per_sec={"GetTranscriptionJob": 2}, clock=self.clock)
+        client = FakeTranscribeClient(backend)
+        backend.put_audio_files("bucket", ["a.mp3"])
+        client.start_transcription_job(TranscriptionJobName="job", Media={"MediaFileUri": "s3://bucket/a.mp3"},
+                                       LanguageCode="en-US")
+        client.get_transcription_job(TranscriptionJobName="job")
+        client.get_transcription_job(TranscriptionJobName="job")
+
+        with pytest.raises(ClientError) as error:
+            client.get_transcription_job(TranscriptionJobName="job")
+        assert error.value.response["Error"]["Code"] == "ThrottlingException"
+        assert backend.get_stats()["throttled"] == {"GetTranscriptionJob": 1}
+
+
+def test_api_wrapper_end_to_end(fake_run):
+    """ Test that all the files are submitted and their results collected against the in-process fake backend. """
+    backend = FakeAWSBackend(queue_latency_sec=0.02, processing_latency_sec=0.05, failure_rate=0.2, seed=42)
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(200)])
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000)
+    api_wrapper.client = FakeTranscribeClient(backend)
+    api_wrapper.s3_client = FakeS3Client(backend)
+    paths = api_wrapper.iter_s3_paths(bucket="bucket", root_path="root")
+    submitted_jobs = fake_run.submit(api_wrapper, paths, parallel_workers=8)
+    results = fake_run.get_results(api_wrapper, submitted_jobs, backend.transcript_json_loader)
+
+    assert sorted(results["path"]) == sorted(f"/{i}.mp3" for i in range(200))
+    assert sum(results["output_error_type"] == "") == backend.get_stats()["jobs"]["COMPLETED"]
+    assert all(results.loc[results["output_error_type"] == "", "transcript"].str.startswith("Transcript of"))
+
+
+def test_api_wrapper_streamed_submissions(short_jobs):
+    """ Test that the jobs are polled while the next files are submitted, when the submissions are streamed. """
+    backend = FakeAWSBackend(queue_latency_sec=0.02, processing_latency_sec=0.05)
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(40)])
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000)
+    api_wrapper.client = FakeTranscribeClient(backend)
+    api_wrapper.s3_client = FakeS3Client(backend)
+    parallelizer = StreamingDataFrameParallelizer(function=api_wrapper.start_transcription_jobs,
+                                                  exceptions_to_catch=api_wrapper.API_EXCEPTIONS,
+                                                  parallel_workers=4,
+                                                  batch_support=True,
+                                                  batch_size=5,
+                                                  batch_response_parser=api_wrapper.parse_batch_submission_response,
+                                                  max_batches_in_flight=2)
+    first_result = threading.Event()
+
+    def generate_rows():
+        for i in range(40):
+            if i == 20:
+                # The second half of the files is only submitted once a job of the first half has completed
+                assert first_result.wait(timeout=10)
+            yield {"path": f"/{i}.mp3"}
+
+    submission_results = api_wrapper.iter_submissions(parallelizer, rows=generate_rows(), columns=["path"],
+                                                      input_folder_bucket="bucket", input_folder_root_path="root",
+                                                      output_folder_bucket="bucket", output_folder_root_path="root",
+                                                      job_id="recipe", language="auto")
+    paths = []
+    for row in api_wrapper.iter_results(submitted_jobs=submission_results, recipe_job_id="recipe", display_json=False,
+                                        transcript_json_loader=backend.transcript_json_loader, folder=None):
+        first_result.set()
+        paths.append(row["path"])
+
+    assert sorted(paths) == sorted(f"/{i}.mp3" for i in range(40))
+
+
+def test_http_endpoint():
+    """ Test that real boto3 clients can submit, poll and list through the local HTTP endpoint. """
+    backend = FakeAWSBackend(processing_latency_sec=0, requests_per_sec={"StartTranscriptionJob": 0.01})
+    backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3", "root/sub/c.mp3"])
+    with FakeAWSServer(backend) as server:
+        transcribe_client = server.create_client("transcribe")
+        api_wrapper = AWSTranscribeAPIWrapper()
+        api_wrapper.s3_client = server.create_client("s3")
+
+        paths = list(api_wrapper.iter_s3_paths(bucket="bucket", root_path="root"))
+        transcribe_client.start_transcription_job(TranscriptionJobName="job",
+                                                  Media={"MediaFileUri": "s3://bucket/root/a.mp3"},
+                                                  LanguageCode="fr-FR",
+                                                  OutputBucketName="bucket",
+                                                  OutputKey="root/response/")
+        with pytest.raises(ClientError) as error:
+            transcribe_client.start_transcription_job(TranscriptionJobName="throttled",
+                                                      Media={"MediaFileUri": "s3://bucket/root/b.mp3"},
+                                                      LanguageCode="fr-FR")
+        job = transcribe_client.get_transcription_job(TranscriptionJobName="job")["TranscriptionJob"]
+        transcript = api_wrapper.s3_client.get_object(Bucket="bucket", Key="root/response/job.json")["Body"].read()
+
+    assert paths == ["/a.mp3", "/b.mp3", "/sub/c.mp3"]
+    assert error.value.response["Error"]["Code"] == "ThrottlingException"
+    assert job["TranscriptionJobStatus"] == "COMPLETED"
+    assert job["CompletionTime"] >= job["CreationTime"]
+    assert b"Transcript of s3://bucket/root/a.mp3" in transcript
+
+
+def test_api_wrapper_job_timings(short_jobs):
+    """ Test that the lifecycle of each job is output as columns and summarized by stage. """
+    backend = FakeAWSBackend(queue_latency_sec=0.05, processing_latency_sec=0.05)
+    backend.put_audio_files("bucket", ["root/a.mp3"])
+    job_timings = JobTimings()
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, job_timings=job_timings)
+    api_wrapper.client = FakeTranscribeClient(backend)
+    job_name = api_wrapper.start_transcription_job(language="auto", row={"path": "/a.mp3"},
+                                                   input_folder_bucket="bucket", input_folder_root_path="root",
+                                                   output_folder_bucket="bucket", output_folder_root_path="root",
+                                                   job_id="recipe")
+    results = api_wrapper.get_results(submitted_jobs=pd.DataFrame({"path": ["/a.mp3"],
+                                                                   "output_response": [job_name],
+                                                                   "output_error_message": [""],
+                                                                   "output_error_type": [""]}),
+                                      recipe_job_id="recipe",
+                                      display_json=False,
+                                      transcript_json_loader=backend.transcript_json_loader,
+                                      folder=None)
+
+    assert list(results.columns) == AWSTranscribeAPIWrapper.get_output_columns(False, include_timings=True)
+    row = results.iloc[0]
+    assert row[JobTimings.SUBMITTED] <= row[JobTimings.AWS_COMPLETED] <= row[JobTimings.COMPLETION_DETECTED] \
+        <= row[JobTimings.TRANSCRIPT_FETCHED] <= row[JobTimings.RESULT_OUTPUT]
+    assert set(job_timings.get_summary().keys()) >= {"aws_total", "polling_delay", "end_to_end"}
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+from amazon_transcribe_api_client import AWSTranscribeAPIWrapper, JOB_TIMEOUT_ERROR_TYPE
+from job_deadlines import JobDeadlineTracker
+
+
+def test_pop_expired():
+    """ Test that jobs are popped once their deadline has passed, in order, and that removed jobs are skipped. """
+    now = [0.0]
+    deadlines = JobDeadlineTracker(timeout_sec=60, clock=lambda: now[0])
+    for job_name in ["a", "b", "c"]:
+        deadlines.add_job(job_name)
+        now[0] += 10
+    deadlines.remove_job("b")
+    deadlines.add_job("a")  # Already tracked, its deadline is kept
+
+    assert deadlines.pop_expired() == []
+    now[0] = 85.0
+    assert deadlines.pop_expired() == ["a", "c"]
+    assert deadlines.pop_expired() == []
+    assert deadlines.is_expired("a") and not deadlines.is_expired("b")
+    assert len(deadlines) == 2
+
+
+def test_deadline_of_jobs_of_previous_runs():
+    """ Test that the age of a job counts whole days, and that naive creation times are read as UTC. """
+    deadlines = JobDeadlineTracker(timeout_sec=2 * 3600)
+    deadlines.add_job("old", created_at=datetime.now(timezone.utc) - timedelta(days=1, minutes=5))
+    deadlines.add_job("naive", created_at=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=3))
+    deadlines.add_job("recent", created_at=datetime.now(timezone.utc) - timedelta(minutes=5))
+
+    assert sorted(deadlines.pop_expired()) == ["naive", "old"]
+    assert not deadlines.is_expired("recent")
+
+
+def test_check_job_timeout_job_older_than_a_day():
+    """ Test that a job created more than a day ago is timed out, and not seen as a job created minutes ago. """
+    api_wrapper = AWSTranscribeAPIWrapper(use_timeout=True, timeout_min=120)
+    job = {
+        "TranscriptionJobName": "recipe_job",
+        "TranscriptionJobStatus": AWSTranscribeAPIWrapper.IN_PROGRESS,
+        "CreationTime": datetime.now(timezone.utc) - timedelta(days=1, minutes=10),
+    }
+
+    job_data = api_wrapper.check_job_timeout(job, {"output_error_type": "", "output_error_message": ""})
+
+    assert job_data["output_error_type"] == JOB_TIMEOUT_ERROR_TYPE
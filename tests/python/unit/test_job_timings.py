@@ -0,0 +1,44 @@
+import pytest
+
+from job_timings import JobTimings
+
+
+class TestJobTimings:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock):
+        clock.now = 1600000000.0
+        self.clock = clock
+        self.job_timings = JobTimings(clock=self.clock)
+
+    def test_pop_columns(self):
+        """ Test that the timestamps of a job are returned as ISO strings, empty for the events not recorded. """
+        self.job_timings.record("job", JobTimings.SUBMITTED)
+        self.clock.now += 10
+        columns = self.job_timings.pop("job")
+
+        assert list(columns.keys()) == JobTimings.COLUMNS
+        assert columns[JobTimings.SUBMITTED] == "2020-09-13T12:26:40+00:00"
+        assert columns[JobTimings.RESULT_OUTPUT] == "2020-09-13T12:26:50+00:00"
+        assert columns[JobTimings.IN_PROGRESS_SEEN] == ""
+
+    def test_first_event_kept(self):
+        """ Test that an event recorded without overwriting keeps the time it was first seen. """
+        self.job_timings.record("job", JobTimings.SUBMITTED)
+        for _ in range(3):
+            self.clock.now += 5
+            self.job_timings.record("job", JobTimings.IN_PROGRESS_SEEN, overwrite=False)
+        self.job_timings.pop("job")
+
+        assert self.job_timings.get_summary()["aws_queueing"] == {"count": 1, "p50": 5, "p95": 5, "p99": 5}
+
+    def test_summary_percentiles(self):
+        """ Test that the summary gives the percentiles of the stages of all the jobs output. """
+        for i in range(1, 101):
+            self.job_timings.record(f"job_{i}", JobTimings.AWS_COMPLETED, timestamp=self.clock.now - i)
+            self.job_timings.record(f"job_{i}", JobTimings.COMPLETION_DETECTED)
+            self.job_timings.pop(f"job_{i}")
+
+        summary = self.job_timings.get_summary()
+        assert summary["polling_delay"] == {"count": 100, "p50": 50, "p95": 95, "p99": 99}
+        assert "end_to_end" not in summary
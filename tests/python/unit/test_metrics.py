@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
+from fake_aws import FakeAWSBackend
+from metrics import JSONExporter, MetricsRegistry, PrometheusTextfileExporter, StatsDExporter
+
+
+def get_value(snapshot, kind, name, **tags):
+    return next(metric for metric in snapshot[kind] if metric["name"] == name and metric["tags"] == tags)
+
+
+def test_registry_aggregation():
+    """ Test that counters are summed by tags, gauges keep their last value and histograms are bucketed. """
+    registry = MetricsRegistry(histogram_buckets=[1, 10])
+    registry.increment("jobs_finished", tags={"status": "COMPLETED"})
+    registry.increment("jobs_finished", 2, tags={"status": "COMPLETED"})
+    registry.increment("jobs_finished", tags={"status": "FAILED"})
+    registry.gauge("pending_jobs", 5)
+    registry.gauge("pending_jobs", 3)
+    for value in [0.5, 2, 20]:
+        registry.observe("transcript_download_duration_sec", value)
+
+    snapshot = registry.get_snapshot()
+    assert get_value(snapshot, "counters", "jobs_finished", status="COMPLETED")["value"] == 3
+    assert get_value(snapshot, "counters", "jobs_finished", status="FAILED")["value"] == 1
+    assert get_value(snapshot, "gauges", "pending_jobs")["value"] == 3
+    histogram = get_value(snapshot, "histograms", "transcript_download_duration_sec")
+    assert (histogram["count"], histogram["sum"], histogram["min"], histogram["max"]) == (3, 22.5, 0.5, 20)
+    assert histogram["buckets"] == {1: 1, 10: 2}
+
+
+def test_span_counts_errors():
+    """ Test that a span is timed whether it fails or not, and that its errors are counted by type. """
+    registry = MetricsRegistry()
+    with registry.span("get_transcription_job"):
+        pass
+    with pytest.raises(KeyError):
+        with registry.span("get_transcription_job"):
+            raise KeyError("job")
+
+    snapshot = registry.get_snapshot()
+    assert get_value(snapshot, "histograms", "get_transcription_job_duration_sec")["count"] == 2
+    assert get_value(snapshot, "counters", "get_transcription_job_errors", error_type="KeyError")["value"] == 1
+
+
+def test_flush_interval():
+    """ Test that metrics are exported by a background thread at each interval, and when the registry is closed. """
+    snapshots = []
+    flush_thread_names = set()
+
+    def export(snapshot):
+        flush_thread_names.add(threading.current_thread().name)
+        snapshots.append(snapshot)
+
+    registry = MetricsRegistry([JSONExporter(export)], flush_interval_sec=0.01)
+    registry.increment("jobs_submitted")
+    deadline = time.monotonic() + 5
+    while not snapshots and time.monotonic() < deadline:
+        time.sleep(0.01)
+    registry.increment("jobs_submitted")
+    registry.close()
+    num_snapshots = len(snapshots)
+    time.sleep(0.05)
+
+    assert snapshots[0]["counters"][0]["value"] == 1
+    assert snapshots[-1]["counters"][0]["value"] == 2
+    assert flush_thread_names == {"metrics-flush", threading.current_thread().name}
+    assert len(snapshots) == num_snapshots  # No export after closing
+
+
+def test_prometheus_textfile_exporter(tmp_path):
+    """ Test that the Prometheus textfile holds counters, gauges and cumulative histogram buckets. """
+    registry = MetricsRegistry(histogram_buckets=[1])
+    registry.increment("api_throttled_attempts", tags={"operation": "StartTranscriptionJob"})
+    registry.gauge("pending_jobs", 2)
+    registry.observe("rate_limiter_wait_sec", 0.5)
+    path = tmp_path / "transcribe.prom"
+    PrometheusTextfileExporter(str(path), prefix="test").export(registry.get_snapshot())
+
+    lines = path.read_text().splitlines()
+    assert 'test_api_throttled_attempts_total{operation="StartTranscriptionJob"} 1' in lines
+    assert "test_pending_jobs 2" in lines
+    assert 'test_rate_limiter_wait_sec_bucket{le="1"} 1' in lines
+    assert 'test_rate_limiter_wait_sec_bucket{le="+Inf"} 1' in lines
+    assert "# TYPE test_rate_limiter_wait_sec histogram" in lines
+
+
+def test_statsd_exporter_sends_increments():
+    """ Test that counters are sent to StatsD as the increments since the previous export. """
+    registry = MetricsRegistry()
+    exporter = StatsDExporter(prefix="test")
+    registry.increment("jobs_finished", 2, tags={"status": "COMPLETED"})
+    first_lines = exporter.format(registry.get_snapshot())
+    registry.increment("jobs_finished", tags={"status": "COMPLETED"})
+    second_lines = exporter.format(registry.get_snapshot())
+
+    assert first_lines == ["test.jobs_finished:2|c|#status:COMPLETED"]
+    assert second_lines == ["test.jobs_finished:1|c|#status:COMPLETED"]
+
+
+def test_api_wrapper_metrics(fake_run):
+    """ Test that submissions, API calls, finished jobs and parallelized rows are recorded during a run. """
+    backend = FakeAWSBackend(queue_latency_sec=0.02, processing_latency_sec=0.05, failure_rate=0.3, seed=0)
+    registry = MetricsRegistry()
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, metrics=registry)
+    fake_run(api_wrapper, backend, num_files=20, metrics=registry)
+
+    snapshot = registry.get_snapshot()
+    jobs = backend.get_stats()["jobs"]
+    assert get_value(snapshot, "counters", "jobs_submitted")["value"] == 20
+    assert get_value(snapshot, "counters", "parallelizer_rows",
+                     function="start_transcription_job", status="success")["value"] == 20
+    assert get_value(snapshot, "histograms", "start_transcription_job_duration_sec")["count"] == 20
+    assert get_value(snapshot, "histograms", "transcript_download_duration_sec")["count"] == jobs["COMPLETED"]
+    assert get_value(snapshot, "counters", "jobs_finished", status="COMPLETED")["value"] == jobs["COMPLETED"]
+    assert get_value(snapshot, "counters", "jobs_finished", status="FAILED")["value"] == jobs["FAILED"]
+    assert get_value(snapshot, "gauges", "pending_jobs")["value"] == 0
@@ -0,0 +1,43 @@
+import pytest
+
+from plugin_io_utils import filter_paths_by_extension
+from plugin_io_utils import get_changed_paths
+from plugin_io_utils import get_dead_letter_row
+
+
+def test_get_changed_paths():
+    """ Test that new and modified files are detected, but not unchanged or deleted ones. """
+    previous_path_details = {
+        "/unchanged.mp3": {"size": 10, "last_modified": 1000},
+        "/resized.mp3": {"size": 10, "last_modified": 1000},
+        "/touched.mp3": {"size": 10, "last_modified": 1000},
+        "/deleted.mp3": {"size": 10, "last_modified": 1000},
+    }
+    path_details = {
+        "/unchanged.mp3": {"size": 10, "last_modified": 1000},
+        "/resized.mp3": {"size": 20, "last_modified": 1000},
+        "/touched.mp3": {"size": 10, "last_modified": 2000},
+        "/new.mp3": {"size": 10, "last_modified": 2000},
+    }
+
+    assert get_changed_paths(path_details, previous_path_details) == ["/resized.mp3", "/touched.mp3", "/new.mp3"]
+
+
+def test_filter_paths_by_extension():
+    """ Test that paths are filtered lazily, and that an error is raised if none matches once all are read. """
+    paths = filter_paths_by_extension(iter(["/a.MP3", "/b.txt", "/c.wav"]), ["mp3", "wav"])
+
+    assert next(paths) == "/a.MP3"
+    assert list(paths) == ["/c.wav"]
+    with pytest.raises(RuntimeError):
+        list(filter_paths_by_extension(["/b.txt"], ["mp3"]))
+
+
+def test_get_dead_letter_row():
+    """ Test that failed files keep their failure reason, and that their attempts are counted across runs. """
+    result = {"path": "/a.mp3", "job_name": None, "transcript": "", "output_error_type": "AWS_FAILURE",
+              "output_error_message": "Unsupported format"}
+
+    assert get_dead_letter_row(result) == {"path": "/a.mp3", "job_name": "", "output_error_type": "AWS_FAILURE",
+                                           "output_error_message": "Unsupported format", "num_attempts": 1}
+    assert get_dead_letter_row(result, num_previous_attempts=2)["num_attempts"] == 3
@@ -0,0 +1,142 @@
+import time
+from typing import Dict, List, NamedTuple
+
+import pandas as pd
+
+from plugin_parallelizer import StreamingDataFrameParallelizer
+
+INPUT_COLUMN = "value"
+
+
+def double(row: Dict) -> int:
+    return 2 * row[INPUT_COLUMN]
+
+
+def test_run_keeps_column_types():
+    """ Test that each row holds the values of each column with their own type, and that dtypes are kept. """
+    input_df = pd.DataFrame({"count": [1, 2], "ratio": [0.5, 1.5]})
+    parallelizer = StreamingDataFrameParallelizer(
+        function=lambda row: f"{type(row['count']).__name__},{type(row['ratio']).__name__}",
+        exceptions_to_catch=(ValueError,),
+    )
+
+    output_df = parallelizer.run(input_df)
+
+    assert list(output_df["output_response"]) == ["int,float", "int,float"]
+    assert dict(output_df.dtypes)["count"] == input_df["count"].dtype
+
+
+def test_iter_run_bounds_batches_in_flight():
+    """ Test that rows are read only as results are consumed, with at most `max_batches_in_flight` batches. """
+    num_generated_rows = []
+
+    def generate_rows():
+        for i in range(100):
+            num_generated_rows.append(i)
+            yield {INPUT_COLUMN: i}
+
+    parallelizer = StreamingDataFrameParallelizer(function=double, exceptions_to_catch=(ValueError,),
+                                                  parallel_workers=2, max_batches_in_flight=2)
+
+    results = parallelizer.iter_run(generate_rows(), columns=[INPUT_COLUMN])
+    first_result = next(results)
+
+    assert len(num_generated_rows) <= 3
+    assert first_result["output_response"] == 2 * first_result[INPUT_COLUMN]
+    assert "output_error_raw" not in first_result
+    assert len(list(results)) == 99
+
+
+def test_run_keeps_input_order():
+    """ Test that the output rows are in the order of the input rows, even if the first batches complete last. """
+
+    def double_slow_first(row: Dict) -> int:
+        time.sleep(0.01 * (10 - row[INPUT_COLUMN]))
+        return double(row)
+
+    parallelizer = StreamingDataFrameParallelizer(function=double_slow_first, exceptions_to_catch=(ValueError,),
+                                                  parallel_workers=5)
+
+    output_df = parallelizer.run(pd.DataFrame({INPUT_COLUMN: range(10)}))
+
+    assert list(output_df["output_response"]) == [str(2 * i) for i in range(10)]
+
+
+def test_batch_partial_failure():
+    """ Test that only the rows which failed in a batch get errors, when errors are parsed from the response. """
+
+    def parse_response(batch: List[Dict], response: List, output_column_names: NamedTuple) -> List[Dict]:
+        return [
+            {
+                **row,
+                output_column_names.response: "" if row[INPUT_COLUMN] < 0 else str(row_response),
+                output_column_names.error_message: "Negative value" if row[INPUT_COLUMN] < 0 else "",
+                output_column_names.error_type: "ValueError" if row[INPUT_COLUMN] < 0 else "",
+                output_column_names.error_raw: "",
+            }
+            for row, row_response in zip(batch, response)
+        ]
+
+    parallelizer = StreamingDataFrameParallelizer(function=lambda batch: [double(row) for row in batch],
+                                                  exceptions_to_catch=(ValueError,),
+                                                  batch_support=True,
+                                                  batch_size=3,
+                                                  batch_response_parser=parse_response)
+
+    output_df = parallelizer.run(pd.DataFrame({INPUT_COLUMN: [1, -1, 3]}))
+
+    assert list(output_df["output_error_type"]) == ["", "ValueError", ""]
+    assert list(output_df["output_response"]) == ["2", "", "6"]
+
+
+def test_batch_metrics():
+    """ Test that the duration of each batch and the number of rows with and without error are recorded. """
+
+    class RecordingMetrics:
+        def __init__(self):
+            self.observations = []
+            self.counts = {}
+
+        def observe(self, name, value, tags=None):
+            self.observations.append(name)
+
+        def increment(self, name, value=1, tags=None):
+            self.counts[tags["status"]] = self.counts.get(tags["status"], 0) + value
+
+    def double_positive(row: Dict) -> int:
+        if row[INPUT_COLUMN] < 0:
+            raise ValueError("Negative value")
+        return double(row)
+
+    metrics = RecordingMetrics()
+    parallelizer = StreamingDataFrameParallelizer(function=double_positive, exceptions_to_catch=(ValueError,),
+                                                  metrics=metrics)
+
+    parallelizer.run(pd.DataFrame({INPUT_COLUMN: [1, -1, 3]}))
+
+    assert metrics.observations == ["parallelizer_batch_duration_sec"] * 3
+    assert metrics.counts == {"success": 2, "error": 1}
+
+
+def test_run_on_rows_consumes_generator_lazily():
+    """ Test that rows are sent to the function before the generator of rows is exhausted. """
+    applied_rows = []
+    num_applied_rows_before_end = []
+
+    def double_with_tracking(row: Dict) -> int:
+        applied_rows.append(row)
+        return double(row)
+
+    def generate_rows():
+        for i in range(20):
+            yield {INPUT_COLUMN: i}
+        time.sleep(0.5)  # Slow generation of the last rows, e.g., listing the last page of a remote storage
+        num_applied_rows_before_end.append(len(applied_rows))
+        yield {INPUT_COLUMN: 20}
+
+    parallelizer = StreamingDataFrameParallelizer(function=double_with_tracking, exceptions_to_catch=(ValueError,))
+
+    output_df = parallelizer.run_on_rows(generate_rows(), columns=[INPUT_COLUMN])
+
+    assert num_applied_rows_before_end == [20]
+    assert list(output_df["output_response"]) == [str(2 * i) for i in range(21)]
@@ -0,0 +1,63 @@
+import pytest
+
+from polling_scheduler import PollingScheduler
+
+
+class TestPollingScheduler:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, clock):
+        self.clock = clock
+        self.scheduler = PollingScheduler(min_interval_sec=1, max_interval_sec=60, backoff_factor=2,
+                                          max_requests_per_sec=10, clock=self.clock)
+
+    def test_expected_duration_from_throughput(self):
+        """ Test that the expected duration of a job is proportional to its size once a job has completed. """
+        self.scheduler.add_job("short", size_bytes=1000)
+        self.scheduler.add_job("long", size_bytes=100000)
+        self.scheduler.add_job("reference", size_bytes=10000)
+        self.scheduler.complete("reference", duration_sec=20)
+
+        assert self.scheduler.expected_duration_sec("short") == 2
+        assert self.scheduler.expected_duration_sec("long") == 200
+
+    def test_short_jobs_are_due_first(self):
+        """ Test that a short job is due before a long job submitted at the same time. """
+        self.scheduler.add_job("reference", size_bytes=10000)
+        self.scheduler.complete("reference", duration_sec=20)
+        self.scheduler.add_job("short", size_bytes=1000)
+        self.scheduler.add_job("long", size_bytes=100000)
+
+        self.clock.now = 5
+        assert self.scheduler.get_due_jobs() == ["short"]
+
+    def test_first_checks_before_any_completion(self):
+        """ Test that jobs are checked early until a job has completed, then when they are expected to finish. """
+        self.scheduler.add_job("first", size_bytes=1000)
+        self.clock.now = 1
+        assert self.scheduler.get_due_jobs() == ["first"]
+
+        self.scheduler.complete("first", duration_sec=20)
+        self.scheduler.add_job("second", size_bytes=1000)
+        self.clock.now = 5
+        assert self.scheduler.get_due_jobs() == []
+        self.clock.now = 21
+        assert self.scheduler.get_due_jobs() == ["second"]
+
+    def test_exponential_backoff(self):
+        """ Test that the interval between two checks doubles for a job still pending, up to a limit. """
+        self.scheduler.add_job("job", size_bytes=None)
+        intervals = []
+        for _ in range(5):
+            self.clock.now += 100
+            self.scheduler.reschedule("job")
+            intervals.append(self.scheduler.get_waiting_time_sec())
+
+        assert intervals == [1, 2, 4, 7.5, 7.5]
+
+    def test_request_budget(self):
+        """ Test that the waiting time leaves room for the requests of the last round in the budget. """
+        self.scheduler.add_job("job")
+        self.clock.now = 100
+
+        assert self.scheduler.get_waiting_time_sec(num_requests_last_round=50) == 5
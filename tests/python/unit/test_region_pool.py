@@ -0,0 +1,126 @@
+import botocore.session
+import pytest
+from botocore.stub import Stubber
+
+from amazon_transcribe_api_client import APIParameterError, AWSTranscribeAPIWrapper
+from concurrency_limiter import JobQuotaGate
+from fake_aws import FakeAWSBackend, FakeS3Client, FakeTranscribeClient
+from region_pool import RegionPool
+
+
+class TestRegionPool:
+
+    def test_acquire_region_by_load_relative_to_quota(self):
+        """ Test that jobs go to the region with the lowest ratio of jobs in flight to its quota. """
+        region_pool = RegionPool(max_concurrent_jobs_per_region=2)
+        region_pool.add_region("us-east-1", client=None, max_concurrent_jobs=4)
+        region_pool.add_region("eu-west-1", client=None)
+
+        region_names = [region_pool.acquire_region() for _ in range(6)]
+
+        assert sorted(region_names) == ["eu-west-1"] * 2 + ["us-east-1"] * 4
+        assert region_pool.get_state() == {"us-east-1": 4, "eu-west-1": 2}
+
+    def test_release(self):
+        """ Test that failed submissions and finished jobs are no longer counted, and unknown jobs are ignored. """
+        region_pool = RegionPool()
+        region_pool.add_region("us-east-1", client=None)
+        region_pool.add_job("job_us-east-1", region_pool.acquire_region())
+        region_pool.acquire_region()
+        region_pool.release_region("us-east-1")
+        region_pool.release_job("job_us-east-1")
+        region_pool.release_job("job_of_a_previous_run_us-east-1")
+
+        assert region_pool.get_state() == {"us-east-1": 0}
+
+    def test_get_client(self):
+        """ Test that the client of a job is found from the region at the end of its name. """
+        region_pool = RegionPool()
+        region_pool.add_region("eu-west-1", client="eu_client")
+
+        assert region_pool.get_client(RegionPool.make_job_name("recipe_123", "eu-west-1")) == "eu_client"
+        assert region_pool.get_client("recipe_123") is None
+
+
+def test_jobs_spread_across_regions(fake_run):
+    """ Test that jobs are submitted to several regions, and that their results are merged in a single output. """
+    backends = {"us-east-1": FakeAWSBackend(processing_latency_sec=0.05, failure_rate=0.2, seed=0),
+                "eu-west-1": FakeAWSBackend(processing_latency_sec=0.05, failure_rate=0.2, seed=1)}
+    region_pool = RegionPool(max_concurrent_jobs_per_region=10)
+    for region_name, backend in backends.items():
+        # The audio files are in a bucket reachable from both regions
+        backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(30)])
+        region_pool.add_region(region_name, FakeTranscribeClient(backend),
+                               max_concurrent_jobs=20 if region_name == "us-east-1" else None)
+    api_wrapper = AWSTranscribeAPIWrapper(max_polling_requests_per_sec=1000, region_pool=region_pool)
+    api_wrapper.client = region_pool.clients["us-east-1"]
+    api_wrapper.s3_client = FakeS3Client(backends["us-east-1"])
+
+    def transcript_json_loader(folder, job_name):
+        return backends[job_name.rsplit("_", 1)[-1]].transcript_json_loader(folder, job_name)
+
+    submitted_jobs = fake_run.submit(api_wrapper, [f"/{i}.mp3" for i in range(30)])
+    assert region_pool.get_state() == {"us-east-1": 20, "eu-west-1": 10}
+
+    results = fake_run.get_results(api_wrapper, submitted_jobs, transcript_json_loader)
+
+    assert sorted(results["path"]) == sorted(f"/{i}.mp3" for i in range(30))
+    num_completed = sum(backend.get_stats()["jobs"].get("COMPLETED", 0) for backend in backends.values())
+    assert (results["output_error_type"] == "").sum() == num_completed
+    assert region_pool.get_state() == {"us-east-1": 0, "eu-west-1": 0}
+
+
+def test_check_region_access():
+    """ Test that the regions and buckets which cannot be reached are all reported before any submission. """
+    session = botocore.session.get_session()
+    region_pool = RegionPool()
+    for region_name in ["us-east-1", "eu-west-1"]:
+        region_pool.add_region(region_name, session.create_client("transcribe", region_name=region_name))
+    api_wrapper = AWSTranscribeAPIWrapper(region_pool=region_pool)
+    api_wrapper.s3_client = session.create_client("s3", region_name="us-east-1")
+
+    with Stubber(region_pool.clients["us-east-1"]) as us_stubber, \
+            Stubber(region_pool.clients["eu-west-1"]) as eu_stubber, \
+            Stubber(api_wrapper.s3_client) as s3_stubber:
+        us_stubber.add_response("list_transcription_jobs", {"TranscriptionJobSummaries": []}, {"MaxResults": 1})
+        eu_stubber.add_client_error("list_transcription_jobs", service_error_code="UnrecognizedClientException")
+        s3_stubber.add_response("get_bucket_location", {"LocationConstraint": "eu-west-1"}, {"Bucket": "input"})
+        s3_stubber.add_client_error("get_bucket_location", service_error_code="AccessDenied",
+                                    expected_params={"Bucket": "output"})
+        with pytest.raises(APIParameterError) as error:
+            api_wrapper.check_region_access(["input", "output", "input"])
+
+    assert "Amazon Transcribe in eu-west-1" in str(error.value)
+    assert "bucket output" in str(error.value)
+    assert "us-east-1" not in str(error.value)
+
+
+@pytest.mark.parametrize("output_bucket_region_name, region_names", [("eu-west-1", ["eu-west-1"]), ("us-west-2", [])])
+def test_check_region_access_bucket_regions(output_bucket_region_name, region_names):
+    """ Test that the regions where the input or output bucket is not located are removed from the pool,
+    and that the quota of concurrent jobs is lowered to the quota of the regions left. """
+    session = botocore.session.get_session()
+    region_pool = RegionPool(max_concurrent_jobs_per_region=100)
+    for region_name in ["us-east-1", "eu-west-1"]:
+        region_pool.add_region(region_name, session.create_client("transcribe", region_name=region_name))
+    job_quota_gate = JobQuotaGate(max_jobs=200)
+    api_wrapper = AWSTranscribeAPIWrapper(region_pool=region_pool, job_quota_gate=job_quota_gate)
+    api_wrapper.s3_client = session.create_client("s3", region_name="us-east-1")
+
+    with Stubber(region_pool.clients["us-east-1"]) as us_stubber, \
+            Stubber(region_pool.clients["eu-west-1"]) as eu_stubber, \
+            Stubber(api_wrapper.s3_client) as s3_stubber:
+        us_stubber.add_response("list_transcription_jobs", {"TranscriptionJobSummaries": []}, {"MaxResults": 1})
+        eu_stubber.add_response("list_transcription_jobs", {"TranscriptionJobSummaries": []}, {"MaxResults": 1})
+        s3_stubber.add_response("get_bucket_location", {"LocationConstraint": "eu-west-1"}, {"Bucket": "input"})
+        s3_stubber.add_response("get_bucket_location", {"LocationConstraint": output_bucket_region_name},
+                                {"Bucket": "output"})
+        if region_names:
+            api_wrapper.check_region_access(["input", "output"])
+        else:
+            with pytest.raises(APIParameterError):
+                api_wrapper.check_region_access(["input", "output"])
+
+    assert region_pool.region_names == region_names
+    if region_names:
+        assert job_quota_gate.max_jobs == 100
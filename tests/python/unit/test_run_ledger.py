@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from amazon_transcribe_api_client import AWSTranscribeAPIWrapper
+from fake_aws import FakeAWSBackend, FakeTranscribeClient
+from plugin_io_utils import is_unchanged_since_submission
+from run_ledger import RunLedger
+
+
+class TestRunLedger:
+
+    @pytest.fixture
+    def ledger(self, tmp_path):
+        ledger = RunLedger(str(tmp_path / "run_ledger.db"))
+        yield ledger
+        ledger.close()
+
+    def test_reusable_jobs(self, ledger):
+        """ Test that submitted and completed jobs are reused, but not failed jobs or jobs of other files. """
+        ledger.record_submission(path="/submitted.mp3", job_name="job_1")
+        ledger.record_submission(path="/completed.mp3", job_name="job_2")
+        ledger.record_submission(path="/failed.mp3", job_name="job_3")
+        ledger.record_submission(path="/deleted.mp3", job_name="job_4")
+        ledger.record_result({"job_name": "job_2", "language_code": "fr-FR", "output_error_type": ""})
+        ledger.record_result({"job_name": "job_3", "language_code": "", "output_error_type": "AWS_FAILURE"})
+
+        reusable_jobs = ledger.get_reusable_jobs(paths=["/submitted.mp3", "/completed.mp3", "/failed.mp3"])
+
+        assert sorted(reusable_jobs["output_response"]) == ["job_1", "job_2"]
+        assert ledger.get_completed_job("job_1") is None
+        assert ledger.get_completed_job("job_2")["LanguageCode"] == "fr-FR"
+
+    def test_persistence(self, tmp_path):
+        """ Test that the ledger is synchronized when closed and can be reopened by the next run. """
+        synchronized_paths = []
+        path = str(tmp_path / "run_ledger.db")
+        ledger = RunLedger(path, sync_function=synchronized_paths.append)
+        ledger.set_recipe_job_id("recipe")
+        ledger.record_submission(path="/a.mp3", job_name="recipe_1")
+        ledger.close()
+
+        reopened_ledger = RunLedger(path)
+        assert synchronized_paths == [path]
+        assert reopened_ledger.get_recipe_job_id() == "recipe"
+        assert list(reopened_ledger.get_reusable_jobs(paths=["/a.mp3"])["output_response"]) == ["recipe_1"]
+        reopened_ledger.close()
+
+    def test_file_details(self, ledger):
+        """ Test that the size and modification time of the files are recorded, empty if unknown. """
+        ledger.record_submission(path="/a.mp3", job_name="job_1", size=10, last_modified=1000)
+        ledger.record_submission(path="/b.mp3", job_name="job_2", size=float("nan"))
+
+        reusable_jobs = ledger.get_reusable_jobs().set_index("path")
+
+        assert (reusable_jobs.loc["/a.mp3", "size"], reusable_jobs.loc["/a.mp3", "last_modified"]) == (10, 1000)
+        assert reusable_jobs.loc["/b.mp3", ["size", "last_modified"]].isna().all()
+
+    def test_ledger_without_file_details(self, tmp_path):
+        """ Test that a ledger written before the file details were recorded is still read. """
+        path = str(tmp_path / "run_ledger.db")
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute("CREATE TABLE jobs (path TEXT PRIMARY KEY, job_name TEXT, status TEXT, "
+                               "language_code TEXT, updated_at REAL)")
+            connection.execute("INSERT INTO jobs VALUES ('/a.mp3', 'job_1', 'SUBMITTED', '', 0)")
+        connection.close()
+
+        ledger = RunLedger(path)
+        ledger.record_submission(path="/b.mp3", job_name="job_2", size=10, last_modified=1000)
+
+        assert sorted(ledger.get_reusable_jobs()["output_response"]) == ["job_1", "job_2"]
+        ledger.close()
+
+
+def test_resume_run_without_file_details(tmp_path):
+    """ Test that a run which did not record the file details is resumed, matching its jobs on the path alone. """
+    path = str(tmp_path / "run_ledger.db")
+    backend = FakeAWSBackend()
+    backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3"])
+    api_wrapper = AWSTranscribeAPIWrapper(ledger=RunLedger(path))
+    api_wrapper.client = FakeTranscribeClient(backend)
+    for audio_path in ["/a.mp3", "/b.mp3"]:
+        api_wrapper.start_transcription_job(language="auto", row={"path": audio_path},
+                                            input_folder_bucket="bucket", input_folder_root_path="root",
+                                            output_folder_bucket="bucket", output_folder_root_path="output",
+                                            job_id="recipe")
+    api_wrapper.ledger.close()  # The run is interrupted
+
+    ledger = RunLedger(path)
+    reusable_path_details = {
+        job.path: {"size": job.size, "last_modified": job.last_modified}
+        for job in ledger.get_reusable_jobs().itertuples()
+    }
+    ledger.record_submission(path="/c.mp3", job_name="recipe_c", size=10, last_modified=1000)
+    reusable_jobs = ledger.get_reusable_jobs().set_index("path")
+    ledger.close()
+
+    assert sorted(reusable_path_details) == ["/a.mp3", "/b.mp3"]
+    assert is_unchanged_since_submission(reusable_path_details["/a.mp3"], {"size": 10, "last_modified": 1000})
+    submitted_details = reusable_jobs.loc["/c.mp3", ["size", "last_modified"]].to_dict()
+    assert is_unchanged_since_submission(submitted_details, {"size": 10, "last_modified": 1000})
+    assert not is_unchanged_since_submission(submitted_details, {"size": 12, "last_modified": 2000})
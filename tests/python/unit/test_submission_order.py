@@ -0,0 +1,40 @@
+from submission_order import get_priority_function, order_rows
+
+
+ROWS = [{"path": "/a.mp3", "size": 30}, {"path": "/urgent/b.mp3", "size": 10}, {"path": "/c.mp3"},
+        {"path": "/d.mp3", "size": 20}]
+
+
+def get_paths(rows):
+    return [row["path"] for row in rows]
+
+
+def test_size_orders():
+    """ Test that files are ordered by size, the files of unknown size being submitted last. """
+    assert get_paths(order_rows(ROWS, get_priority_function("size_ascending"))) == \
+        ["/urgent/b.mp3", "/d.mp3", "/a.mp3", "/c.mp3"]
+    assert get_paths(order_rows(ROWS, get_priority_function("size_descending"))) == \
+        ["/a.mp3", "/d.mp3", "/urgent/b.mp3", "/c.mp3"]
+
+
+def test_priority_orders():
+    """ Test that files of highest priority come first, and that files of equal priority keep the listing order. """
+    priority_function = get_priority_function("path_rules", priority_rules={"/urgent/*": 10, "/d*": -1})
+    assert get_paths(order_rows(ROWS, priority_function)) == ["/urgent/b.mp3", "/a.mp3", "/c.mp3", "/d.mp3"]
+    priority_function = get_priority_function("priority_column", priorities={"/c.mp3": 2, "/a.mp3": 1})
+    assert get_paths(order_rows(ROWS, priority_function)) == ["/c.mp3", "/a.mp3", "/urgent/b.mp3", "/d.mp3"]
+
+
+def test_order_window():
+    """ Test that rows are yielded before all of them are read when the ordering window is set. """
+    num_rows_read = []
+
+    def generate_rows():
+        for row in ROWS:
+            num_rows_read.append(row)
+            yield row
+
+    rows = order_rows(generate_rows(), get_priority_function("size_ascending"), window_size=2)
+    assert next(rows)["path"] == "/urgent/b.mp3"
+    assert len(num_rows_read) == 3
+    assert get_paths(rows) == ["/d.mp3", "/a.mp3", "/c.mp3"]
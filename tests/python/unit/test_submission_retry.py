@@ -0,0 +1,105 @@
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from amazon_transcribe_api_client import APIParameterError, APITranscriptionJobError, AWSTranscribeAPIWrapper
+from fake_aws import FakeAWSBackend, FakeTranscribeClient
+from plugin_parallelizer import StreamingDataFrameParallelizer
+from submission_retry import CircuitBreaker, SubmissionRetryPolicy
+
+
+def get_client_error(code, status_code=400):
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status_code}},
+                       "StartTranscriptionJob")
+
+
+def test_retry_delays_jittered_and_capped():
+    """ Test that retry delays are random, bounded by an exponential backoff and capped. """
+    policy = SubmissionRetryPolicy(base_delay_sec=1, max_delay_sec=5, seed=0)
+    for attempt, max_delay_sec in [(1, 1), (2, 2), (3, 4), (6, 5)]:
+        delays = [policy.get_delay_sec(attempt) for _ in range(50)]
+        assert all(0 <= delay <= max_delay_sec for delay in delays)
+        assert len(set(delays)) == 50
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (get_client_error("ThrottlingException"), True),
+    (get_client_error("LimitExceededException"), False),
+    (get_client_error("InternalFailureException", status_code=500), True),
+    (get_client_error("BadRequestException"), False),
+    (EndpointConnectionError(endpoint_url="https://transcribe.eu-west-1.amazonaws.com"), True),
+    (APIParameterError("Invalid parameters"), False),
+])
+def test_is_retryable_submission_error(error, retryable):
+    """ Test that throttling, server and network errors are retryable, including when wrapped by the wrapper. """
+    assert AWSTranscribeAPIWrapper.is_retryable_submission_error(error) == retryable
+    try:
+        raise APITranscriptionJobError("Error happened when starting a transcription job") from error
+    except APITranscriptionJobError as wrapped_error:
+        assert AWSTranscribeAPIWrapper.is_retryable_submission_error(wrapped_error) == retryable
+
+
+def test_circuit_breaker():
+    """ Test that the breaker opens when the error rate reaches the threshold, and closes after the cooldown. """
+    now = [0.0]
+    breaker = CircuitBreaker(error_rate_threshold=0.5, window_size=10, min_calls=4, cooldown_sec=30,
+                             clock=lambda: now[0])
+    for success in [True, False, True]:
+        breaker.record(success)
+    assert breaker.get_waiting_time_sec() == 0
+    breaker.record(False)
+    assert breaker.get_waiting_time_sec() == 30
+    now[0] = 20.0
+    assert breaker.get_waiting_time_sec() == 10
+    breaker.record(False)  # The outcomes before the opening are forgotten
+    now[0] = 30.0
+    assert breaker.get_waiting_time_sec() == 0
+    assert breaker.num_openings == 1
+
+
+def test_quota_exceeded_submission_not_retried():
+    """ Test that a submission beyond the quota of concurrent jobs is neither retried nor counted by the breaker. """
+    backend = FakeAWSBackend(processing_latency_sec=60, max_concurrent_jobs=1)
+    backend.put_audio_files("bucket", ["root/a.mp3", "root/b.mp3"])
+    breaker = CircuitBreaker(error_rate_threshold=0.5, window_size=10, min_calls=1)
+    api_wrapper = AWSTranscribeAPIWrapper(retry_policy=SubmissionRetryPolicy(max_attempts=3), circuit_breaker=breaker)
+    api_wrapper.client = FakeTranscribeClient(backend)
+    kwargs = dict(input_folder_bucket="bucket", input_folder_root_path="root", output_folder_bucket="bucket",
+                  output_folder_root_path="output", job_id="recipe", language="auto")
+
+    api_wrapper.try_start_transcription_job(row={"path": "/a.mp3"}, **kwargs)
+    response, retry_delay_sec = api_wrapper.try_start_transcription_job(row={"path": "/b.mp3"}, **kwargs)
+
+    assert response["error"] is not None
+    assert retry_delay_sec is None
+    assert breaker.get_waiting_time_sec() == 0
+
+
+def test_throttled_submissions_retried():
+    """ Test that submissions throttled in a batch are requeued and submitted again until they all succeed. """
+    backend = FakeAWSBackend(requests_per_sec={"StartTranscriptionJob": 20})
+    backend.put_audio_files("bucket", [f"root/{i}.mp3" for i in range(30)])
+    api_wrapper = AWSTranscribeAPIWrapper(
+        retry_policy=SubmissionRetryPolicy(max_attempts=20, base_delay_sec=0.1, max_delay_sec=0.5, seed=0)
+    )
+    api_wrapper.client = FakeTranscribeClient(backend)
+    parallelizer = StreamingDataFrameParallelizer(function=api_wrapper.start_transcription_jobs,
+                                                  exceptions_to_catch=api_wrapper.API_EXCEPTIONS,
+                                                  parallel_workers=2,
+                                                  batch_support=True,
+                                                  batch_size=5,
+                                                  batch_response_parser=api_wrapper.parse_batch_submission_response)
+
+    output_rows = list(api_wrapper.iter_submissions(parallelizer,
+                                                    rows=({"path": f"/{i}.mp3"} for i in range(30)),
+                                                    columns=["path"],
+                                                    input_folder_bucket="bucket",
+                                                    input_folder_root_path="root",
+                                                    output_folder_bucket="bucket",
+                                                    output_folder_root_path="output",
+                                                    job_id="recipe",
+                                                    language="auto"))
+
+    assert sorted(row["path"] for row in output_rows) == sorted(f"/{i}.mp3" for i in range(30))
+    assert [row["output_error_type"] for row in output_rows] == [""] * 30
+    assert backend.get_stats()["throttled"]["StartTranscriptionJob"] > 0
+    assert sum(backend.get_stats()["jobs"].values()) == 30
@@ -0,0 +1,59 @@
+from transcript_cache import LocalDirectoryCacheBackend, TranscriptCache
+
+
+class TestTranscriptCache:
+
+    def test_key_depends_on_job_options(self):
+        """ Test that the same audio transcribed with other options has another key. """
+        key = TranscriptCache.make_key(etag='"abc"', size_bytes=10, language="auto")
+
+        assert key == TranscriptCache.make_key(etag='"abc"', size_bytes=10, language="auto")
+        assert key != TranscriptCache.make_key(etag='"abc"', size_bytes=10, language="fr-FR")
+
+    def test_lru_eviction(self, tmp_path):
+        """ Test that the least recently used entries are evicted beyond the maximum size. """
+        entry_size = len(b'{"transcript": "0"}')
+        cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=2 * entry_size)
+        cache.put("key_0", {"transcript": "0"})
+        cache.put("key_1", {"transcript": "1"})
+        assert cache.contains("key_0")
+        cache.put("key_2", {"transcript": "2"})
+
+        assert not cache.contains("key_1")
+        assert cache.get("key_0") == {"transcript": "0"}
+        assert not (tmp_path / "key_1.json").exists()
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+
+    def test_pinned_entries_not_evicted(self, tmp_path):
+        """ Test that an entry found for a file is kept until it is read, even if it is the least recently used. """
+        entry_size = len(b'{"transcript": "0"}')
+        cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=2 * entry_size)
+        cache.put("key_0", {"transcript": "0"})
+        assert cache.contains("key_0", pin=True)
+        for i in range(1, 4):
+            cache.put(f"key_{i}", {"transcript": str(i)})
+
+        assert cache.get("key_0") == {"transcript": "0"}
+        cache.unpin("key_0")
+        cache.put("key_4", {"transcript": "4"})
+        assert not cache.contains("key_0")
+        assert cache.get_stats()["entries"] == 2
+
+    def test_index_persistence(self, tmp_path):
+        """ Test that the entries are found by the next run once the cache is closed. """
+        cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=1000)
+        cache.put("key", {"transcript": "text"})
+        cache.close()
+
+        reopened_cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=1000)
+        assert reopened_cache.contains("key")
+
+    def test_index_persisted_while_open(self, tmp_path):
+        """ Test that the entries are found by the next run even if the cache was not closed, e.g., after a crash. """
+        cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=1000,
+                                index_sync_interval_sec=0)
+        cache.put("key", {"transcript": "text"})
+
+        reopened_cache = TranscriptCache(LocalDirectoryCacheBackend(str(tmp_path)), max_size_bytes=1000)
+        assert reopened_cache.contains("key")